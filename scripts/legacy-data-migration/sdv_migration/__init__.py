@@ -0,0 +1,49 @@
+"""SDV legacy data migration as a library.
+
+Records are yielded lazily, one fee table chunk at a time:
+
+    import sdv_migration as sdv
+    dump = sdv.LegacyDump('dump.sql')  # student index + lookups, reused by every call below
+    for receipt in sdv.iter_receipts(dump, session='2024-2025'):
+        ...
+    sdv.write_records(sdv.iter_records(dump), lambda session: sdv.CsvExportWriter(session, 'out'))
+
+The names below are the library API; everything else lives in the modules
+that define it. The command line is sdv_migration.cli (run migrate_sdv.py).
+"""
+
+# numpy, openpyxl and pyarrow are imported by the stages that use them (so --help,
+# parsing and the library API start fast); main() checks them for the requested run.
+
+from .mapping import LegacyMapping, get_default_mapping, load_mapping
+from .records import BillRecord, DiscountRecord, HistoryRecord, ReceiptRecord, Record, StudentRecord
+from .parsing import iter_table_chunks, parse_sql_file
+from .staging import stage_dump
+from .extraction import (build_academic_history, extract_admission_payments, extract_demand_bills, extract_discounts,
+                         extract_fee_receipts, extract_modern_transactions, extract_students)
+from .identity import resolve_student_identities
+from .reconciliation import deduplicate_receipts, reconcile_bills, validate_data
+from .export import EXPORT_WRITERS, CsvExportWriter, ParquetExportWriter, WorkbookWriter, export_records
+from .precheck import ImportPrecheck, ReferenceData
+from .library import (LegacyDump, iter_bills, iter_discounts, iter_history, iter_receipts, iter_records,
+                      iter_students, write_records)
+from .pipeline import extract_all, run_migration, run_streaming_migration
+
+__all__ = [
+    # Records and schema mappings
+    'Record', 'StudentRecord', 'ReceiptRecord', 'BillRecord', 'DiscountRecord', 'HistoryRecord',
+    'LegacyMapping', 'load_mapping', 'get_default_mapping',
+    # Parsing
+    'parse_sql_file', 'iter_table_chunks', 'stage_dump',
+    # Extraction, validation, reconciliation
+    'extract_students', 'extract_demand_bills', 'extract_admission_payments', 'extract_modern_transactions',
+    'extract_fee_receipts', 'extract_discounts', 'build_academic_history', 'extract_all',
+    'resolve_student_identities', 'deduplicate_receipts', 'validate_data', 'reconcile_bills',
+    'ReferenceData', 'ImportPrecheck',
+    # Streaming record access and sinks
+    'LegacyDump', 'iter_records', 'iter_students', 'iter_receipts', 'iter_bills', 'iter_discounts',
+    'iter_history', 'write_records',
+    'WorkbookWriter', 'CsvExportWriter', 'ParquetExportWriter', 'EXPORT_WRITERS', 'export_records',
+    # Whole runs
+    'run_migration', 'run_streaming_migration',
+]
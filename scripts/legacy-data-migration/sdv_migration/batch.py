@@ -0,0 +1,163 @@
+"""Migrating many dumps across a process pool (--batch)."""
+
+import os
+import json
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from .mapping import LegacyMapping, load_mapping
+from .parsing import uncompressed_size
+from .pipeline import run_migration
+
+
+# Rough peak memory of one migration run relative to the dump size
+# (decoded text + parsed row dicts + extracted records). Used by --batch scheduling.
+DUMP_MEMORY_FACTOR = 8
+
+
+# =============================================================================
+# BATCH MODE
+# =============================================================================
+
+def load_batch_manifest(manifest_path: str, output_dir: str, default_mapping: str) -> List[Dict]:
+    """Load a batch manifest (JSON) listing one dump per school / branch.
+
+    Format:
+        {"dumps": [{"name": "branch-a", "input": "a.sql",
+                    "output": "out/a", "mapping": "mappings/a.json",
+                    "session": "2024-2025", "memory_mb": 6000}, ...]}
+    Only "input" is required. Relative paths are resolved against the manifest's
+    directory; "output" defaults to <--output>/<name>.
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    resolve = lambda p: p if os.path.isabs(p) else os.path.join(base_dir, p)
+    
+    jobs = []
+    for i, entry in enumerate(manifest.get('dumps', [])):
+        input_path = resolve(entry['input'])
+        name = entry.get('name') or os.path.splitext(os.path.basename(input_path))[0]
+        size = uncompressed_size(input_path) if os.path.exists(input_path) else 0
+        jobs.append({
+            'index': i,
+            'name': name,
+            'input': input_path,
+            'output': resolve(entry['output']) if entry.get('output') else os.path.join(output_dir, name),
+            'mapping': resolve(entry['mapping']) if entry.get('mapping') else default_mapping,
+            'session': entry.get('session'),
+            'memory_mb': entry.get('memory_mb') or max(1, size * DUMP_MEMORY_FACTOR // (1024 * 1024)),
+        })
+    return jobs
+
+
+_worker_mappings = {}
+
+
+def _init_batch_worker(mappings: Dict[str, LegacyMapping]):
+    """Pool initializer: receive the compiled mappings once per worker."""
+    _worker_mappings.update(mappings)
+
+
+def _run_batch_job(job: Dict, actions: Dict) -> Dict:
+    try:
+        summary = run_migration(job['input'], job['output'], _worker_mappings[job['mapping']],
+                                session=job['session'], **actions)
+        summary['status'] = 'ok'
+    except Exception as e:
+        summary = {'input': job['input'], 'output': job['output'], 'status': 'failed',
+                   'error': f"{type(e).__name__}: {e}"}
+    summary['name'] = job['name']
+    summary['memory_mb'] = job['memory_mb']
+    return summary
+
+
+def run_batch(manifest_path: str, output_dir: str, default_mapping: str, actions: Dict,
+              workers: int, memory_budget_mb: int) -> Dict:
+    """Migrate every dump in a manifest across a process pool.
+
+    Jobs are started largest-first while the sum of their estimated memory stays
+    within memory_budget_mb, so two large dumps never run side by side. A job
+    larger than the whole budget runs alone. Mappings are compiled once in the
+    parent and handed to each worker at start-up; the import template is
+    actions['template_path'], read by each worker.
+    A worker that dies (OOM kill, crash) fails only the dumps it took down with
+    it; the pool is replaced and the remaining dumps still run.
+    """
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    from concurrent.futures.process import BrokenProcessPool
+    
+    jobs = load_batch_manifest(manifest_path, output_dir, default_mapping)
+    mappings = {path: load_mapping(path) for path in sorted({j['mapping'] for j in jobs})}
+    pending = sorted(jobs, key=lambda j: j['memory_mb'], reverse=True)
+    
+    print(f"Batch: {len(jobs)} dumps, {workers} workers, memory budget {memory_budget_mb} MB")
+    started = time.time()
+    results = []
+    running = {}
+    
+    initargs = (mappings,)
+    new_pool = lambda: ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker, initargs=initargs)
+    pool = new_pool()
+    pool_futures = set()  # futures of the current pool (a broken pool fails all of its own)
+    try:
+        while pending or running:
+            # Admit jobs that fit in the remaining budget (largest first)
+            in_use = sum(j['memory_mb'] for j in running.values())
+            for job in list(pending):
+                if len(running) >= workers:
+                    break
+                if running and in_use + job['memory_mb'] > memory_budget_mb:
+                    continue
+                try:
+                    future = pool.submit(_run_batch_job, job, actions)
+                except BrokenProcessPool:
+                    pool.shutdown(wait=False)
+                    pool, pool_futures = new_pool(), set()
+                    future = pool.submit(_run_batch_job, job, actions)
+                pending.remove(job)
+                running[future] = job
+                pool_futures.add(future)
+                in_use += job['memory_mb']
+                print(f"  ▶ {job['name']} ({job['memory_mb']} MB est.)")
+            
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker process died; _run_batch_job reports the migration's own errors
+                    result = {'input': job['input'], 'output': job['output'], 'status': 'failed',
+                              'error': f"{type(e).__name__}: {e}", 'name': job['name'],
+                              'memory_mb': job['memory_mb']}
+                    if isinstance(e, BrokenProcessPool) and future in pool_futures:
+                        pool.shutdown(wait=False)
+                        pool, pool_futures = new_pool(), set()
+                results.append((job['index'], result))
+                mark = '✅' if result['status'] == 'ok' else '❌'
+                print(f"  {mark} {job['name']}: {result.get('error') or str(result.get('elapsed_seconds')) + 's'}")
+    finally:
+        pool.shutdown()
+    
+    results = [r for _, r in sorted(results, key=lambda item: item[0])]
+    ok = [r for r in results if r['status'] == 'ok']
+    summary = {
+        'manifest': manifest_path,
+        'generated': datetime.now().isoformat(),
+        'elapsed_seconds': round(time.time() - started, 2),
+        'dumps': len(results),
+        'succeeded': len(ok),
+        'failed': len(results) - len(ok),
+        'totals': {k: sum(r.get(k, 0) for r in ok) for k in ('students', 'receipts', 'bills', 'discounts')},
+        'results': results,
+    }
+    
+    os.makedirs(output_dir, exist_ok=True)
+    summary_path = os.path.join(output_dir, 'batch_summary.json')
+    with open(summary_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"\nBatch complete: {summary['succeeded']} ok, {summary['failed']} failed. Summary: {summary_path}")
+    return summary
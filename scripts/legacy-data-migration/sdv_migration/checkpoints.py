@@ -0,0 +1,181 @@
+"""Per-stage checkpoint artifacts of a run (--resume)."""
+
+import re
+import os
+import json
+import copy
+import hashlib
+import pickle
+from array import array
+from datetime import datetime
+from collections import defaultdict
+from typing import Dict, Iterator, List, Tuple
+
+from .records import BillRecord
+
+
+# =============================================================================
+# CHECKPOINTS
+# =============================================================================
+
+# Items pickled per memo reset when writing checkpoint artifacts
+CHECKPOINT_CHUNK = 10000
+
+# Version of what the stages produce (staged tables, checkpoint artifacts and
+# the records in them). Bump it when a change to the parser, extractors or an
+# artifact layout would make existing staging databases or checkpoints stale.
+STAGE_SCHEMA_VERSION = 3
+
+# Bill statuses set by reconcile_bills, stored as their index in checkpoints
+BILL_STATUSES = ('PENDING', 'PARTIALLY_PAID', 'PAID')
+
+
+class CheckpointStore:
+    """Per-stage artifacts and completion markers in <output>/.checkpoints.
+
+    Each stage saves a pickled artifact (<stage>.pkl) and then a marker
+    (<stage>.done.json) holding the fingerprint of the stage's inputs.
+    Artifacts are written as a run of (path, op, value) pickles: nested dicts
+    entry by entry and long lists in chunks, with the pickler's memo cleared
+    after each, so pickling never keeps a copy of the whole artifact alive.
+    Fingerprints are chained (each stage's includes the previous one), so a
+    changed dump, mapping, option or STAGE_SCHEMA_VERSION invalidates every
+    later stage.
+    With resume=True a stage whose marker matches is loaded instead of rerun.
+    """
+
+    def __init__(self, output_dir: str, resume: bool = False, enabled: bool = True):
+        self.dir = os.path.join(output_dir, '.checkpoints')
+        self.resume = resume
+        self.enabled = enabled
+        self.resumed = []
+        if enabled:
+            os.makedirs(self.dir, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(*parts) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _paths(self, stage: str) -> Tuple[str, str]:
+        safe = re.sub(r'[^\w.-]', '_', stage)
+        return os.path.join(self.dir, f"{safe}.pkl"), os.path.join(self.dir, f"{safe}.done.json")
+
+    def is_complete(self, stage: str, fingerprint: str) -> bool:
+        if not (self.enabled and self.resume):
+            return False
+        artifact_path, marker_path = self._paths(stage)
+        if not os.path.exists(marker_path):
+            return False
+        with open(marker_path) as f:
+            marker = json.load(f)
+        if marker.get('fingerprint') != fingerprint:
+            return False
+        return not marker.get('artifact') or os.path.exists(artifact_path)
+
+    def load(self, stage: str, fingerprint: str) -> Tuple[bool, object]:
+        """(True, artifact) if the stage completed with these inputs, else (False, None)."""
+        if not self.is_complete(stage, fingerprint):
+            return False, None
+        artifact_path, _ = self._paths(stage)
+        artifact = None
+        if os.path.exists(artifact_path):
+            with open(artifact_path, 'rb') as f:
+                artifact = self._assemble(f)
+        print(f"  ↩ Resuming: stage '{stage}' already complete")
+        self.resumed.append(stage)
+        return True, artifact
+
+    def save(self, stage: str, fingerprint: str, artifact=None):
+        if not self.enabled:
+            return
+        artifact_path, marker_path = self._paths(stage)
+        if artifact is not None:
+            with open(artifact_path + '.tmp', 'wb') as f:
+                pickler = pickle.Pickler(f, pickle.HIGHEST_PROTOCOL)
+                for piece in self._pieces(artifact):
+                    pickler.dump(piece)
+                    pickler.clear_memo()
+            os.replace(artifact_path + '.tmp', artifact_path)
+        with open(marker_path + '.tmp', 'w') as f:
+            json.dump({'stage': stage, 'fingerprint': fingerprint, 'artifact': artifact is not None,
+                       'completed': datetime.now().isoformat()}, f, indent=2)
+        os.replace(marker_path + '.tmp', marker_path)
+
+    @classmethod
+    def _pieces(cls, obj, path: Tuple = ()) -> Iterator[Tuple]:
+        """(path, op, value): 'set' an empty copy of each dict / list, then fill it in order."""
+        if isinstance(obj, dict):
+            empty = copy.copy(obj)  # keeps the type (and a defaultdict's factory)
+            empty.clear()
+            yield path, 'set', empty
+            items = []
+            for key, value in obj.items():
+                if isinstance(value, (dict, list)) or len(items) == CHECKPOINT_CHUNK:
+                    if items:
+                        yield path, 'update', items
+                        items = []
+                if isinstance(value, (dict, list)):
+                    yield from cls._pieces(value, path + (key,))
+                else:
+                    items.append((key, value))
+            if items:
+                yield path, 'update', items
+        elif isinstance(obj, list) and len(obj) > CHECKPOINT_CHUNK:
+            yield path, 'set', []
+            for start in range(0, len(obj), CHECKPOINT_CHUNK):
+                yield path, 'extend', obj[start:start + CHECKPOINT_CHUNK]
+        else:
+            yield path, 'set', obj
+
+    @staticmethod
+    def _assemble(f):
+        """Rebuild an artifact from the pieces written by _pieces()."""
+        root = None
+        while True:
+            try:
+                # One unpickler per piece: each piece was pickled with a fresh memo
+                path, op, value = pickle.load(f)
+            except EOFError:
+                return root
+            if op == 'set' and not path:
+                root = value
+                continue
+            parent = root
+            for key in path[:-1]:
+                parent = parent[key]
+            if op == 'set':
+                parent[path[-1]] = value
+            else:
+                target = parent[path[-1]] if path else root
+                getattr(target, op)(value)  # list.extend / dict.update
+
+
+def file_fingerprint(path: str) -> Dict:
+    """Identity of an input file (path, size, mtime) without hashing its contents."""
+    st = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': st.st_size, 'mtime': st.st_mtime_ns}
+
+
+def bill_payments(bills: Dict[str, List[BillRecord]], extract_fingerprint: str) -> Dict:
+    """Reconcile checkpoint: what reconcile_bills set on the extract stage's bills.
+
+    Holds paid amounts (int64 paise) and status codes per session, in bill
+    order; the bills themselves are read back from the extract artifact.
+    """
+    return {
+        'extract': extract_fingerprint,
+        'paid_amount': {session: array('q', (b.paid_amount for b in session_bills))
+                        for session, session_bills in bills.items()},
+        'status': {session: bytes(BILL_STATUSES.index(b.status) for b in session_bills)
+                   for session, session_bills in bills.items()},
+    }
+
+
+def apply_bill_payments(bills: Dict[str, List[BillRecord]], payments: Dict) -> Dict[str, List[BillRecord]]:
+    """The extract stage's bills with a reconcile checkpoint's paid amounts and statuses."""
+    reconciled = defaultdict(list)
+    for session, session_bills in bills.items():
+        reconciled[session] = [b.replace(paid_amount=paid, status=BILL_STATUSES[status])
+                               for b, paid, status in zip(session_bills, payments['paid_amount'][session],
+                                                          payments['status'][session])]
+    return reconciled
@@ -0,0 +1,133 @@
+"""Cleaning of legacy field values: phones, dates, text, Aadhar numbers and money."""
+
+import re
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from datetime import datetime
+from typing import Tuple, Optional
+
+
+# Placeholder values to treat as NULL
+PLACEHOLDER_VALUES = {'--Select--', 'None', 'N/A', '-', '', 'null', 'NULL', 'NA'}
+
+
+# =============================================================================
+# DATA CLEANING
+# =============================================================================
+
+def clean_phone(phone: str) -> Tuple[str, bool]:
+    """Clean phone number. Returns (cleaned, was_modified)."""
+    if not phone or phone in PLACEHOLDER_VALUES:
+        return '0000000000', True
+    
+    # Extract digits only
+    digits = re.sub(r'\D', '', phone)
+    
+    # Handle common patterns
+    if len(digits) > 10:
+        digits = digits[-10:]  # Take last 10 digits
+        
+    if len(digits) < 10:
+         return '0000000000', True
+
+    was_modified = digits != phone
+    return digits, was_modified
+
+def clean_date(date_str: str, fallback: str = '01-01-2000') -> Tuple[str, bool]:
+    """Clean date string. Returns (cleaned, was_modified)."""
+    if not date_str or date_str in PLACEHOLDER_VALUES:
+        return fallback, True
+    
+    # Handle invalid MySQL dates
+    if date_str.startswith('0000') or date_str == '0000-00-00':
+        return fallback, True
+    
+    # Try to parse and reformat to DD-MM-YYYY
+    try:
+        for fmt in ['%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%Y/%m/%d']:
+            try:
+                dt = datetime.strptime(date_str, fmt)
+                return dt.strftime('%d-%m-%Y'), date_str != dt.strftime('%d-%m-%Y')
+            except ValueError:
+                continue
+    except:
+        pass
+    
+    return fallback, True
+
+def clean_gender(gender: str) -> str:
+    """Clean gender field."""
+    if not gender or gender in PLACEHOLDER_VALUES:
+        return 'Other'
+    gender = gender.strip().lower()
+    if gender in ['male', 'm']:
+        return 'Male'
+    elif gender in ['female', 'f']:
+        return 'Female'
+    return 'Other'
+
+def clean_text(text: str) -> str:
+    """Clean text field - trim whitespace, handle placeholders."""
+    if not text:
+        return ''
+    text = text.strip()
+    if text in PLACEHOLDER_VALUES:
+        return ''
+    return ' '.join(text.split())  # Normalize whitespace
+
+def clean_aadhar(aadhar: str) -> Optional[str]:
+    """Clean Aadhar number - return None for placeholders."""
+    if not aadhar or aadhar in PLACEHOLDER_VALUES:
+        return None
+    digits = re.sub(r'\D', '', aadhar)
+    if len(digits) == 12:
+        return digits
+    return None
+
+# Money is carried as integer paise from parsing through reconciliation and
+# only converted back to rupees when written out (see paise_to_rupees).
+MONEY_PATTERN = re.compile(r'([+-]?)(\d*)(?:\.(\d*))?')
+CURRENCY_MARKS = re.compile(r'[,\s]|₹|(?i:rs\.?)')
+
+
+def parse_paise(value) -> int:
+    """Legacy amount ('1,500.50', 1500, '') -> integer paise (150050), without a float round-trip.
+
+    More than two decimals round half up; empty, placeholder or invalid values are 0.
+    """
+    if value is None or value == '' or value in PLACEHOLDER_VALUES:
+        return 0
+    if isinstance(value, int):
+        return value * 100
+    if isinstance(value, float):
+        value = repr(value)
+    elif not isinstance(value, str):
+        return 0
+    text = CURRENCY_MARKS.sub('', value)
+    match = MONEY_PATTERN.fullmatch(text)
+    if match and (match.group(2) or match.group(3)):
+        sign, whole, frac = match.group(1), match.group(2) or '0', match.group(3) or ''
+        paise = int(whole) * 100 + int((frac + '00')[:2])
+        if len(frac) > 2 and frac[2] >= '5':
+            paise += 1
+        return -paise if sign == '-' else paise
+    try:  # exponents and other forms Decimal understands
+        return int((Decimal(text) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except (InvalidOperation, ValueError):
+        return 0
+
+
+def paise_to_rupees(paise: int) -> float:
+    return paise / 100
+
+
+def date_sort_key(date_str: str) -> int:
+    """'DD-MM-YYYY' / 'YYYY-MM-DD' -> YYYYMMDD integer for ordering (0 if unparseable)."""
+    parts = str(date_str or '').split('-')
+    if len(parts) != 3:
+        return 0
+    if len(parts[0]) == 4:
+        parts = parts[::-1]
+    try:
+        return int(parts[2]) * 10000 + int(parts[1]) * 100 + int(parts[0])
+    except ValueError:
+        return 0
@@ -0,0 +1,139 @@
+"""Command line interface of migrate_sdv.py."""
+
+import os
+import argparse
+
+from .mapping import DEFAULT_MAPPING_PATH, load_mapping
+from .staging import STAGING_DB_NAME
+from .extraction import GROUP_MEMORY_MB
+from .export import EXPORT_WRITERS, TEMPLATE_PATH, VerificationError
+from .pipeline import run_migration
+from .batch import run_batch
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='SDV Data Migration Script')
+    parser.add_argument('--input', '-i', default='SdvData17Jan2026.sql', help='Input SQL dump file path')
+    parser.add_argument('--output', '-o', default='output', help='Output directory for Excel files')
+    parser.add_argument('--discover', action='store_true', help='Scan tables and generate discovery report')
+    parser.add_argument('--validate', action='store_true', help='Validate all data before export')
+    parser.add_argument('--export', action='store_true', help='Generate Excel files')
+    parser.add_argument('--session', help='Export specific session (e.g., "2024-2025")')
+    parser.add_argument('--reference-data', metavar='XLSX',
+                        help='Workbook with the backend Reference_Data sheet (e.g. the downloaded import template); '
+                             'output rows are checked against the importer rules')
+    parser.add_argument('--verify', action='store_true',
+                        help='Read exported workbooks back and check row counts / amounts per fee type')
+    parser.add_argument('--format', default='xlsx',
+                        help='Comma-separated export formats: xlsx, csv, parquet (e.g. "xlsx,parquet")')
+    parser.add_argument('--template', metavar='XLSX',
+                        help=f'Import template downloaded from the backend (default: "{TEMPLATE_PATH}")')
+    parser.add_argument('--mapping', '-m', default=DEFAULT_MAPPING_PATH,
+                        help='Legacy schema mapping file (.json/.yaml) for this school\'s SDV variant')
+    parser.add_argument('--parser', choices=['stream', 'mmap', 'parallel'], default='stream',
+                        help='stream: decode block by block (supports compressed dumps); '
+                             'mmap: scan raw bytes and decode only the fields that are read; '
+                             'parallel: tokenize INSERT shards on --parse-workers processes')
+    parser.add_argument('--parse-workers', type=int, default=None,
+                        help='Processes for --parser parallel (default: CPU count)')
+    parser.add_argument('--encoding', default='latin1', help='Text encoding of the dump')
+    parser.add_argument('--staging-db', nargs='?', const='', metavar='PATH',
+                        help=f'Load the dump into a SQLite staging database (default <output>/{STAGING_DB_NAME}) '
+                             'and extract from it; reused while the dump is unchanged')
+    parser.add_argument('--pipeline', choices=['staged', 'streaming'], default='staged',
+                        help='staged: parse, extract and write one after another (checkpointed); '
+                             'streaming: spool fee records per session, holding one session at a time')
+    parser.add_argument('--resolve-identities', action='store_true',
+                        help='Merge student IDs that belong to the same person (see identity_merges.json)')
+    parser.add_argument('--group-memory', type=float, default=GROUP_MEMORY_MB, metavar='MB',
+                        help='Memory for grouping admission payments by transaction before spilling to disk')
+    parser.add_argument('--keep-duplicate-receipts', action='store_true',
+                        help='Do not drop payments recorded in more than one legacy table')
+    parser.add_argument('--resume', action='store_true',
+                        help='Skip stages already completed (per .checkpoints markers) with unchanged inputs')
+    parser.add_argument('--rewrite-exports', action='store_true',
+                        help='Rewrite every export, even those whose records and template are unchanged')
+    parser.add_argument('--no-checkpoint', action='store_true',
+                        help='Do not write per-stage artifacts to <output>/.checkpoints')
+    parser.add_argument('--batch', metavar='MANIFEST', help='Migrate every dump listed in a JSON manifest')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Parallel dumps in --batch mode')
+    parser.add_argument('--memory-budget', type=int, default=8192,
+                        help='Total estimated memory (MB) of dumps running at once in --batch mode')
+    
+    args = parser.parse_args()
+    
+    # Default: show help if no action is specified
+    if not any([args.discover, args.validate, args.export]):
+        parser.print_help()
+        return
+    
+    formats = [f.strip().lower() for f in args.format.split(',') if f.strip()]
+    unknown = [f for f in formats if f not in EXPORT_WRITERS]
+    if unknown or not formats:
+        parser.error(f"unknown --format {', '.join(unknown)} (choose from {', '.join(EXPORT_WRITERS)})")
+    if args.reference_data and not os.path.exists(args.reference_data):
+        parser.error(f"--reference-data {args.reference_data} not found")
+    if args.reference_data and not (args.validate or args.export):
+        parser.error("--reference-data checks the migrated rows; use it with --validate or --export")
+    if args.template and not os.path.exists(args.template):
+        parser.error(f"--template {args.template} not found")
+    if args.batch and args.staging_db:
+        parser.error("--staging-db PATH would be shared by every --batch job; pass --staging-db without a path")
+    if args.verify and not (args.export and 'xlsx' in formats):
+        parser.error("--verify checks exported workbooks; use it with --export and --format xlsx")
+    import importlib.util
+    needed = ['numpy'] if args.validate or args.export else []  # bill reconciliation
+    if args.export or args.reference_data:
+        needed.append('openpyxl')
+    if 'parquet' in formats:
+        needed.append('pyarrow')
+    missing = [name for name in needed if importlib.util.find_spec(name) is None]
+    if missing:
+        print(f"Required packages not found. Install with: pip install {' '.join(missing)}")
+        exit(1)
+    
+    actions = {'discover': args.discover, 'validate': args.validate, 'export': args.export,
+               'parser_mode': args.parser, 'encoding': args.encoding, 'parse_workers': args.parse_workers,
+               'resume': args.resume, 'checkpoint': not args.no_checkpoint, 'pipeline': args.pipeline,
+               'dedupe_receipts': not args.keep_duplicate_receipts,
+               'resolve_identities': args.resolve_identities, 'formats': formats,
+               'group_memory_mb': args.group_memory, 'verify': args.verify, 'staging_db': args.staging_db,
+               'reference_data': args.reference_data, 'memoize_exports': not args.rewrite_exports,
+               'template_path': args.template}
+    
+    if args.batch:
+        try:
+            summary = run_batch(args.batch, args.output, args.mapping, actions,
+                                max(1, args.workers), args.memory_budget)
+        except (ImportError, ValueError) as e:
+            print(f"Error: cannot load mapping: {e}")
+            exit(1)
+        if summary['failed']:
+            exit(1)
+        return
+    
+    # 1. Setup Paths
+    if not os.path.exists(args.input):
+        print(f"Error: Input file '{args.input}' not found.")
+        print("Please specify the path to the SQL dump file using --input")
+        exit(1)
+    
+    try:
+        mapping = load_mapping(args.mapping)
+    except (ImportError, ValueError) as e:
+        print(f"Error: cannot load mapping: {e}")
+        exit(1)
+    print(f"Using schema mapping '{mapping.name}' ({args.mapping})")
+    
+    try:
+        run_migration(args.input, args.output, mapping, session=args.session, **actions)
+    except VerificationError as e:
+        print(f"❌ Verification failed: {e}")
+        exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,774 @@
+"""Writing records: import template workbooks, CSV and Parquet files, memoisation and read-back checks."""
+
+import os
+import csv
+import json
+import copy
+import hashlib
+from io import BytesIO
+from decimal import Decimal
+from datetime import datetime, date
+from typing import Dict, List, Tuple, Optional, Iterable
+
+from .records import MONEY_FIELDS, BillRecord, DiscountRecord, ReceiptRecord, Record, StudentRecord
+from .cleaning import paise_to_rupees, parse_paise
+
+
+# Import template (downloaded from the backend) used when --template is not given
+TEMPLATE_PATH = "SDV Data Migration/data_migration_template.xlsx"
+
+
+# =============================================================================
+# EXCEL GENERATION
+# =============================================================================
+
+_template_cache = {}
+
+
+def load_template_bytes(template_path: Optional[str] = None) -> Optional[bytes]:
+    """Read an import template (default TEMPLATE_PATH) once per process; returns None if it is missing."""
+    template_path = template_path or TEMPLATE_PATH
+    if template_path not in _template_cache:
+        if os.path.exists(template_path):
+            with open(template_path, 'rb') as f:
+                _template_cache[template_path] = f.read()
+        else:
+            _template_cache[template_path] = None
+    return _template_cache[template_path]
+
+
+# Record field -> template header, per record kind
+student_map = {
+    'student_id': 'Student ID *',
+    'name': 'Name *',
+    'father_name': 'Father Name *',
+    'mother_name': 'Mother Name *',
+    'dob': 'DOB (DD-MM-YYYY) *',
+    'gender': 'Gender *',
+    'class_name': 'Class *',
+    'section': 'Section *',
+    'roll': 'Roll Number',
+    'admission_date': 'Admission Date (DD-MM-YYYY) *',
+    'phone': 'Phone *',
+    'email': 'Email',
+    'address': 'Address *',
+    'aadhar': 'Student Aadhar',
+    'category': 'Category',
+    'religion': 'Religion',
+    'status': 'Status',
+    'session': 'Session Name',
+    'apaar_id': 'APAAR ID',
+    'father_occupation': 'Father Occ.',
+    'father_aadhar': 'Father Aadhar',
+    'father_pan': 'Father PAN',
+    'mother_occupation': 'Mother Occ.',
+    'mother_aadhar': 'Mother Aadhar',
+    'mother_pan': 'Mother PAN',
+    'guardian_rel': 'Guardian Rel',
+    'guardian_name': 'Guardian Name',
+    'guardian_phone': 'Guardian Phone',
+    'guardian_email': 'Guardian Email',
+    'guardian_aadhar': 'Guardian Aadhar',
+    'guardian_pan': 'Guardian PAN',
+    'guardian_address': 'Guardian Address',
+    'whats_app': 'WhatsApp No'
+}
+
+receipt_map = {
+    'student_id': 'Student ID *',
+    'receipt_no': 'Receipt No *',
+    'receipt_date': 'Receipt Date (DD-MM-YYYY) *',
+    'fee_type': 'Fee Type *',
+    'amount': 'Amount *',
+    'discount': 'Discount',
+    'net_amount': 'Net Amount *',
+    'payment_mode': 'Payment Mode *',
+    'payment_ref': 'Payment Ref',
+    'collected_by': 'Collected By',
+    'remarks': 'Remarks',
+    'bill_no': 'Bill No (if against bill)'
+}
+
+bill_map = {
+    'student_id': 'Student ID *',
+    'bill_no': 'Bill No *',
+    'bill_date': 'Bill Date (DD-MM-YYYY) *',
+    'due_date': 'Due Date (DD-MM-YYYY) *',
+    'month': 'Month (1-12) *',
+    'year': 'Year *',
+    'fee_type': 'Fee Type *',
+    'amount': 'Amount *',
+    'discount': 'Discount',
+    'previous_dues': 'Previous Dues',
+    'late_fee': 'Late Fee',
+    'net_amount': 'Net Amount *',
+    'paid_amount': 'Paid Amount',
+    'status': 'Status *'
+}
+
+discount_map = {
+    'student_id': 'Student ID *',
+    'fee_type': 'Fee Type *',
+    'discount_type': 'Discount Type *',
+    'discount_amount': 'Discount Value *',
+    'reason': 'Reason',
+    'approved_by': 'Approved By',
+    'session': 'Session Name'
+}
+
+history_map = {
+    'student_id': 'Student ID *',
+    'session': 'Session *',
+    'class_name': 'Class *',
+    'section': 'Section *',
+    'roll': 'Roll Number',
+    'status': 'Status *',
+    'final_result': 'Final Result'
+}
+
+# Record kind -> (template sheet, field -> header mapping)
+SHEET_COLUMNS = {
+    'students': ('Students', student_map),
+    'receipts': ('Fee_Receipts', receipt_map),
+    'bills': ('Demand_Bills', bill_map),
+    'discounts': ('Discounts', discount_map),
+    'history': ('Academic_History', history_map),
+}
+
+
+def export_value(record: Record, field: str):
+    """A record field as written out: money in rupees, dates as DD-MM-YYYY."""
+    val = getattr(record, field, None)
+    if field in MONEY_FIELDS and isinstance(val, int):
+        return paise_to_rupees(val)
+    return format_cell_value(val)
+
+
+def format_cell_value(val):
+    """Dates (and YYYY-MM-DD strings) as DD-MM-YYYY; anything else unchanged."""
+    if isinstance(val, (date, datetime)):
+        return val.strftime('%d-%m-%Y')
+    if isinstance(val, str) and len(val) == 10 and '-' in val: # YYYY-MM-DD
+        try:
+            if val[4] == '-' and val[7] == '-':
+                return datetime.strptime(val, '%Y-%m-%d').strftime('%d-%m-%Y')
+        except ValueError:
+            pass
+    return val
+
+
+class SheetPlan:
+    """Column layout of one sheet, compiled once from the template's header row.
+
+    headers are in template order; fields holds the record field written
+    under each header (None for template columns no record field maps to).
+    Every export format writes rows through the same plan.
+    """
+    __slots__ = ('kind', 'sheet', 'headers', 'fields', 'columns')
+
+    def __init__(self, kind: str, sheet: str, headers: List[Optional[str]]):
+        header_fields = {header: field for field, header in SHEET_COLUMNS[kind][1].items()}
+        self.kind = kind
+        self.sheet = sheet
+        self.headers = headers
+        self.fields = [header_fields.get(h) if h else None for h in headers]
+        # (1-based column, field) for every column that receives data
+        self.columns = [(i + 1, f) for i, f in enumerate(self.fields) if f]
+
+    def row(self, record: Record) -> List:
+        return [export_value(record, f) if f else None for f in self.fields]
+
+
+class SheetLayout:
+    """What a writer reproduces of one template sheet: fixed rows and sheet-level formatting.
+
+    rows are the sheet's rows from row 1, each a list of cells (None, or
+    (value, style) with style a (font, fill, border, alignment,
+    number_format, protection) tuple or None, one shared tuple per distinct
+    style); for sheets that receive records only the header row is kept
+    (sample rows are dropped).
+    """
+    __slots__ = ('name', 'rows', 'column_widths', 'row_heights', 'freeze_panes', 'merged', 'validations')
+
+    def __init__(self, ws, header_only: bool, styles: Dict[Tuple, Tuple]):
+        self.name = ws.title
+        self.rows = []
+        for row in ws.iter_rows(max_row=1 if header_only else None):
+            cells = []
+            for cell in row:
+                style = None
+                if cell.has_style:
+                    style = (copy.copy(cell.font), copy.copy(cell.fill), copy.copy(cell.border),
+                             copy.copy(cell.alignment), cell.number_format, copy.copy(cell.protection))
+                    style = styles.setdefault(style, style)
+                cells.append((cell.value, style) if cell.value is not None or style is not None else None)
+            while cells and cells[-1] is None:
+                cells.pop()
+            self.rows.append(cells)
+        while self.rows and not self.rows[-1]:
+            self.rows.pop()
+        self.column_widths = {key: dim.width for key, dim in ws.column_dimensions.items() if dim.width}
+        self.row_heights = {key: dim.height for key, dim in ws.row_dimensions.items()
+                            if dim.height and (not header_only or key == 1)}
+        self.freeze_panes = ws.freeze_panes
+        self.merged = [str(r) for r in ws.merged_cells.ranges if not header_only or r.max_row == 1]
+        self.validations = [copy.deepcopy(dv) for dv in ws.data_validations.dataValidation]
+
+    def build(self, wb):
+        """Add this sheet to a write-only workbook: formatting first, then its fixed rows.
+        Records appended to the sheet afterwards follow these rows."""
+        from openpyxl.cell import WriteOnlyCell
+        ws = wb.create_sheet(self.name)
+        for key, width in self.column_widths.items():
+            ws.column_dimensions[key].width = width
+        for key, height in self.row_heights.items():
+            ws.row_dimensions[key].height = height
+        ws.freeze_panes = self.freeze_panes
+        for cell_range in self.merged:
+            ws.merged_cells.add(cell_range)
+        for dv in self.validations:
+            ws.data_validations.append(copy.deepcopy(dv))
+        for cells in self.rows:
+            row = []
+            for entry in cells:
+                if entry is None or entry[1] is None:
+                    row.append(entry and entry[0])
+                    continue
+                cell = WriteOnlyCell(ws, value=entry[0])
+                cell.font, cell.fill, cell.border, cell.alignment, cell.number_format, cell.protection = entry[1]
+                row.append(cell)
+            ws.append(row)
+        return ws
+
+
+class TemplateSchema:
+    """The import template parsed once per process and shared by every writer.
+
+    plans maps record kind -> SheetPlan (header -> column); sheets are the
+    template's sheets in order as SheetLayouts (styles, widths, data
+    validations, and the full content of non-record sheets such as
+    Reference_Data that validations point at). new_workbook() builds an
+    export's write-only workbook from these, so the styled template is never
+    loaded again per session and written rows are flushed to disk rather than
+    kept. Without a template, headers come from SHEET_COLUMNS and no sheets
+    are pre-built.
+    """
+
+    def __init__(self, template_bytes: Optional[bytes], path: Optional[str] = None):
+        self.path = path
+        self.digest = hashlib.sha256(template_bytes).hexdigest() if template_bytes else None
+        self.plans = {}
+        self.sheets = []
+        self.defined_names = []
+        if template_bytes is None:
+            for kind, (sheet, col_mapping) in SHEET_COLUMNS.items():
+                self.plans[kind] = SheetPlan(kind, sheet, list(col_mapping.values()))
+            return
+        
+        from openpyxl import load_workbook
+        wb = load_workbook(BytesIO(template_bytes))
+        record_sheets = {sheet: kind for kind, (sheet, _) in SHEET_COLUMNS.items()}
+        styles = {}
+        for ws in wb.worksheets:
+            kind = record_sheets.get(ws.title)
+            if kind:
+                header_row = next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ())
+                self.plans[kind] = SheetPlan(kind, ws.title, list(header_row))
+            self.sheets.append(SheetLayout(ws, header_only=kind is not None, styles=styles))
+        self.defined_names = [(name, copy.deepcopy(dn)) for name, dn in wb.defined_names.items()]
+        wb.close()
+
+    def new_workbook(self):
+        """A fresh write-only workbook with the template's sheets, formatting and header rows."""
+        from openpyxl import Workbook
+        wb = Workbook(write_only=True)
+        if not self.sheets:
+            wb.create_sheet("Students")
+            return wb
+        for layout in self.sheets:
+            layout.build(wb)
+        for name, dn in self.defined_names:
+            wb.defined_names[name] = copy.deepcopy(dn)
+        return wb
+
+
+_template_schema_cache = {}
+
+
+def get_template_schema(template_path: Optional[str] = None) -> TemplateSchema:
+    """TemplateSchema of an import template (default TEMPLATE_PATH), parsed once per process."""
+    template_path = template_path or TEMPLATE_PATH
+    schema = _template_schema_cache.get(template_path)
+    if schema is None:
+        schema = _template_schema_cache[template_path] = TemplateSchema(load_template_bytes(template_path),
+                                                                        template_path)
+    return schema
+
+
+def get_sheet_plans(template_bytes: Optional[bytes]) -> Dict[str, SheetPlan]:
+    """Record kind -> SheetPlan for a template's content (e.g. one downloaded from the backend).
+
+    Sheets missing from the template get no plan (they are not exported).
+    Without a template, headers come from SHEET_COLUMNS.
+    """
+    return TemplateSchema(template_bytes).plans
+
+
+def export_name(name: str) -> str:
+    """'2024-2025' -> 'Migration_2024-2025' (file / directory stem of one export)."""
+    return "Migration_" + name.replace('/', '-').replace(' ', '_')
+
+
+class WorkbookWriter:
+    """One migration workbook, built from the template schema, that records are appended to.
+
+    append() can be called any number of times per sheet (rows continue where
+    the previous batch stopped). The workbook is write-only: appended rows go
+    to a temporary file per sheet, so memory does not grow with the rows
+    written.
+    """
+
+    def __init__(self, name: str, output_dir: str, template_path: Optional[str] = None):
+        os.makedirs(output_dir, exist_ok=True)
+        self.filepath = os.path.join(output_dir, f"{export_name(name)}.xlsx")
+        
+        schema = get_template_schema(template_path)
+        self.plans = schema.plans
+        if schema.digest is None:
+            print(f"⚠️ Template not found at {schema.path}, creating basic Workbook...")
+        self.wb = schema.new_workbook()
+        # Sheets with a header row (template sheets come with theirs)
+        self._headed = {layout.name for layout in schema.sheets}
+
+    def append(self, kind: str, records: Iterable[Record]):
+        """Write records of one kind ('students', 'receipts', ...) to their sheet."""
+        plan = self.plans.get(kind)
+        if not records or plan is None:
+            return
+        
+        if plan.sheet in self.wb.sheetnames:
+            ws = self.wb[plan.sheet]
+        else:
+            ws = self.wb.create_sheet(plan.sheet)
+        if plan.sheet not in self._headed:
+            # Basic workbook: no header row yet
+            ws.append(plan.headers)
+            self._headed.add(plan.sheet)
+        
+        for record in records:
+            ws.append(plan.row(record))
+
+    def save(self) -> str:
+        self.wb.save(self.filepath)
+        return self.filepath
+
+
+def generate_excel(session: str, students: List[StudentRecord], receipts: List[ReceiptRecord], 
+                   bills: List[BillRecord], discounts: List[DiscountRecord], output_dir: str, **kwargs) -> str:
+    """Generate Excel file by copying template and populating data."""
+    writer = WorkbookWriter(session, output_dir, kwargs.get('template_path'))
+    
+    # Record defaults (net amount, collected by, bill status, month/year...) are
+    # computed when records are built, so writing never modifies the inputs.
+    writer.append('students', students)
+    writer.append('receipts', receipts)
+    writer.append('bills', bills)
+    writer.append('discounts', discounts)
+    writer.append('history', kwargs.get('history'))
+    
+    return writer.save()
+
+
+# Consolidated Excel generation logic.
+
+
+def flatten_sessions(all_data: Dict[str, Dict[str, List[Record]]]) -> Dict[str, List[Record]]:
+    """{kind: {session: records}} -> {kind: records of every session}."""
+    flat = {}
+    for kind in SHEET_COLUMNS:
+        flat[kind] = []
+        for session_data in all_data.get(kind, {}).values():
+            flat[kind].extend(session_data)
+    return flat
+
+
+def generate_consolidated_excel(all_data: Dict[str, Dict[str, List[Record]]], output_dir: str,
+                                template_path: Optional[str] = None) -> str:
+    """Generate a single consolidated Excel file for all sessions."""
+    flat = flatten_sessions(all_data)
+    return generate_excel("Consolidated", flat['students'], flat['receipts'], flat['bills'], flat['discounts'],
+                          output_dir, history=flat['history'], template_path=template_path)
+
+
+# =============================================================================
+# CSV / PARQUET EXPORT
+# =============================================================================
+
+# Parquet column types of integer record fields. Money fields (MONEY_FIELDS) are exact
+# decimal rupees of this (precision, scale), written from the integer paise; everything
+# else is a string column.
+PARQUET_FIELD_TYPES = {'month': 'int64', 'year': 'int64'}
+PARQUET_MONEY_TYPE = (18, 2)
+
+
+class CsvExportWriter:
+    """One CSV file per sheet (template headers) in Migration_<name>/, written as records arrive."""
+
+    def __init__(self, name: str, output_dir: str, template_path: Optional[str] = None):
+        self.dir = os.path.join(output_dir, export_name(name))
+        self.plans = get_template_schema(template_path).plans
+        self._files = {}
+
+    def append(self, kind: str, records: Iterable[Record]):
+        plan = self.plans.get(kind)
+        if not records or plan is None:
+            return
+        entry = self._files.get(kind)
+        if entry is None:
+            os.makedirs(self.dir, exist_ok=True)
+            f = open(os.path.join(self.dir, f"{plan.sheet}.csv"), 'w', newline='', encoding='utf-8')
+            writer = csv.writer(f)
+            writer.writerow([h or '' for h in plan.headers])
+            entry = self._files[kind] = (f, writer)
+        entry[1].writerows([('' if v is None else v) for v in plan.row(r)] for r in records)
+
+    def save(self) -> str:
+        for f, _ in self._files.values():
+            f.close()
+        self._files = {}
+        return self.dir
+
+
+class ParquetExportWriter:
+    """One Parquet file per sheet (template headers, zstd) in Migration_<name>/.
+
+    Each append() becomes a row group, so a sheet never has to be held in
+    memory as a whole. Requires pyarrow.
+    """
+
+    def __init__(self, name: str, output_dir: str, template_path: Optional[str] = None):
+        import pyarrow
+        import pyarrow.parquet
+        self.pa, self.pq = pyarrow, pyarrow.parquet
+        self.dir = os.path.join(output_dir, export_name(name))
+        self.plans = get_template_schema(template_path).plans
+        self._writers = {}
+
+    def _type(self, field: Optional[str]):
+        if field in MONEY_FIELDS:
+            return self.pa.decimal128(*PARQUET_MONEY_TYPE)
+        return getattr(self.pa, PARQUET_FIELD_TYPES.get(field, 'string'))()
+
+    def _schema(self, plan: SheetPlan):
+        columns = [(h, f) for h, f in zip(plan.headers, plan.fields) if h]
+        schema = self.pa.schema([(h, self._type(f)) for h, f in columns])
+        return schema, [f for _, f in columns]
+
+    def append(self, kind: str, records: Iterable[Record]):
+        plan = self.plans.get(kind)
+        if not records or plan is None:
+            return
+        entry = self._writers.get(kind)
+        if entry is None:
+            os.makedirs(self.dir, exist_ok=True)
+            schema, fields = self._schema(plan)
+            path = os.path.join(self.dir, f"{plan.sheet}.parquet")
+            entry = self._writers[kind] = (self.pq.ParquetWriter(path, schema, compression='zstd'), schema, fields)
+        writer, schema, fields = entry
+        
+        arrays = []
+        for field, column in zip(fields, schema):
+            if field is None:
+                values = [None] * len(records)
+            elif field in MONEY_FIELDS:
+                values = [Decimal(v).scaleb(-PARQUET_MONEY_TYPE[1]) if isinstance(v, int) else None
+                          for v in (getattr(r, field) for r in records)]
+            elif field in PARQUET_FIELD_TYPES:
+                values = [None if v is None or v == '' else int(v) for v in (export_value(r, field) for r in records)]
+            else:
+                values = [None if v is None else str(v) for v in (export_value(r, field) for r in records)]
+            arrays.append(self.pa.array(values, type=column.type))
+        writer.write_table(self.pa.Table.from_arrays(arrays, schema=schema))
+
+    def save(self) -> str:
+        for writer, _, _ in self._writers.values():
+            writer.close()
+        self._writers = {}
+        return self.dir
+
+
+# --format name -> writer class (all take (name, output_dir, template_path) and share
+# append(kind, records) / save() -> path)
+EXPORT_WRITERS = {
+    'xlsx': WorkbookWriter,
+    'csv': CsvExportWriter,
+    'parquet': ParquetExportWriter,
+}
+
+
+def export_records(name: str, records, output_dir: str, formats: Iterable[str] = ('xlsx',),
+                   template_path: Optional[str] = None) -> List[str]:
+    """Write one session's (or the consolidated) records in every requested format; returns the paths."""
+    paths = []
+    for path in write_export(name, records, output_dir, formats, template_path).values():
+        if path not in paths:  # csv and parquet share a directory
+            paths.append(path)
+    return paths
+
+
+def write_export(name: str, records, output_dir: str, formats: Iterable[str],
+                 template_path: Optional[str] = None) -> Dict[str, str]:
+    """Write an export in the given formats in one pass over its records; returns format -> path.
+
+    records is {kind: records}, or an iterable of (kind, batch) pairs so an
+    export can be written without ever holding all of its records.
+    """
+    writers = {fmt: EXPORT_WRITERS[fmt](name, output_dir, template_path) for fmt in formats}
+    batches = ((kind, records.get(kind)) for kind in SHEET_COLUMNS) if isinstance(records, dict) else records
+    for kind, batch in batches:
+        for writer in writers.values():
+            writer.append(kind, batch)
+    return {fmt: writer.save() for fmt, writer in writers.items()}
+
+
+# =============================================================================
+# EXPORT MEMOISATION
+# =============================================================================
+
+# Written next to the exports: what each export file was last written from
+EXPORT_MANIFEST_NAME = 'export_manifest.json'
+
+_DIGEST_MODULUS = 1 << 128
+
+
+def records_digest(records: Dict[str, List[Record]]) -> Dict[str, List[int]]:
+    """Order-independent digest of one export's records: kind -> [rows, sum of row hashes mod 2**128].
+
+    Rows are hashed as they are written (export_value of every field), so a
+    change in extraction or formatting changes the digest but a different
+    row order does not. Digests of disjoint record sets add up (see
+    combine_digests), which is how the consolidated export's is built.
+    """
+    digest = {}
+    for kind, kind_records in records.items():
+        if not kind_records:
+            continue
+        total = 0
+        for record in kind_records:
+            row = repr(tuple(export_value(record, field) for field in record.FIELDS)).encode()
+            total += int.from_bytes(hashlib.blake2b(row, digest_size=16).digest(), 'big')
+        digest[kind] = [len(kind_records), total % _DIGEST_MODULUS]
+    return digest
+
+
+def combine_digests(digests: Iterable[Dict[str, List[int]]]) -> Dict[str, List[int]]:
+    """Digest of the union of several record sets (e.g. every session, for the consolidated export)."""
+    combined = {}
+    for digest in digests:
+        for kind, (rows, total) in digest.items():
+            prev_rows, prev_total = combined.get(kind, (0, 0))
+            combined[kind] = [prev_rows + rows, (prev_total + total) % _DIGEST_MODULUS]
+    return combined
+
+
+def digest_key(digest: Dict[str, List[int]]) -> str:
+    return hashlib.sha256(json.dumps(sorted(digest.items())).encode()).hexdigest()
+
+
+class ExportManifest:
+    """export_manifest.json: per export, the record digest, template digest and file per format.
+
+    A requested format whose file exists and was written from the same
+    records and template is kept as it is. With enabled=False every file is
+    rewritten (the manifest is still updated for the next run).
+    """
+
+    def __init__(self, output_dir: str, template_bytes: Optional[bytes], enabled: bool = True):
+        self.path = os.path.join(output_dir, EXPORT_MANIFEST_NAME)
+        self.template = hashlib.sha256(template_bytes).hexdigest() if template_bytes else None
+        self.enabled = enabled
+        self.unchanged = []
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    self.entries = json.load(f).get('exports', {})
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def current_files(self, name: str, key: str, formats: Iterable[str]) -> Dict[str, str]:
+        """Format -> existing file, for the requested formats that need not be rewritten."""
+        entry = self.entries.get(name)
+        if not self.enabled or not entry or entry.get('digest') != key or entry.get('template') != self.template:
+            return {}
+        files = entry.get('files', {})
+        return {fmt: files[fmt] for fmt in formats if fmt in files and os.path.exists(files[fmt])}
+
+    def keep(self, name: str):
+        self.unchanged.append(name)
+
+    def record(self, name: str, key: str, digest: Dict[str, List[int]], files: Dict[str, str]):
+        entry = self.entries.get(name)
+        if not entry or entry.get('digest') != key or entry.get('template') != self.template:
+            entry = self.entries[name] = {'digest': key, 'template': self.template, 'files': {}}
+        entry['files'].update(files)
+        entry['rows'] = {kind: rows for kind, (rows, _) in sorted(digest.items())}
+        entry['written'] = datetime.now().isoformat()
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump({'exports': self.entries}, f, indent=2, sort_keys=True)
+        os.replace(self.path + '.tmp', self.path)
+
+
+def export_memoized(name: str, records, output_dir: str, formats: Iterable[str], manifest: ExportManifest,
+                    digest: Optional[Dict] = None, template_path: Optional[str] = None) -> Tuple[List[str], List[str]]:
+    """export_records, keeping files that already hold exactly these records.
+
+    records as for write_export; the digest must be given when they are
+    (kind, batch) pairs, which are then only read if a file is rewritten.
+    Returns (paths of every requested format, paths actually written).
+    """
+    formats = list(formats)
+    digest = records_digest(records) if digest is None else digest
+    key = digest_key(digest)
+    files = manifest.current_files(name, key, formats)
+    missing = [fmt for fmt in formats if fmt not in files]
+    written = write_export(name, records, output_dir, missing, template_path) if missing else {}
+    files.update(written)
+    if written:
+        manifest.record(name, key, digest, written)
+    else:
+        manifest.keep(name)
+    paths = []
+    for fmt in formats:
+        if files[fmt] not in paths:  # csv and parquet share a directory
+            paths.append(files[fmt])
+    return paths, [path for path in paths if path in written.values()]
+
+
+# =============================================================================
+# VERIFICATION
+# =============================================================================
+
+# Amount field totalled per fee type when a sheet is verified
+VERIFY_AMOUNT_FIELDS = {'receipts': 'net_amount', 'bills': 'net_amount', 'discounts': 'discount_amount'}
+
+
+class VerificationError(RuntimeError):
+    """An exported workbook does not hold the records extracted for it (--verify)."""
+
+
+def record_totals(records: Dict[str, List[Record]]) -> Dict[str, Dict]:
+    """Per record kind: {'rows': n, 'fee_types': {fee_type: [rows, paise]}} of records about to be written."""
+    totals = {}
+    for kind, kind_records in records.items():
+        add_record_totals(totals, kind, kind_records)
+    return totals
+
+
+def add_record_totals(totals: Dict[str, Dict], kind: str, records: List[Record]):
+    """Add a batch of one kind's records to record_totals-style totals."""
+    entry = totals.setdefault(kind, {'rows': 0, 'fee_types': {}})
+    entry['rows'] += len(records)
+    amount_field = VERIFY_AMOUNT_FIELDS.get(kind)
+    if amount_field:
+        fee_types = entry['fee_types']
+        for r in records:
+            fee_type = fee_types.setdefault(r.fee_type or '', [0, 0])
+            fee_type[0] += 1
+            fee_type[1] += getattr(r, amount_field) or 0
+
+
+def verify_layout(plans: Dict[str, SheetPlan]) -> Dict[str, Tuple[str, Optional[int], Optional[int]]]:
+    """Record kind -> (sheet, fee type column, amount column), 0-based, for workbook_totals."""
+    layout = {}
+    for kind, plan in plans.items():
+        amount_field = VERIFY_AMOUNT_FIELDS.get(kind)
+        fee_col = plan.fields.index('fee_type') if amount_field and 'fee_type' in plan.fields else None
+        amount_col = plan.fields.index(amount_field) if amount_field in plan.fields else None
+        layout[kind] = (plan.sheet, fee_col, amount_col)
+    return layout
+
+
+def workbook_totals(filepath: str, layout: Dict[str, Tuple]) -> Dict[str, Dict]:
+    """Read a written workbook back (read-only, streamed) and total it like record_totals."""
+    from openpyxl import load_workbook
+    wb = load_workbook(filepath, read_only=True, data_only=True)
+    totals = {}
+    try:
+        for kind, (sheet, fee_col, amount_col) in layout.items():
+            rows, fee_types = 0, {}
+            if sheet in wb.sheetnames:
+                for row in wb[sheet].iter_rows(min_row=2, values_only=True):
+                    if all(v is None or v == '' for v in row):
+                        continue  # formatted but empty rows at the end of the sheet
+                    rows += 1
+                    if amount_col is not None:
+                        fee_type = row[fee_col] if fee_col is not None and fee_col < len(row) else None
+                        entry = fee_types.setdefault(fee_type or '', [0, 0])
+                        entry[0] += 1
+                        entry[1] += parse_paise(row[amount_col] if amount_col < len(row) else None)
+            totals[kind] = {'rows': rows, 'fee_types': fee_types}
+    finally:
+        wb.close()
+    return totals
+
+
+def compare_totals(expected: Dict[str, Dict], actual: Dict[str, Dict],
+                   layout: Dict[str, Tuple]) -> List[str]:
+    """Human-readable differences between expected and read-back totals."""
+    problems = []
+    for kind, (sheet, _, _) in layout.items():
+        want = expected.get(kind, {'rows': 0, 'fee_types': {}})
+        got = actual.get(kind, {'rows': 0, 'fee_types': {}})
+        if got['rows'] != want['rows']:
+            problems.append(f"{sheet}: {got['rows']} rows, expected {want['rows']}")
+        for fee_type in sorted(set(want['fee_types']) | set(got['fee_types'])):
+            w = want['fee_types'].get(fee_type, [0, 0])
+            g = got['fee_types'].get(fee_type, [0, 0])
+            if list(g) != list(w):
+                problems.append(f"{sheet} / {fee_type or '(blank)'}: {g[0]} rows totalling {paise_to_rupees(g[1])}, "
+                                f"expected {w[0]} rows totalling {paise_to_rupees(w[1])}")
+    return problems
+
+
+def verify_exports(output_dir: str, targets: List[Tuple[str, Dict]], workers: Optional[int] = None,
+                   template_path: Optional[str] = None) -> str:
+    """Read every exported workbook back and compare it with the totals of the records written to it.
+
+    targets are (xlsx path, record_totals of its records). Files are read in
+    parallel, one process each. Writes verification_report.json and raises
+    VerificationError if any workbook differs.
+    """
+    layout = verify_layout(get_template_schema(template_path).plans)
+    workers = max(1, min(len(targets), workers or os.cpu_count() or 1))
+    print(f"Verifying {len(targets)} workbooks...")
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            actuals = list(pool.map(workbook_totals, [path for path, _ in targets], [layout] * len(targets)))
+    else:
+        actuals = [workbook_totals(path, layout) for path, _ in targets]
+    
+    report, failed = [], 0
+    for (path, expected), actual in zip(targets, actuals):
+        problems = compare_totals(expected, actual, layout)
+        failed += bool(problems)
+        report.append({'file': path, 'ok': not problems, 'problems': problems,
+                       'rows': {kind: actual.get(kind, {}).get('rows', 0) for kind in layout}})
+        print(f"  {'✅' if not problems else '❌'} {os.path.basename(path)}")
+        for problem in problems:
+            print(f"      {problem}")
+    
+    report_path = os.path.join(output_dir, "verification_report.json")
+    with open(report_path, 'w') as f:
+        json.dump({'verified': len(targets), 'failed': failed, 'files': report}, f, indent=2)
+    if failed:
+        raise VerificationError(f"{failed} of {len(targets)} workbooks do not match the extracted data "
+                                f"(see {report_path})")
+    print(f"Verified {len(targets)} workbooks against extraction totals.")
+    return report_path
+
+
+def xlsx_path(paths: Iterable[str]) -> Optional[str]:
+    """The workbook among one export's output files."""
+    return next((path for path in paths if path.endswith('.xlsx')), None)
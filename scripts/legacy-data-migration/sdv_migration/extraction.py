@@ -0,0 +1,823 @@
+"""Extraction of records from the legacy tables, grouped by session."""
+
+import re
+import heapq
+import pickle
+import tempfile
+from bisect import bisect_right
+from collections import defaultdict
+from collections.abc import Mapping
+from operator import itemgetter
+from typing import Dict, List, Tuple, Optional, Iterable
+
+from .mapping import LegacyMapping, column_value, get_default_mapping, is_valid_fee
+from .records import BillRecord, DiscountRecord, HistoryRecord, ReceiptRecord, StudentRecord
+from .cleaning import (PLACEHOLDER_VALUES, clean_aadhar, clean_date, clean_gender, clean_phone, clean_text,
+                       date_sort_key, parse_paise)
+from .staging import StagedLookup, StagedRows
+
+
+# Memory budget (MB) of disk-spilling groupers (admissionpayment transactions)
+GROUP_MEMORY_MB = 256
+GROUP_ENTRY_BYTES = 200  # rough cost of one buffered row (key tuple, value tuple, list slot)
+
+
+# =============================================================================
+# EXTERNAL GROUPING
+# =============================================================================
+
+class SpillingGrouper:
+    """Group (key, value) pairs by key within a memory budget.
+
+    Rows are buffered as key -> [values] with compact tuple keys. When the
+    estimated buffer size passes memory_mb the buffer is sorted by key and
+    written as one run to a temporary file; groups() then merges all runs with
+    heapq.merge (stable, so values keep their input order). Without any spill
+    groups come out in first-seen key order, otherwise in key order.
+    """
+
+    def __init__(self, memory_mb: float = GROUP_MEMORY_MB, tmp_dir: Optional[str] = None):
+        self.limit = max(1, int(memory_mb * 1024 * 1024 / GROUP_ENTRY_BYTES))
+        self.tmp_dir = tmp_dir
+        self.buffer = {}
+        self.buffered = 0
+        self.runs = []
+
+    def add(self, key: Tuple, value) -> None:
+        values = self.buffer.get(key)
+        if values is None:
+            self.buffer[key] = [value]
+        else:
+            values.append(value)
+        self.buffered += 1
+        if self.buffered >= self.limit:
+            self._spill()
+
+    def _spill(self) -> None:
+        run = tempfile.TemporaryFile(dir=self.tmp_dir)
+        pickler = pickle.Pickler(run, pickle.HIGHEST_PROTOCOL)
+        for key in sorted(self.buffer):
+            pickler.dump((key, self.buffer[key]))
+            pickler.clear_memo()
+        run.seek(0)
+        self.runs.append(run)
+        self.buffer, self.buffered = {}, 0
+
+    @staticmethod
+    def _read_run(run) -> Iterable[Tuple]:
+        try:
+            while True:
+                # One unpickler per group: each was pickled with a fresh memo
+                yield pickle.load(run)
+        except EOFError:
+            pass
+        finally:
+            run.close()
+
+    def groups(self) -> Iterable[Tuple[Tuple, List]]:
+        """(key, values) for every key added, each key exactly once."""
+        if not self.runs:
+            buffer, self.buffer, self.buffered = self.buffer, {}, 0
+            yield from buffer.items()
+            return
+        if self.buffer:
+            self._spill()
+        runs, self.runs = self.runs, []
+        current, values = None, None
+        for key, chunk in heapq.merge(*map(self._read_run, runs), key=itemgetter(0)):
+            if values is not None and key == current:
+                values.extend(chunk)
+                continue
+            if values is not None:
+                yield current, values
+            current, values = key, chunk
+        if values is not None:
+            yield current, values
+
+
+# =============================================================================
+# DATA EXTRACTION
+# =============================================================================
+
+def extract_students(tables: Dict, mapping: Optional[LegacyMapping] = None) -> Dict[str, List[StudentRecord]]:
+    """Extract and clean student data, grouped by session."""
+    mapping = mapping or get_default_mapping()
+    students_by_session = defaultdict(list)
+    table = mapping.table('students')
+    c = mapping.columns('students')
+    
+    if table not in tables:
+        return students_by_session
+    
+    for row in source_rows(tables[table], c, required=('session', 'student_id', 'name')):
+        session = canonical_session(column_value(row, c['session']))
+        if not session:
+            continue
+        
+        # Clean phone - try the phone column first, then extract from address
+        phone, _ = clean_phone(column_value(row, c['phone']))
+        if not phone:
+            # Try extracting from address fields
+            for addr_field in ('address', 'permanent_address'):
+                addr = column_value(row, c[addr_field])
+                phone_match = re.search(r'(\d{10})', addr)
+                if phone_match:
+                    phone = phone_match.group(1)
+                    break
+        
+        # Build address from components
+        addr_parts = [clean_text(column_value(row, c['address'])), clean_text(column_value(row, c['address_line2']))]
+        address = ', '.join([p for p in addr_parts if p and not re.match(r'^\d{10}$', p)])
+        
+
+        # Fix Class Name
+        student_class = clean_text(column_value(row, c['class_name']))
+        if not student_class or student_class in PLACEHOLDER_VALUES or student_class == '-':
+            student_class = 'PASS OUT'
+        
+        # Determine Status
+        status = column_value(row, c['status']).lower()
+        if student_class == 'PASS OUT' or student_class == 'Pass Out':
+            status = 'alumni'
+        else:
+             status = 'active' if status == 'active' else 'inactive'
+
+        student = StudentRecord(
+            student_id=column_value(row, c['student_id']),
+            name=clean_text(column_value(row, c['name'])),
+            father_name=clean_text(column_value(row, c['father_name'])),
+            mother_name=clean_text(column_value(row, c['mother_name'])),
+            dob=clean_date(column_value(row, c['dob']))[0],
+            gender=clean_gender(column_value(row, c['gender'])),
+            class_name=student_class,
+            section=clean_text(column_value(row, c['section'])) or 'A',
+            roll=clean_text(column_value(row, c['roll'])),
+            admission_date=clean_date(column_value(row, c['admission_date']))[0],
+            phone=phone,
+            whats_app=phone, # Default WhatsApp to mobile
+            email=clean_text(column_value(row, c['email'])),
+            address=address if address else 'Address Not Available',
+            aadhar=clean_aadhar(column_value(row, c['aadhar'])),
+            category=clean_text(column_value(row, c['category'])) or 'NA',
+            religion=clean_text(column_value(row, c['religion'])),
+            status=status,
+            session=session,
+            father_occupation=clean_text(column_value(row, c['father_occupation'])),
+            mother_occupation=clean_text(column_value(row, c['mother_occupation'])),
+            father_aadhar=clean_aadhar(column_value(row, c['father_aadhar'])),
+            mother_aadhar=clean_aadhar(column_value(row, c['mother_aadhar'])),
+        )
+        
+        if student.name and student.student_id:
+            students_by_session[session].append(student)
+            
+    # Deduplicate roll numbers within each session
+    for session, students in students_by_session.items():
+        students_by_session[session] = deduplicate_roll_numbers(students)
+    
+    return students_by_session
+
+def deduplicate_roll_numbers(students: List[StudentRecord]) -> List[StudentRecord]:
+    """Ensure uniqueness of Roll Numbers within Class & Section."""
+    # Key: (class, section) -> set of seen rolls
+    seen_rolls = defaultdict(set)
+    # Key: (class, section) -> list of students with duplicate/invalid rolls
+    to_fix = defaultdict(list)
+    
+    cleaned_students = []
+    
+    # First pass: Collect valid unique rolls
+    for s in students:
+        cls = s.class_name
+        sec = s.section
+        roll = s.roll
+        
+        if not roll or roll in PLACEHOLDER_VALUES:
+            to_fix[(cls, sec)].append(s)
+            continue
+            
+        key = (cls, sec)
+        if roll in seen_rolls[key]:
+            to_fix[key].append(s)
+        else:
+            seen_rolls[key].add(roll)
+            cleaned_students.append(s)
+            
+    # Second pass: Fix duplicates and missing
+    for key, bad_students in to_fix.items():
+        cls, sec = key
+        existing = seen_rolls[key]
+        
+        # Strategies to resolve duplicates:
+        # 1. Prefix with '000' (User request) to mark them explicitly
+        # 2. If '000' prefix conflicts or exceeds length, fallback to next available integer
+        
+        # Determine next available numeric roll for fallback cases
+        max_roll = 0
+        for r in existing:
+            if r.isdigit():
+                max_roll = max(max_roll, int(r))
+        next_roll = max_roll + 1
+        
+        for s in bad_students:
+            original_roll = s.roll
+            
+            # Strategy 1: Try adding '000' prefix
+            # Note: Max DB length is 10 chars
+            if original_roll and original_roll not in PLACEHOLDER_VALUES:
+                candidate = "000" + original_roll
+                # Make sure it's unique and fits in DB
+                if candidate not in existing and len(candidate) <= 10:
+                    s = s.replace(roll=candidate)
+                    existing.add(candidate)
+                    continue
+                    
+                # If 000 prefix fails (taken or too long), try 0000
+                candidate = "0000" + original_roll
+                if candidate not in existing and len(candidate) <= 10:
+                    s = s.replace(roll=candidate)
+                    existing.add(candidate)
+                    continue
+            
+            # Strategy 2: Fallback to next available numeric
+            while str(next_roll) in existing:
+                next_roll += 1
+            
+            new_roll = str(next_roll)
+            s = s.replace(roll=new_roll)
+            existing.add(new_roll)
+            cleaned_students.append(s)
+            
+    return cleaned_students
+
+def student_id_set(students_by_session: Dict) -> set:
+    """All student IDs (as strings) in a session -> students index."""
+    all_student_ids = set()
+    for session_students in students_by_session.values():
+        for s in session_students:
+            all_student_ids.add(str(s.student_id))
+    return all_student_ids
+
+
+def source_rows(table: Dict, columns: Dict[str, Tuple[str, ...]], fee_columns: List[Tuple[str, int, str]] = (),
+                student_ids: Optional[set] = None, required: Iterable[str] = ()) -> Iterable:
+    """Rows of a table for one of the *_records generators.
+
+    Parsed rows are returned as they are. Staged rows are narrowed in SQLite
+    first: only the mapped and fee columns are read, rows with an empty
+    required field are skipped, and with student_ids only rows of known
+    students are read, joined on the indexed student column. The generators
+    still apply their own checks, so both paths yield the same records.
+    """
+    rows = table['rows']
+    if not isinstance(rows, StagedRows):
+        return rows
+    join = None
+    if student_ids is not None:
+        rows.db.load_students(student_ids)
+        join = columns['student_id']
+    wanted = [name for names in columns.values() for name in names] + [col for col, _, _ in fee_columns]
+    return rows.select(wanted, join=join, where=[columns[field] for field in required])
+
+
+def bill_meta_entry(row: Dict, columns: Dict[str, Tuple[str, ...]]) -> Dict:
+    """{year, month, date} of one demandbillsec row."""
+    return {
+        'year': canonical_session(column_value(row, columns['session'])),
+        'month': column_value(row, columns['month']),
+        'date': clean_date(column_value(row, columns['date']), fallback='')[0]
+    }
+
+
+def bill_meta_lookup(rows: Iterable, calendar: Optional['SessionCalendar'] = None,
+                     mapping: Optional[LegacyMapping] = None) -> Mapping:
+    """billNo -> {year, month, date} from demandbillsec rows.
+
+    With a calendar, bills whose billYear is missing get the session of their
+    date, resolved for the whole table in one vectorized lookup. Rows staged in
+    SQLite are not loaded at all: each bill is looked up on the billNo index.
+    """
+    columns = (mapping or get_default_mapping()).columns('demand_bills', 'meta_columns')
+    if isinstance(rows, StagedRows):
+        def staged_entry(row: Dict) -> Dict:
+            meta = bill_meta_entry(row, columns)
+            if calendar is not None and not meta['year']:
+                meta['year'] = calendar.session_for(meta['date'])
+            return meta
+        return StagedLookup(rows, columns['bill_no'][0], staged_entry)
+    
+    bill_meta = {}
+    for row in rows:
+        bill_no = column_value(row, columns['bill_no'])
+        if bill_no:
+            bill_meta[bill_no] = bill_meta_entry(row, columns)
+    if calendar is not None:
+        undated = [meta for meta in bill_meta.values() if not meta['year']]
+        for meta, session in zip(undated, calendar.sessions_for([meta['date'] for meta in undated])):
+            meta['year'] = session
+    return bill_meta
+
+
+def financial_year_lookup(rows: Iterable, mapping: Optional[LegacyMapping] = None) -> Dict[str, str]:
+    """financialid -> financialyear from financialmaster rows."""
+    columns = (mapping or get_default_mapping()).columns('admission_payments', 'year_columns')
+    year_map = {}
+    for row in rows:
+        fid = column_value(row, columns['id'])
+        fyear = canonical_session(column_value(row, columns['session']))
+        if fid and fyear:
+            year_map[str(fid)] = fyear
+    return year_map
+
+
+SESSION_PATTERN = re.compile(r'(\d{4})\s*[-/]\s*(\d{2}|\d{4})')
+
+
+def canonical_session(value) -> str:
+    """'2023-2024', '2023-24', '2023/24' -> '2023-2024'; '' if not an April-March session label."""
+    match = SESSION_PATTERN.fullmatch(str(value or '').strip())
+    if not match:
+        return ''
+    start, end = int(match.group(1)), match.group(2)
+    if int(end) % 100 != (start + 1) % 100:
+        return ''
+    return f'{start}-{start + 1}'
+
+
+class SessionCalendar:
+    """The school's academic sessions as sorted April-March boundaries.
+
+    Built once from financialmaster and the sessions seen in student_details.
+    A date resolves to its session with a binary search over the session start
+    dates (YYYYMMDD keys, see date_sort_key); sessions_for does the same for a
+    whole column with numpy. Dates outside every known session resolve to ''.
+    """
+
+    def __init__(self, sessions: Iterable[str] = (), year_ids: Optional[Dict[str, str]] = None):
+        names = sorted({s for s in map(canonical_session, sessions) if s})
+        self.sessions = names
+        self.starts = [int(s[:4]) * 10000 + 401 for s in names]
+        self.ends = [start + 10000 for start in self.starts]
+        self.year_ids = dict(year_ids or {})
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def session_for(self, date_str: str) -> str:
+        """Session containing a 'DD-MM-YYYY' / 'YYYY-MM-DD' date."""
+        key = date_sort_key(date_str)
+        i = bisect_right(self.starts, key) - 1
+        if key and i >= 0 and key < self.ends[i]:
+            return self.sessions[i]
+        return ''
+
+    def sessions_for(self, dates: List[str]) -> List[str]:
+        """session_for over a whole column of dates."""
+        if not dates or not self.sessions:
+            return [''] * len(dates)
+        try:
+            import numpy as np
+        except ImportError:  # --discover runs without numpy
+            return [self.session_for(d) for d in dates]
+        keys = np.fromiter((date_sort_key(d) for d in dates), dtype=np.int64, count=len(dates))
+        idx = np.searchsorted(np.asarray(self.starts, dtype=np.int64), keys, side='right') - 1
+        known = (keys > 0) & (idx >= 0)
+        known[known] &= keys[known] < np.asarray(self.ends, dtype=np.int64)[idx[known]]
+        names = np.asarray(self.sessions + [''], dtype=object)
+        return names[np.where(known, idx, -1)].tolist()
+
+    def session_named(self, value) -> str:
+        """A financialmaster id, session label or bare start year -> known session ('' if none)."""
+        value = str(value or '').strip()
+        session = self.year_ids.get(value) or canonical_session(value)
+        if not session and value.isdigit() and len(value) == 4:
+            session = f'{value}-{int(value) + 1}'
+        return session if session in self.sessions else ''
+
+    @staticmethod
+    def period(session: str, month) -> Tuple[Optional[int], Optional[int]]:
+        """(month, calendar year) of a month number within an April-March session."""
+        try:
+            month = int(month)
+        except (TypeError, ValueError):
+            return None, None
+        if not session or not 1 <= month <= 12:
+            return None, None
+        start = int(session[:4])
+        return month, start if month >= 4 else start + 1
+
+
+def session_calendar(tables: Dict, students_by_session: Dict,
+                     mapping: Optional[LegacyMapping] = None) -> SessionCalendar:
+    """SessionCalendar from financialmaster plus the student sessions."""
+    mapping = mapping or get_default_mapping()
+    year_table = mapping.table('admission_payments', 'year_table')
+    year_ids = financial_year_lookup(tables[year_table]['rows'], mapping) if year_table in tables else {}
+    return SessionCalendar(list(students_by_session) + list(year_ids.values()), year_ids)
+
+
+# The *_records generators turn rows of one legacy table into (session, record)
+# pairs. The extract_* functions below run them over a whole parsed table; the
+# streaming pipeline runs them over one INSERT statement's rows at a time.
+
+def demand_bill_records(rows: Iterable, columns: List[str], student_ids: set, bill_meta: Dict,
+                        mapping: LegacyMapping, calendar: SessionCalendar) -> Iterable[Tuple[str, BillRecord]]:
+    """(session, BillRecord) for every fee component of demandbillnew rows."""
+    # Fee columns present in this dump's demandbillnew header
+    fee_columns = mapping.fee_columns('demand_bills', columns)
+    c = mapping.columns('demand_bills')
+
+    for row in rows:
+        bill_no = column_value(row, c['bill_no'])
+        student_id = str(column_value(row, c['student_id']))
+        
+        if not bill_no or not student_id or student_id not in student_ids:
+            continue
+
+        # Get metadata
+        meta = bill_meta.get(bill_no, {})
+        session = meta.get('year', '')
+        bill_date = meta.get('date', '')
+        
+        # Fallback if session missing in meta (check row itself just in case)
+        if not session:
+            session = calendar.session_named(column_value(row, c['session']))
+        
+        if not session:
+            # Orphan bill: no session in any source and no date inside a known session
+            continue
+        
+        # Bills without a usable date are dated the 1st of their bill month
+        month, year = calendar.period(session, meta.get('month'))
+        if not bill_date:
+            bill_date = f'01-{month:02d}-{year}' if month else f'01-04-{session[:4]}'
+
+        # Map known columns to Fee Types (see mapping 'demand_bills.fee_columns')
+        for col, _, fee_type in fee_columns:
+            amount = parse_paise(row.get(col, '0'))
+            
+            if is_valid_fee(fee_type, amount):
+                yield session, BillRecord(
+                    student_id=student_id,
+                    bill_no=bill_no,
+                    bill_date=bill_date,
+                    fee_type=fee_type,
+                    amount=amount,
+                    net_amount=amount, # Default net
+                    **({} if date_sort_key(bill_date) else {'month': month, 'year': year})
+                )
+        
+        # NOTE: We ignore 'Dues' column from the bill because it represents 
+        # cumulative arrears which the system will calculate automatically 
+        # from the imported historical bills and receipts. 
+        # Adding it here would duplicate the debt every month.
+
+
+def extract_demand_bills(tables: Dict, students_by_session: Dict, mapping: Optional[LegacyMapping] = None,
+                         calendar: Optional[SessionCalendar] = None) -> Dict[str, List[BillRecord]]:
+    """Extract demand bills joining demandbillnew (amounts) and demandbillsec (meta)."""
+    mapping = mapping or get_default_mapping()
+    bills_by_session = defaultdict(list)
+    table = mapping.table('demand_bills')
+    meta_table = mapping.table('demand_bills', 'meta_table')
+    
+    if table not in tables or meta_table not in tables:
+        return bills_by_session
+
+    calendar = calendar or session_calendar(tables, students_by_session, mapping)
+    bill_meta = bill_meta_lookup(tables[meta_table]['rows'], calendar, mapping)
+    student_ids = student_id_set(students_by_session)
+    rows = source_rows(tables[table], mapping.columns('demand_bills'),
+                       mapping.fee_columns('demand_bills', tables[table]['columns']), student_ids, ('bill_no',))
+    records = demand_bill_records(rows, tables[table]['columns'], student_ids, bill_meta, mapping, calendar)
+    for session, bill in records:
+        bills_by_session[session].append(bill)
+    return bills_by_session
+
+
+def admission_payment_records(rows: Iterable, student_ids: set, calendar: SessionCalendar,
+                              mapping: LegacyMapping,
+                              memory_mb: float = GROUP_MEMORY_MB) -> Iterable[Tuple[str, ReceiptRecord]]:
+    """(session, ReceiptRecord) per item of admissionpayment rows, grouped by transaction.
+
+    Rows are grouped by (transactionId, studentId) in a SpillingGrouper, so
+    installs with many years of payments spill to disk past memory_mb.
+    """
+    # Group by transactionId to form receipts: (tid, sid) -> [(session, description, paise)]
+    # Since we lack a date table, we default to 1st April of the session start year
+    transactions = SpillingGrouper(memory_mb)
+    c = mapping.columns('admission_payments')
+
+    for row in rows:
+        tid = column_value(row, c['transaction_id'])
+        sid = str(column_value(row, c['student_id']))
+        yid = str(column_value(row, c['year_id']))
+        desc = column_value(row, c['description'], 'Fee')
+        amt = parse_paise(column_value(row, c['amount'], '0'))
+        
+        if not tid or not sid or sid not in student_ids:
+            continue
+            
+        # yearId is normally a financialmaster id; some rows carry the session
+        # label or start year itself, or a payment date instead
+        session = calendar.session_named(yid)
+        if not session:
+            session = calendar.session_for(clean_date(column_value(row, c['payment_date']), fallback='')[0])
+        if not session:
+            continue
+        
+        transactions.add((tid, sid), (session, desc, amt))  # composite key just in case
+
+    # Convert to standard receipt format
+    for (tid, sid), items in transactions.groups():
+        session = items[-1][0]  # the transaction's last row wins
+        
+        # Generate default date
+        # 2018-2019 -> 01-04-2018
+        start_year = session.split('-')[0]
+        default_date = f"{start_year}-04-01"
+        
+        # Map description to standard fee types via the mapping's aliases
+        # ('Conveyance' -> 'Transport Fee'); unknown descriptions pass through.
+        for _, desc, amount in items:
+            mapped_type = mapping.fee_type(desc)
+            
+            if is_valid_fee(mapped_type, amount):
+                yield session, ReceiptRecord(
+                    student_id=sid,
+                    receipt_no=f"ADM-{tid}", # Prefix to distinguish
+                    receipt_date=default_date,
+                    fee_type=mapped_type,
+                    amount=amount,
+                    discount=0, # Admissionpayment usually net
+                    payment_mode='CASH', # Default
+                    payment_ref='',
+                    source='admission_payments'
+                )
+
+
+def extract_admission_payments(tables: Dict, students_by_session: Dict, mapping: Optional[LegacyMapping] = None,
+                               calendar: Optional[SessionCalendar] = None,
+                               memory_mb: float = GROUP_MEMORY_MB) -> Dict[str, List[ReceiptRecord]]:
+    """Extract admissionpayment data as fee receipts."""
+    mapping = mapping or get_default_mapping()
+    receipts_by_session = defaultdict(list)
+    table = mapping.table('admission_payments')
+    
+    if table not in tables:
+        return receipts_by_session
+
+    calendar = calendar or session_calendar(tables, students_by_session, mapping)
+    student_ids = student_id_set(students_by_session)
+    rows = source_rows(tables[table], mapping.columns('admission_payments'),
+                       student_ids=student_ids, required=('transaction_id',))
+    records = admission_payment_records(rows, student_ids, calendar, mapping, memory_mb)
+    for session, receipt in records:
+        receipts_by_session[session].append(receipt)
+    return receipts_by_session
+
+
+def detailed_transaction_records(rows: Iterable, columns: List[str], student_ids: set,
+                                 mapping: LegacyMapping) -> Iterable[Tuple[str, ReceiptRecord]]:
+    """(session, ReceiptRecord) per fee column of feetransaction_new rows (has breakdown)."""
+    # Map columns to fee types (see mapping 'modern_transactions.fee_columns')
+    fee_columns = mapping.fee_columns('modern_transactions', columns)
+    c = mapping.columns('modern_transactions')
+    
+    for row in rows:
+        session = canonical_session(column_value(row, c['session']))
+        sid = str(column_value(row, c['student_id']))
+        
+        if not session or not sid or sid not in student_ids:
+            continue
+            
+        r_no = column_value(row, c['receipt_no'])
+        r_date = clean_date(column_value(row, c['date']))[0]
+        
+        # Extract items
+        for col, _, ftype in fee_columns:
+            amt = parse_paise(row.get(col, '0'))
+            if amt > 0:
+                yield session, ReceiptRecord(
+                    student_id=sid,
+                    receipt_no=f"REC-{r_no}",
+                    receipt_date=r_date,
+                    fee_type=ftype,
+                    amount=amt,
+                    discount=0,
+                    payment_mode='Cash', # Assumption
+                    payment_ref='',
+                    source='modern_transactions'
+                )
+
+
+def consolidated_transaction_records(rows: Iterable, student_ids: set,
+                                     mapping: LegacyMapping) -> Iterable[Tuple[str, ReceiptRecord]]:
+    """(session, ReceiptRecord) per feetransaction_newtwo row (consolidated, no breakdown)."""
+    default_fee_type = mapping.option('consolidated_transactions', 'default_fee_type', 'Tuition Fee')
+    c = mapping.columns('consolidated_transactions')
+    for row in rows:
+        session = canonical_session(column_value(row, c['session']))
+        sid = str(column_value(row, c['student_id']))
+        
+        if not session or not sid or sid not in student_ids:
+            continue
+            
+        r_no = column_value(row, c['receipt_no'])
+        r_date = clean_date(column_value(row, c['date']))[0]
+        paid_amt = parse_paise(column_value(row, c['paid_amount'], '0'))
+        
+        # If we don't have breakdown columns, we treat as consolidated
+        # Note: The table might have columns we didn't see in the CREATE snippet if they were truncated?
+        # But relying on what we saw: valid logic is to take paidAmt.
+        
+        if paid_amt > 0:
+            yield session, ReceiptRecord(
+                student_id=sid,
+                receipt_no=f"REC2-{r_no}",
+                receipt_date=r_date,
+                fee_type=default_fee_type, # Defaulting to Tuition as safe bet, or 'Consolidated Fee'
+                # User requested specific fee types matching legacy names. 
+                # 'Consolidated Fee' might not exist in their system.
+                # 'Tuition Fee' is safest for "general payment".
+                amount=paid_amt,
+                discount=0,
+                payment_mode=column_value(row, c['payment_mode'], 'Cash'),
+                payment_ref=column_value(row, c['payment_ref']),
+                source='consolidated_transactions'
+            )
+
+
+def extract_modern_transactions(tables: Dict, students_by_session: Dict,
+                                mapping: Optional[LegacyMapping] = None) -> Dict[str, List[ReceiptRecord]]:
+    """Extract receipts from feetransaction_new (detailed) and feetransaction_newtwo (consolidated)."""
+    mapping = mapping or get_default_mapping()
+    receipts_by_session = defaultdict(list)
+    detailed_table = mapping.table('modern_transactions')
+    consolidated_table = mapping.table('consolidated_transactions')
+    all_student_ids = student_id_set(students_by_session)
+
+    # 1. feetransaction_new (Has breakdown)
+    if detailed_table in tables:
+        columns = tables[detailed_table]['columns']
+        rows = source_rows(tables[detailed_table], mapping.columns('modern_transactions'),
+                           mapping.fee_columns('modern_transactions', columns), all_student_ids, ('session',))
+        records = detailed_transaction_records(rows, columns, all_student_ids, mapping)
+        for session, receipt in records:
+            receipts_by_session[session].append(receipt)
+
+    # 2. feetransaction_newtwo (Consolidated?)
+    if consolidated_table in tables:
+        rows = source_rows(tables[consolidated_table], mapping.columns('consolidated_transactions'),
+                           student_ids=all_student_ids, required=('session',))
+        records = consolidated_transaction_records(rows, all_student_ids, mapping)
+        for session, receipt in records:
+            receipts_by_session[session].append(receipt)
+
+    return receipts_by_session
+
+
+def fee_receipt_records(rows: Iterable, columns: List[str], student_ids: set,
+                        mapping: LegacyMapping) -> Iterable[Tuple[str, ReceiptRecord]]:
+    """(session, ReceiptRecord) per fee column of feereceipt rows."""
+    fee_columns = mapping.fee_columns('fee_receipts', columns)
+    c = mapping.columns('fee_receipts')
+    
+    for row in rows:
+        session = canonical_session(column_value(row, c['session']))
+        student_id = str(column_value(row, c['student_id']))
+        
+        if not session or not student_id:
+            continue
+        
+        # Check if student exists
+        if student_id not in student_ids:
+            continue  # Orphan receipt - skip
+        
+        receipt_no = column_value(row, c['receipt_no'])
+        receipt_date = clean_date(column_value(row, c['date']))[0]
+        payment_mode = column_value(row, c['payment_mode'], 'Cash')
+        if payment_mode in PLACEHOLDER_VALUES:
+            payment_mode = 'Cash'
+        
+        # Extract individual fee amounts
+        for legacy_col, _, fee_type in fee_columns:
+            amount = parse_paise(row.get(legacy_col, '0'))
+            
+            if is_valid_fee(fee_type, amount):
+                yield session, ReceiptRecord(
+                    student_id=student_id,
+                    receipt_no=receipt_no,
+                    receipt_date=receipt_date,
+                    fee_type=fee_type,
+                    amount=amount,
+                    discount=0,
+                    payment_mode=payment_mode,
+                    payment_ref=column_value(row, c['payment_ref']),
+                    source='fee_receipts',
+                )
+
+
+def extract_fee_receipts(tables: Dict, students_by_session: Dict,
+                         mapping: Optional[LegacyMapping] = None) -> Dict[str, List[ReceiptRecord]]:
+    """Extract fee receipts, grouped by session."""
+    mapping = mapping or get_default_mapping()
+    receipts_by_session = defaultdict(list)
+    table = mapping.table('fee_receipts')
+    
+    if table not in tables:
+        return receipts_by_session
+    
+    student_ids = student_id_set(students_by_session)
+    rows = source_rows(tables[table], mapping.columns('fee_receipts'),
+                       mapping.fee_columns('fee_receipts', tables[table]['columns']), student_ids, ('session',))
+    records = fee_receipt_records(rows, tables[table]['columns'], student_ids, mapping)
+    for session, receipt in records:
+        receipts_by_session[session].append(receipt)
+    return receipts_by_session
+
+
+def discount_records(rows: Iterable, columns: List[str],
+                     mapping: LegacyMapping) -> Iterable[Tuple[str, DiscountRecord]]:
+    """(session, DiscountRecord) per fee column of concessiontable rows."""
+    fee_columns = mapping.fee_columns('discounts', columns)
+    c = mapping.columns('discounts')
+    
+    for row in rows:
+        session = canonical_session(column_value(row, c['session']))
+        student_id = str(column_value(row, c['student_id']))
+        
+        if not session or not student_id:
+            continue
+        
+        # Extract discount amounts for each fee type
+        for legacy_col, _, fee_type in fee_columns:
+            amount = parse_paise(row.get(legacy_col, '0'))
+            
+            if is_valid_fee(fee_type, amount):
+                yield session, DiscountRecord(
+                    student_id=student_id,
+                    fee_type=fee_type,
+                    discount_amount=amount,
+                    discount_type='Fixed',
+                    reason='Migrated from legacy system',
+                )
+
+
+def extract_discounts(tables: Dict, students_by_session: Dict,
+                      mapping: Optional[LegacyMapping] = None) -> Dict[str, List[DiscountRecord]]:
+    """Extract student discounts from concessiontable."""
+    mapping = mapping or get_default_mapping()
+    discounts_by_session = defaultdict(list)
+    table = mapping.table('discounts')
+    
+    if table not in tables:
+        return discounts_by_session
+    
+    # Not joined on the students: discounts of unknown students are reported as orphans
+    rows = source_rows(tables[table], mapping.columns('discounts'),
+                       mapping.fee_columns('discounts', tables[table]['columns']), required=('session', 'student_id'))
+    for session, discount in discount_records(rows, tables[table]['columns'], mapping):
+        discounts_by_session[session].append(discount)
+    return discounts_by_session
+
+def build_academic_history(students_by_session: Dict[str, List[StudentRecord]]) -> Dict[str, List[HistoryRecord]]:
+    """Derive Academic_History rows from each student's per-session rows.
+
+    All rows are grouped by student_id in one pass and ordered by session. A
+    session's outcome comes from the next session's class: a different class
+    is 'promoted', the same class 'detained' (retained), and 'PASS OUT' means
+    'passed' (alumni). The latest session of a student still studying has no
+    outcome yet and is not emitted. Returns history grouped by session.
+    """
+    by_student = defaultdict(list)
+    for session, session_students in students_by_session.items():
+        for s in session_students:
+            by_student[str(s.student_id)].append(s)
+
+    history_by_session = defaultdict(list)
+    for student_id, rows in by_student.items():
+        rows.sort(key=lambda s: s.session)
+        for current, following in zip(rows, rows[1:] + [None]):
+            if current.status == 'alumni':
+                continue  # 'PASS OUT' rows carry no class of their own
+            if following is None:
+                break
+            if following.session == current.session:
+                continue  # duplicate row within a session
+            if following.status == 'alumni':
+                status, final_result = 'passed', 'Passed Out'
+            elif following.class_name == current.class_name:
+                status, final_result = 'detained', 'Retained'
+            else:
+                status, final_result = 'promoted', 'Promoted'
+            history_by_session[current.session].append(HistoryRecord(
+                student_id=student_id,
+                session=current.session,
+                class_name=current.class_name,
+                section=current.section,
+                roll=current.roll,
+                status=status,
+                final_result=final_result,
+            ))
+    return history_by_session
@@ -0,0 +1,167 @@
+"""Merging student IDs that belong to the same person (--resolve-identities)."""
+
+import re
+from difflib import SequenceMatcher
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from .records import Record, StudentRecord
+
+
+# =============================================================================
+# IDENTITY RESOLUTION
+# =============================================================================
+
+# Titles dropped before comparing names ('Late Shri Ram Kumar' == 'Ram Kumar')
+NAME_HONORIFICS = {'mr', 'mrs', 'ms', 'miss', 'shri', 'sri', 'smt', 'km', 'kumari', 'master', 'late', 'dr'}
+
+# Blocks with more members than this (a school office phone, a placeholder DOB)
+# carry no identity signal and are skipped rather than compared pairwise
+IDENTITY_BLOCK_LIMIT = 50
+
+# Minimum name similarity for two students sharing only a phone number
+IDENTITY_NAME_SCORE = 0.9
+
+
+def normalize_person_name(name: str) -> str:
+    tokens = re.findall(r'[a-z0-9]+', str(name or '').lower())
+    return ' '.join(t for t in tokens if t not in NAME_HONORIFICS)
+
+
+class UnionFind:
+    """Disjoint sets over hashable items (path halving, union by size)."""
+
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+
+    def find(self, item):
+        parent = self.parent.setdefault(item, item)
+        while parent != item:
+            grandparent = self.parent[parent]
+            self.parent[item] = grandparent
+            item, parent = parent, self.parent[grandparent]
+        return item
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if self.size.get(a, 1) < self.size.get(b, 1):
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] = self.size.get(a, 1) + self.size.get(b, 1)
+
+
+def resolve_student_identities(students_by_session: Dict[str, List[StudentRecord]]) -> Tuple[Dict[str, str], List[Dict]]:
+    """Find student IDs that belong to the same person (re-admissions, double entries).
+
+    Each ID is profiled from its latest row and put into blocking indexes:
+    normalised name + father name, name + DOB, and phone. Only IDs sharing a
+    block are compared, so the work is linear in the number of students
+    rather than quadratic. Name + father and name + DOB blocks are matches
+    in themselves; a shared phone also needs the names to be near-identical
+    (siblings share phones). Matches are clustered with union-find and each
+    cluster keeps the ID first seen (earliest session).
+
+    Returns (merge map {duplicate ID: canonical ID}, report of clusters).
+    """
+    first_session, profile = {}, {}
+    for session in sorted(students_by_session):
+        for s in students_by_session[session]:
+            sid = str(s.student_id)
+            first_session.setdefault(sid, session)
+            profile[sid] = s
+    
+    names = {}
+    blocks = defaultdict(list)
+    for sid, s in profile.items():
+        name = names[sid] = normalize_person_name(s.name)
+        if not name:
+            continue
+        father = normalize_person_name(s.father_name)
+        if father:
+            blocks[('name+father', name, father)].append(sid)
+        if s.dob and s.dob != '01-01-2000':  # clean_date fallback carries no information
+            blocks[('name+dob', name, s.dob)].append(sid)
+        if s.phone:
+            blocks[('phone', s.phone)].append(sid)
+    
+    clusters = UnionFind()
+    edges = []
+    for key, members in blocks.items():
+        if len(members) < 2 or len(members) > IDENTITY_BLOCK_LIMIT:
+            continue
+        if key[0] != 'phone':
+            for other in members[1:]:
+                clusters.union(members[0], other)
+                edges.append((members[0], other, key[0]))
+            continue
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                if SequenceMatcher(None, names[a], names[b]).ratio() >= IDENTITY_NAME_SCORE:
+                    clusters.union(a, b)
+                    edges.append((a, b, key[0]))
+    
+    groups = defaultdict(list)
+    for sid in clusters.parent:
+        groups[clusters.find(sid)].append(sid)
+    evidence = defaultdict(set)
+    for a, _, kind in edges:
+        evidence[clusters.find(a)].add(kind)
+    
+    merge_map = {}
+    report = []
+    for root, members in groups.items():
+        if len(members) < 2:
+            continue
+        members.sort(key=lambda sid: (first_session[sid], len(sid), sid))
+        canonical = members[0]
+        for sid in members[1:]:
+            merge_map[sid] = canonical
+        report.append({
+            'canonical': canonical,
+            'matched_on': sorted(evidence[root]),
+            'members': [{'student_id': sid, 'name': profile[sid].name, 'father_name': profile[sid].father_name,
+                         'dob': profile[sid].dob, 'phone': profile[sid].phone, 'first_session': first_session[sid]}
+                        for sid in members],
+        })
+    report.sort(key=lambda cluster: cluster['canonical'])
+    return merge_map, report
+
+
+def remap_student_id(merge_map: Dict[str, str], record: Record) -> Record:
+    """The record under its canonical student ID (a copy if the ID was merged away)."""
+    canonical = merge_map.get(str(record.student_id))
+    if canonical is None or canonical == record.student_id:
+        return record
+    return record.replace(student_id=canonical)
+
+
+def remap_student_ids(merge_map: Dict[str, str], records_by_session: Dict[str, List[Record]]) -> Dict[str, List[Record]]:
+    """Receipts, bills or discounts (by session) under canonical student IDs."""
+    remapped = defaultdict(list)
+    for session, records in records_by_session.items():
+        remapped[session] = [remap_student_id(merge_map, r) for r in records]
+    return remapped
+
+
+def apply_identity_merges(merge_map: Dict[str, str],
+                          students: Dict[str, List[StudentRecord]]) -> Dict[str, List[StudentRecord]]:
+    """Students by session under canonical IDs, one row per ID and session.
+
+    Where a session held rows for several merged IDs, the canonical ID's own
+    row is kept (else the first). Rewrite the other records' IDs with
+    remap_student_ids().
+    """
+    merged = defaultdict(list)
+    for session, session_students in students.items():
+        kept = {}
+        for s in session_students:
+            original = str(s.student_id)
+            s = remap_student_id(merge_map, s)
+            canonical = str(s.student_id)
+            if canonical not in kept or original == canonical and kept[canonical][0] != canonical:
+                kept[canonical] = (original, s)
+        merged[session] = [s for _, s in kept.values()]
+    return merged
@@ -0,0 +1,174 @@
+"""Library API: lazy record iteration over a dump, written to pluggable sinks."""
+
+from collections import defaultdict
+from typing import Callable, Dict, Iterator, Tuple, Optional, Iterable
+
+from .mapping import LegacyMapping, get_default_mapping
+from .records import BillRecord, DiscountRecord, HistoryRecord, ReceiptRecord, Record, StudentRecord
+from .parsing import iter_table_chunks, parse_sql_file
+from .extraction import (GROUP_MEMORY_MB, admission_payment_records, bill_meta_lookup, build_academic_history,
+                         consolidated_transaction_records, demand_bill_records, detailed_transaction_records,
+                         discount_records, extract_students, fee_receipt_records, session_calendar, student_id_set)
+from .identity import apply_identity_merges, remap_student_id, resolve_student_identities
+from .export import SHEET_COLUMNS
+
+
+# =============================================================================
+# LIBRARY API
+# =============================================================================
+
+# Records handed to a sink per append() by write_records
+SINK_BATCH_SIZE = 5000
+
+
+class LegacyDump:
+    """A dump opened for record iteration: pass 1 of the streaming pipeline.
+
+    Only the student index and the small lookup tables (bill metadata,
+    financial years) are parsed and kept; every iter_* call given the same
+    LegacyDump reuses them and streams the fee tables again, so no call ever
+    holds all of a dump's fee records.
+    """
+
+    def __init__(self, path: str, mapping: Optional[LegacyMapping] = None, encoding: str = 'latin1',
+                 parser_mode: str = 'stream', parse_workers: Optional[int] = None,
+                 resolve_identities: bool = False, group_memory_mb: float = GROUP_MEMORY_MB):
+        self.path = path
+        self.mapping = mapping or get_default_mapping()
+        self.encoding = encoding
+        self.parser_mode = parser_mode
+        self.parse_workers = parse_workers
+        self.group_memory_mb = group_memory_mb
+        self.mapping.resolver.reset()
+        
+        meta_table = self.mapping.table('demand_bills', 'meta_table')
+        tables = parse_sql_file(path, only={self.mapping.table('students'), meta_table,
+                                            self.mapping.table('admission_payments', 'year_table')},
+                                mode=parser_mode, encoding=encoding, workers=parse_workers)
+        self.students = extract_students(tables, self.mapping)
+        self.student_ids = student_id_set(self.students)
+        self.merge_map, self.identities = {}, []
+        if resolve_identities:
+            self.merge_map, self.identities = resolve_student_identities(self.students)
+            self.students = apply_identity_merges(self.merge_map, self.students)
+        self.calendar = session_calendar(tables, self.students, self.mapping)
+        self.bill_meta = (bill_meta_lookup(tables[meta_table]['rows'], self.calendar, self.mapping)
+                          if meta_table in tables else None)
+        self.history = build_academic_history(self.students)
+
+    def handlers(self) -> Dict[str, Tuple[str, Callable]]:
+        """Fee table -> (record kind, handler turning one chunk's (columns, rows) into (session, record) pairs)."""
+        mapping, student_ids, calendar = self.mapping, self.student_ids, self.calendar
+        handlers = {
+            mapping.table('modern_transactions'):
+                ('receipts', lambda cols, rows: detailed_transaction_records(rows, cols, student_ids, mapping)),
+            mapping.table('consolidated_transactions'):
+                ('receipts', lambda cols, rows: consolidated_transaction_records(rows, student_ids, mapping)),
+            mapping.table('fee_receipts'):
+                ('receipts', lambda cols, rows: fee_receipt_records(rows, cols, student_ids, mapping)),
+            mapping.table('discounts'):
+                ('discounts', lambda cols, rows: discount_records(rows, cols, mapping)),
+        }
+        if self.bill_meta is not None:
+            handlers[mapping.table('demand_bills')] = \
+                ('bills', lambda cols, rows: demand_bill_records(rows, cols, student_ids, self.bill_meta,
+                                                                 mapping, calendar))
+        handlers[mapping.table('admission_payments')] = \
+            ('receipts', lambda cols, rows: admission_payment_records(rows, student_ids, calendar, mapping,
+                                                                      self.group_memory_mb))
+        return handlers
+
+
+def _open_dump(dump) -> LegacyDump:
+    return dump if isinstance(dump, LegacyDump) else LegacyDump(dump)
+
+
+def iter_records(dump, kinds: Optional[Iterable[str]] = None,
+                 session: Optional[str] = None) -> Iterator[Tuple[str, str, Record]]:
+    """(kind, session, record) for every record of a dump (a path or LegacyDump), lazily.
+
+    Students and history come first (from the index), then fee records in
+    dump order as each INSERT chunk is parsed. Receipts are as extracted:
+    not yet de-duplicated across sources (see deduplicate_receipts) and bills
+    not yet reconciled (see reconcile_bills), as both need a whole session.
+    """
+    dump = _open_dump(dump)
+    kinds = set(kinds or SHEET_COLUMNS)
+    for kind, index in (('students', dump.students), ('history', dump.history)):
+        if kind in kinds:
+            for session_name, records in index.items():
+                if not session or session_name == session:
+                    for record in records:
+                        yield kind, session_name, record
+    
+    handlers = {table: handler for table, handler in dump.handlers().items() if handler[0] in kinds}
+    if not handlers:
+        return
+    for table_name, columns, rows in iter_table_chunks(dump.path, set(handlers), dump.encoding,
+                                                       dump.parser_mode, dump.parse_workers):
+        kind, records = handlers[table_name]
+        for session_name, record in records(columns, rows):
+            if session and session_name != session:
+                continue
+            if dump.merge_map:
+                record = remap_student_id(dump.merge_map, record)
+            yield kind, session_name, record
+
+
+def _iter_kind(kind: str, dump, session: Optional[str]) -> Iterator[Record]:
+    for _, _, record in iter_records(dump, (kind,), session):
+        yield record
+
+
+def iter_students(dump, session: Optional[str] = None) -> Iterator[StudentRecord]:
+    """Students of a dump (path or LegacyDump), optionally of one session."""
+    return _iter_kind('students', dump, session)
+
+
+def iter_receipts(dump, session: Optional[str] = None) -> Iterator[ReceiptRecord]:
+    """Fee receipts from every receipt source, in dump order (not de-duplicated)."""
+    return _iter_kind('receipts', dump, session)
+
+
+def iter_bills(dump, session: Optional[str] = None) -> Iterator[BillRecord]:
+    """Demand bill lines, in dump order (not reconciled against receipts)."""
+    return _iter_kind('bills', dump, session)
+
+
+def iter_discounts(dump, session: Optional[str] = None) -> Iterator[DiscountRecord]:
+    return _iter_kind('discounts', dump, session)
+
+
+def iter_history(dump, session: Optional[str] = None) -> Iterator[HistoryRecord]:
+    return _iter_kind('history', dump, session)
+
+
+def write_records(records: Iterable[Tuple[str, str, Record]], sink_for: Callable[[str], object],
+                  batch_size: int = SINK_BATCH_SIZE) -> Dict[str, object]:
+    """Feed (kind, session, record) triples to sinks; returns {session: result of the sink's save()}.
+
+    sink_for(session) is called once per session and returns any object with
+    the export writers' interface, append(kind, records) and save() (e.g.
+    WorkbookWriter, CsvExportWriter, ParquetExportWriter). Returning the same
+    sink for every session writes everything to one sink, saved once.
+    Records are appended in batches of batch_size per (session, kind).
+    """
+    sinks, pending = {}, defaultdict(list)
+    for kind, session_name, record in records:
+        if session_name not in sinks:
+            sinks[session_name] = sink_for(session_name)
+        batch = pending[session_name, kind]
+        batch.append(record)
+        if len(batch) >= batch_size:
+            sinks[session_name].append(kind, batch)
+            pending[session_name, kind] = []
+    for (session_name, kind), batch in pending.items():
+        if batch:
+            sinks[session_name].append(kind, batch)
+    
+    saved, results = {}, {}
+    for session_name, sink in sinks.items():
+        if id(sink) not in saved:
+            saved[id(sink)] = sink.save()
+        results[session_name] = saved[id(sink)]
+    return results
@@ -0,0 +1,300 @@
+"""Legacy schema mappings: per-source tables and columns, fee type aliases and fee name matching."""
+
+import re
+import os
+import json
+import hashlib
+from difflib import SequenceMatcher
+from collections import defaultdict
+from typing import Dict, List, Tuple, Optional
+
+from .cleaning import PLACEHOLDER_VALUES
+
+
+# Legacy schema mapping (fee type aliases, per-source tables and fee columns)
+# Loaded from a JSON/YAML file so a new school's schema variant needs no code edits.
+DEFAULT_MAPPING_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                    'mappings', 'sdv.json')
+
+
+def normalize_key(name: str) -> str:
+    """Normalise a legacy column / fee name for lookup ('Tuition_Fee' -> 'tuitionfee')."""
+    return re.sub(r'[^a-z0-9]', '', str(name).lower())
+
+
+# Misspellings seen in free-text legacy fee names (token -> correct token);
+# a mapping file can add more under "fee_type_spellings".
+FEE_NAME_SPELLINGS = {
+    'tution': 'tuition', 'tuiton': 'tuition', 'tusion': 'tuition', 'tuision': 'tuition', 'tutions': 'tuition',
+    'transpot': 'transport', 'trasport': 'transport', 'transpotation': 'transport', 'transportation': 'transport',
+    'convayance': 'conveyance', 'conveyence': 'conveyance', 'convence': 'conveyance',
+    'libary': 'library', 'liberary': 'library', 'labratory': 'laboratory', 'laboratary': 'laboratory',
+    'devlopment': 'development', 'developement': 'development', 'computor': 'computer', 'compter': 'computer',
+    'examination': 'exam', 'exams': 'exam', 'admision': 'admission', 'addmission': 'admission',
+    'activty': 'activity', 'activities': 'activity', 'hostal': 'hostel', 'genrator': 'generator',
+}
+
+# Words that carry no meaning in a fee name ('Conveyance Charges' == 'Conveyance')
+FEE_NAME_FILLER = {'fee', 'fees', 'charge', 'charges', 'amount', 'amt', 'rs'}
+
+# Fuzzy matches scoring below this are not applied; below FEE_REVIEW_SCORE they are reported
+FEE_MATCH_SCORE = 0.8
+FEE_REVIEW_SCORE = 0.9
+
+
+class FeeTypeResolver:
+    """Resolves free-text legacy fee names to the canonical fee types.
+
+    Each distinct legacy string is resolved once and memoised:
+      1. exact alias lookup on the normalised key (the mapping's fee_types),
+      2. lookup after token clean-up: misspellings fixed, filler words dropped,
+      3. fuzzy match: candidates sharing the most trigrams with the cleaned
+         name, scored with difflib's ratio; applied at >= FEE_MATCH_SCORE.
+    Names that still do not match pass through unchanged. Everything resolved
+    by steps 2-3 or left unmatched is listed by review() with its score.
+    """
+
+    def __init__(self, aliases: Dict[str, str], spellings: Optional[Dict[str, str]] = None):
+        self.aliases = aliases  # normalize_key(alias) -> fee type
+        self.spellings = dict(FEE_NAME_SPELLINGS, **(spellings or {}))
+        self.cleaned = {}
+        for key, fee_type in aliases.items():
+            self.cleaned.setdefault(self.clean(key), fee_type)
+        self.candidates = list(self.cleaned)
+        self.trigrams = defaultdict(list)
+        for i, candidate in enumerate(self.candidates):
+            for gram in self._trigrams(candidate):
+                self.trigrams[gram].append(i)
+        self._memo = {}
+        self.seen = set()  # distinct names resolved since the last reset()
+
+    def clean(self, name: str) -> str:
+        tokens = [self.spellings.get(t, t) for t in re.findall(r'[a-z]+|\d+', str(name).lower())]
+        kept = [t for t in tokens if t not in FEE_NAME_FILLER]
+        return ''.join(kept or tokens)
+
+    @staticmethod
+    def _trigrams(text: str) -> set:
+        padded = f"  {text} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def resolve(self, name: str) -> Optional[str]:
+        hit = self._memo.get(name)
+        if hit is None:
+            hit = self._memo[name] = self._match(name)
+        self.seen.add(name)
+        return hit[0]
+
+    def _match(self, name: str) -> Tuple[Optional[str], str, float, str]:
+        """(fee type or None, method, score, matched key)"""
+        key = normalize_key(name)
+        if key in self.aliases:
+            return self.aliases[key], 'exact', 1.0, key
+        cleaned = self.clean(name)
+        if cleaned in self.cleaned:
+            return self.cleaned[cleaned], 'normalised', 1.0, cleaned
+        if not cleaned:
+            return None, 'unmatched', 0.0, ''
+
+        shared = defaultdict(int)
+        for gram in self._trigrams(cleaned):
+            for i in self.trigrams.get(gram, ()):
+                shared[i] += 1
+        best, best_score = None, 0.0
+        for i in sorted(shared, key=shared.get, reverse=True)[:5]:
+            score = SequenceMatcher(None, cleaned, self.candidates[i]).ratio()
+            if score > best_score:
+                best, best_score = self.candidates[i], score
+        if best is not None and best_score >= FEE_MATCH_SCORE:
+            return self.cleaned[best], 'fuzzy', round(best_score, 3), best
+        return None, 'unmatched', round(best_score, 3), best or ''
+
+    def reset(self):
+        """Forget which names were seen (memoised matches are kept)."""
+        self.seen.clear()
+
+    def review(self) -> List[Dict]:
+        """Names not matched exactly, with how they were resolved; least confident first."""
+        items = []
+        for name in self.seen:
+            fee_type, method, score, matched = self._memo[name]
+            if method == 'exact':
+                continue
+            items.append({'legacy_name': name, 'resolved': fee_type or name, 'method': method,
+                          'score': score, 'matched': matched,
+                          'needs_review': method == 'unmatched' or score < FEE_REVIEW_SCORE})
+        return sorted(items, key=lambda item: (item['score'], item['legacy_name']))
+
+
+# Fields the extractors read from each source's tables, per mapping key ('columns'
+# for the source's own table, 'meta_columns' for its meta_table, ...). A mapping
+# names the legacy column(s) holding each field; fields it leaves out read as empty.
+MAPPED_FIELDS = {
+    'students': {'columns': (
+        'student_id', 'session', 'name', 'father_name', 'mother_name', 'dob', 'gender', 'class_name',
+        'section', 'roll', 'admission_date', 'phone', 'address', 'address_line2', 'permanent_address',
+        'email', 'aadhar', 'category', 'religion', 'status', 'father_occupation', 'mother_occupation',
+        'father_aadhar', 'mother_aadhar')},
+    'demand_bills': {'columns': ('bill_no', 'student_id', 'session'),
+                     'meta_columns': ('bill_no', 'session', 'month', 'date')},
+    'modern_transactions': {'columns': ('student_id', 'session', 'receipt_no', 'date')},
+    'consolidated_transactions': {'columns': ('student_id', 'session', 'receipt_no', 'date', 'paid_amount',
+                                              'payment_mode', 'payment_ref')},
+    'fee_receipts': {'columns': ('student_id', 'session', 'receipt_no', 'date', 'payment_mode', 'payment_ref')},
+    'admission_payments': {'columns': ('transaction_id', 'student_id', 'year_id', 'description', 'amount',
+                                       'payment_date'),
+                           'year_columns': ('id', 'session')},
+    'discounts': {'columns': ('student_id', 'session')},
+}
+
+
+def column_value(row, names: Tuple[str, ...], default=''):
+    """A field of a legacy row: the first non-empty value among its mapped columns (see LegacyMapping.columns)."""
+    for name in names:
+        value = row.get(name)
+        if value:
+            return value
+    return default
+
+
+class LegacyMapping:
+    """Compiled legacy-schema mapping.
+
+    The raw mapping file is compiled once into:
+      - fee_type_map: normalised legacy name -> system fee type
+      - sources: per-source table names, field -> column names (columns,
+        meta_columns, ...; a field may list alternative columns) and
+        (column, fee type) pairs
+    Fee columns are bound to a concrete table header on first use, producing
+    (actual column name, column index, fee type) triples that are cached per header.
+    Raises ValueError for a field no extractor reads (usually a typo).
+    """
+
+    def __init__(self, config: Dict, path: str = ''):
+        self.name = config.get('name', os.path.splitext(os.path.basename(path))[0])
+        self.path = path
+        self.fingerprint = hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+        self.fee_type_map = {}
+        for system_name, aliases in config.get('fee_types', {}).items():
+            self.fee_type_map[normalize_key(system_name)] = system_name
+            for alias in aliases:
+                self.fee_type_map[normalize_key(alias)] = system_name
+        self.canonical_fee_types = list(config.get('fee_types', {}).keys())
+        self.resolver = FeeTypeResolver(self.fee_type_map, config.get('fee_type_spellings'))
+
+        self.sources = {}
+        for source, spec in config.get('sources', {}).items():
+            fee_columns = spec.get('fee_columns', [])
+            if isinstance(fee_columns, dict):
+                pairs = [(col, self.fee_type(ftype) or ftype) for col, ftype in fee_columns.items()]
+            else:
+                pairs = [(col, self.fee_type(col)) for col in fee_columns]
+            compiled = dict(spec)
+            compiled['fee_columns'] = tuple((col, ftype) for col, ftype in pairs if ftype)
+            for key, fields in MAPPED_FIELDS.get(source, {}).items():
+                columns = spec.get(key) or {}
+                unknown = sorted(set(columns) - set(fields))
+                if unknown:
+                    raise ValueError(f"{path or 'mapping'}: sources.{source}.{key} has unknown field(s) "
+                                     f"{', '.join(unknown)} (expected {', '.join(fields)})")
+                compiled[key] = {field: self._column_names(columns.get(field)) for field in fields}
+            self.sources[source] = compiled
+
+        self._bound = {}
+
+    def fee_type(self, legacy_name: str) -> Optional[str]:
+        """Map a legacy fee name to its system name (see FeeTypeResolver); unmatched names pass through."""
+        if not legacy_name or legacy_name in PLACEHOLDER_VALUES:
+            return None
+        return self.resolver.resolve(legacy_name) or legacy_name
+
+    @staticmethod
+    def _column_names(names) -> Tuple[str, ...]:
+        if not names:
+            return ()
+        return (names,) if isinstance(names, str) else tuple(names)
+
+    def table(self, source: str, key: str = 'table') -> str:
+        """Legacy table name configured for a source (or one of its auxiliary tables)."""
+        return self.sources.get(source, {}).get(key, '')
+
+    def columns(self, source: str, key: str = 'columns') -> Dict[str, Tuple[str, ...]]:
+        """Field -> legacy column names of a source's table ('columns') or auxiliary table ('meta_columns', ...).
+
+        Read a field with column_value(row, columns[field]).
+        """
+        compiled = self.sources.get(source, {}).get(key)
+        if compiled is None:
+            compiled = {field: () for field in MAPPED_FIELDS.get(source, {}).get(key, ())}
+        return compiled
+
+    def option(self, source: str, key: str, default=None):
+        return self.sources.get(source, {}).get(key, default)
+
+    def fee_columns(self, source: str, header: List[str]) -> List[Tuple[str, int, str]]:
+        """Bind a source's fee columns to a table header.
+
+        Columns are matched on their normalised name, so 'TuitionFee' in the mapping
+        also matches 'tuitionFee' or 'Tuition_Fee' in a forked schema. Returns
+        (actual column name, column index, fee type) for every column present.
+        """
+        cache_key = (source, tuple(header))
+        bound = self._bound.get(cache_key)
+        if bound is None:
+            index = {normalize_key(col): (col, i) for i, col in enumerate(header)}
+            bound = []
+            for col, fee_type in self.sources.get(source, {}).get('fee_columns', ()):
+                hit = index.get(normalize_key(col))
+                if hit:
+                    bound.append((hit[0], hit[1], fee_type))
+            self._bound[cache_key] = bound
+        return bound
+
+    def required_tables(self) -> set:
+        """Every legacy table the extractors read; other tables can be skipped by the parser."""
+        return {name for spec in self.sources.values()
+                for key, name in spec.items() if key == 'table' or key.endswith('_table')}
+
+
+def load_mapping(path: Optional[str] = None) -> LegacyMapping:
+    """Load and compile a mapping file (.json, or .yml/.yaml when PyYAML is installed).
+
+    Raises ImportError (YAML without PyYAML) or ValueError (malformed mapping).
+    """
+    path = path or DEFAULT_MAPPING_PATH
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(('.yml', '.yaml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError(f"Reading {path} requires PyYAML. Install with: pip install pyyaml "
+                                  f"(or use a .json mapping)")
+            config = yaml.safe_load(f)
+        else:
+            config = json.load(f)
+    return LegacyMapping(config, path)
+
+
+_default_mapping = None
+
+
+def get_default_mapping() -> LegacyMapping:
+    """Compiled default mapping, loaded once per process."""
+    global _default_mapping
+    if _default_mapping is None:
+        _default_mapping = load_mapping(DEFAULT_MAPPING_PATH)
+    return _default_mapping
+
+
+def map_fee_type(legacy_name: str, mapping: Optional[LegacyMapping] = None) -> Optional[str]:
+    """Strictly map legacy names to system names."""
+    return (mapping or get_default_mapping()).fee_type(legacy_name)
+
+def is_valid_fee(fee_name: str, amount: int) -> bool:
+    """Check if a fee record (amount in paise) is valid for import."""
+    if amount <= 0:
+        return False
+    if not fee_name or fee_name in PLACEHOLDER_VALUES:
+        return False
+    return True
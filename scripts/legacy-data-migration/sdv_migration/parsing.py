@@ -0,0 +1,663 @@
+"""Reading SQL dumps: compressed input and the stream, mmap and parallel INSERT parsers."""
+
+import re
+import os
+import codecs
+import itertools
+import threading
+import queue
+import mmap
+from collections.abc import Mapping
+from typing import Dict, List, Tuple, Optional, Iterable
+
+
+# Assumed compression ratio of a compressed dump whose uncompressed size is not recorded
+COMPRESSION_RATIO = 10
+
+# Dumps are read (and decompressed) in blocks of this size by a background thread
+DUMP_BLOCK_SIZE = 16 * 1024 * 1024
+DUMP_READ_AHEAD = 4  # blocks buffered between the reader thread and the parser
+
+
+# =============================================================================
+# SQL PARSER
+# =============================================================================
+
+COMPRESSION_MAGIC = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+    (b'PK\x03\x04', 'zip'),
+]
+
+COMPRESSION_EXTENSIONS = {'.gz': 'gzip', '.zst': 'zstd', '.zstd': 'zstd', '.zip': 'zip'}
+
+
+def detect_compression(filepath: str) -> Optional[str]:
+    """Detect dump compression by file extension, falling back to magic bytes."""
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext in COMPRESSION_EXTENSIONS:
+        return COMPRESSION_EXTENSIONS[ext]
+    with open(filepath, 'rb') as f:
+        head = f.read(4)
+    for magic, kind in COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            return kind
+    return None
+
+
+def open_dump(filepath: str):
+    """Open a dump as a binary stream of uncompressed SQL (.sql, .sql.gz, .sql.zst, .zip)."""
+    kind = detect_compression(filepath)
+    if kind == 'gzip':
+        import gzip
+        return gzip.open(filepath, 'rb')
+    if kind == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("Reading .zst dumps requires zstandard. Install with: pip install zstandard")
+        return zstandard.ZstdDecompressor().stream_reader(open(filepath, 'rb'), closefd=True)
+    if kind == 'zip':
+        import zipfile
+        archive = zipfile.ZipFile(filepath)
+        # The archive is closed along with the member stream
+        stream = archive.open(_zip_dump_member(archive, filepath))
+        stream._archive = archive
+        return stream
+    return open(filepath, 'rb')
+
+
+def _zip_dump_member(archive, filepath: str):
+    """The dump inside a zip archive: its largest .sql member (or largest file)."""
+    members = [m for m in archive.infolist() if not m.is_dir()]
+    sql_members = [m for m in members if m.filename.lower().endswith('.sql')] or members
+    if not sql_members:
+        raise ValueError(f"No dump found inside {filepath}")
+    return max(sql_members, key=lambda m: m.file_size)
+
+
+def uncompressed_size(filepath: str) -> int:
+    """Size of the SQL a dump decompresses to, read from the container metadata.
+
+    gzip records it (mod 2**32) in its ISIZE trailer, zip per member, zstd in
+    the frame header when the writer knew it. Where it is not recorded the
+    compressed size is scaled by COMPRESSION_RATIO.
+    """
+    size = os.path.getsize(filepath)
+    kind = detect_compression(filepath)
+    if kind == 'gzip':
+        with open(filepath, 'rb') as f:
+            f.seek(max(0, size - 4))
+            isize = int.from_bytes(f.read(4), 'little')
+        # ISIZE wraps at 4 GiB; SQL never compresses to more than its own size
+        while isize < size:
+            isize += 2 ** 32
+        return isize
+    if kind == 'zip':
+        import zipfile
+        with zipfile.ZipFile(filepath) as archive:
+            return _zip_dump_member(archive, filepath).file_size
+    if kind == 'zstd':
+        content_size = -1
+        try:
+            import zstandard
+            with open(filepath, 'rb') as f:
+                content_size = zstandard.frame_content_size(f.read(18))  # longest frame header
+        except ImportError:
+            pass
+        except zstandard.ZstdError:
+            pass
+        return content_size if content_size >= 0 else size * COMPRESSION_RATIO
+    return size
+
+
+def iter_dump_blocks(filepath: str, block_size: int = DUMP_BLOCK_SIZE):
+    """Yield decompressed blocks of the dump.
+
+    Reading and decompression run in a background thread that stays up to
+    DUMP_READ_AHEAD blocks ahead, so it overlaps with parsing (zlib and zstd
+    release the GIL while decompressing).
+    """
+    blocks = queue.Queue(maxsize=DUMP_READ_AHEAD)
+    stop = threading.Event()
+
+    def put(item):
+        # Give up once the consumer has stopped, so a full queue never blocks forever
+        while not stop.is_set():
+            try:
+                blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def reader():
+        try:
+            with open_dump(filepath) as stream:
+                while not stop.is_set():
+                    block = stream.read(block_size)
+                    put(block)
+                    if not block:
+                        return
+        except Exception as e:
+            put(e)
+
+    thread = threading.Thread(target=reader, name='dump-reader', daemon=True)
+    thread.start()
+    try:
+        while True:
+            block = blocks.get()
+            if isinstance(block, Exception):
+                raise block
+            if not block:
+                return
+            yield block
+    finally:
+        stop.set()
+
+
+INSERT_HEADER_PATTERN = re.compile(r"insert\s+into\s+`(\w+)`\s*\(([^)]+)\)\s*values\s*", re.IGNORECASE)
+
+# Unmatched text kept between blocks so an INSERT header split across a block
+# boundary is still found on the next search
+HEADER_LOOKBACK = 64 * 1024
+
+
+def iter_insert_statements(filepath: str, encoding: str = 'latin1', block_size: int = DUMP_BLOCK_SIZE):
+    """Stream (table_name, columns, values_str) for every INSERT statement in a dump.
+
+    Blocks are decoded as they arrive; only the statement currently being
+    parsed is held in memory, never the whole dump. The decoder is incremental,
+    so a multi-byte character split across two blocks is decoded whole. The
+    blocks of a statement longer than one block are collected and joined once
+    its terminator arrives, so a huge single INSERT is read in linear time.
+    """
+    blocks = iter_dump_blocks(filepath, block_size)
+    decoder = codecs.getincrementaldecoder(encoding)()
+    buf = ''
+    pos = 0
+    eof = False
+
+    def read() -> str:
+        nonlocal eof
+        block = next(blocks, None)
+        if block is None:
+            eof = True
+            return decoder.decode(b'', final=True)
+        return decoder.decode(block)
+
+    def more():
+        nonlocal buf, pos
+        buf = buf[pos:] + read()
+        pos = 0
+
+    more()
+    while True:
+        match = INSERT_HEADER_PATTERN.search(buf, pos)
+        # A header ending at the buffer edge may still be incomplete
+        if not match or (match.end() == len(buf) and not eof):
+            if eof:
+                return
+            pos = max(pos, len(buf) - HEADER_LOOKBACK)
+            more()
+            continue
+
+        # Find the end of this INSERT statement
+        values_end = buf.find(';\n', match.end())
+        if values_end == -1 and not eof:
+            chunks = [buf[match.start():]]
+            tail = chunks[0][-1:]  # a terminator may straddle two blocks
+            while not eof:
+                text = read()
+                chunks.append(text)
+                if (tail + text).find(';\n') != -1:
+                    break
+                tail = text[-1:] or tail
+            buf = ''.join(chunks)
+            pos = 0
+            match = INSERT_HEADER_PATTERN.match(buf)
+            values_end = buf.find(';\n', match.end())
+        if values_end == -1:
+            values_end = len(buf)
+
+        table_name = match.group(1)
+        columns = [c.strip().strip('`') for c in match.group(2).split(',')]
+        yield table_name, columns, buf[match.end():values_end]
+        pos = values_end + 1
+
+
+def parse_sql_file(filepath: str, only: Optional[Iterable[str]] = None,
+                   mode: str = 'stream', encoding: str = 'latin1',
+                   workers: Optional[int] = None) -> Dict[str, List[Dict]]:
+    """Parse SQL dump file and extract data from all tables.
+
+    only: table names to keep; INSERTs for other tables are skipped unparsed.
+    mode: 'stream' decodes the dump block by block (compressed dumps are
+    decompressed on the fly); 'mmap' scans an uncompressed dump as raw bytes
+    and returns LazyRow rows that decode fields on access; 'parallel'
+    tokenizes byte-range shards of an uncompressed dump on `workers` processes.
+    """
+    only = set(only) if only is not None else None
+    mode = effective_parser_mode(filepath, mode)
+    if mode == 'mmap':
+        return parse_sql_file_mmap(filepath, only, encoding)
+    if mode == 'parallel':
+        return parse_sql_file_parallel(filepath, only, encoding, workers or os.cpu_count() or 1)
+    
+    tables = {}
+    for table_name, columns, rows in iter_table_chunks(filepath, only, encoding):
+        if table_name not in tables:
+            tables[table_name] = {'columns': columns, 'rows': []}
+        tables[table_name]['rows'].extend(rows)
+    
+    return tables
+
+
+def effective_parser_mode(filepath: str, mode: str) -> str:
+    """The parser mode used for a dump: mmap and parallel need a plain .sql file."""
+    if mode in ('mmap', 'parallel') and detect_compression(filepath):
+        print(f"⚠️ {filepath} is compressed; {mode} parsing needs a plain .sql file, streaming instead.")
+        return 'stream'
+    return mode
+
+
+def iter_table_chunks(filepath: str, only: Optional[set] = None, encoding: str = 'latin1',
+                      mode: str = 'stream', workers: Optional[int] = None):
+    """Stream (table_name, columns, rows) per INSERT statement (or part of one).
+
+    mode as for parse_sql_file: 'stream' rows are dicts; 'mmap' rows are
+    LazyRows over a map of the dump; 'parallel' rows are ColumnarRows of
+    shards tokenized on `workers` processes, a few shards ahead of the consumer.
+    """
+    mode = effective_parser_mode(filepath, mode)
+    if mode == 'mmap':
+        yield from iter_table_chunks_mmap(filepath, only, encoding)
+        return
+    if mode == 'parallel':
+        yield from iter_table_chunks_parallel(filepath, only, encoding, workers or os.cpu_count() or 1)
+        return
+    
+    # Extract value tuples using regex
+    tuple_pattern = re.compile(r"\(([^)]+)\)")
+    
+    for table_name, columns, values_str in iter_insert_statements(filepath, encoding):
+        if only is not None and table_name not in only:
+            continue
+        
+        # Parse individual value tuples
+        rows = []
+        for tuple_match in tuple_pattern.finditer(values_str):
+            values = parse_value_tuple(tuple_match.group(1))
+            if values and columns:
+                rows.append(dict(zip(columns, values)))
+        yield table_name, columns, rows
+
+
+INSERT_HEADER_BYTES = re.compile(rb"insert\s+into\s+`(\w+)`\s*\(([^)]+)\)\s*values\s*", re.IGNORECASE)
+TUPLE_BYTES = re.compile(rb"\(([^)]+)\)")
+# One field of a value tuple: quoted strings (with escapes), escapes, or plain bytes up to a comma
+FIELD_BYTES = re.compile(rb"(?:'[^'\\]*(?:\\.[^'\\]*)*'?|\\.|[^,'\\]+)*", re.DOTALL)
+FIELD_UNESCAPE = re.compile(r"\\(.)|'", re.DOTALL)
+
+
+class _LastRead(threading.local):
+    """(row, values) of the LazyRow a thread decoded last."""
+    row = None
+    values = None
+
+
+class LazyRow(Mapping):
+    """Read-only row over a byte range of a memory-mapped dump.
+
+    A row is split and decoded when it is first read, so rows (and tables)
+    the extractors never touch are never decoded. Decoded values are not
+    stored per row: only the most recently read row's are kept (per thread),
+    which covers the extractors reading one row's columns in turn. Values match
+    parse_value_tuple() output. Pickles as a plain dict.
+    """
+    __slots__ = ('_buf', '_start', '_end', '_columns', '_encoding')
+
+    _last_read = _LastRead()
+
+    def __init__(self, buf, start: int, end: int, columns: Dict[str, int], encoding: str = 'latin1'):
+        self._buf = buf
+        self._start = start
+        self._end = end
+        self._columns = columns
+        self._encoding = encoding
+
+    def _values(self) -> List[str]:
+        last = LazyRow._last_read
+        if last.row is self:
+            return last.values
+        buf, end, encoding = self._buf, self._end, self._encoding
+        values = []
+        pos = self._start
+        while True:
+            match = FIELD_BYTES.match(buf, pos, end)
+            value = match.group().decode(encoding)
+            if '\\' in value:
+                value = FIELD_UNESCAPE.sub(r'\1', value)  # unmatched group (a quote) -> ''
+            elif "'" in value:
+                value = value.replace("'", '')
+            values.append(value.strip().strip("'"))
+            pos = match.end() + 1
+            if pos > end:
+                break
+        # parse_value_tuple drops a trailing empty field
+        if match.end() - match.start() in (0, 2) and match.group().strip(b"'") == b'':
+            values.pop()
+        last.row, last.values = self, values
+        return values
+
+    def get(self, key, default=None):
+        index = self._columns.get(key)
+        if index is None:
+            return default
+        last = LazyRow._last_read
+        values = last.values if last.row is self else self._values()
+        return values[index] if index < len(values) else default
+
+    def __getitem__(self, key):
+        value = self.get(key, self)
+        if value is self:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        count = len(self._values())
+        return (col for col, i in self._columns.items() if i < count)
+
+    def __len__(self):
+        return min(len(self._values()), len(self._columns))
+
+    def __reduce__(self):
+        return (dict, (dict(self.items()),))
+
+
+def parse_sql_file_mmap(filepath: str, only: Optional[set] = None,
+                        encoding: str = 'latin1') -> Dict[str, List[Dict]]:
+    """Parse an uncompressed dump by scanning a read-only mmap of it.
+
+    Statement and tuple boundaries are found on raw bytes; rows are LazyRow
+    views into the map, so the dump is never decoded as a whole and skipped
+    tables are never decoded at all. The map stays open while rows reference it.
+    """
+    tables = {}
+    for table_name, columns, rows in iter_table_chunks_mmap(filepath, only, encoding):
+        if table_name not in tables:
+            tables[table_name] = {'columns': columns, 'rows': []}
+        tables[table_name]['rows'].extend(rows)
+    return tables
+
+
+def iter_table_chunks_mmap(filepath: str, only: Optional[set] = None, encoding: str = 'latin1'):
+    """(table_name, columns, LazyRows) per INSERT statement of an uncompressed dump (see parse_sql_file_mmap)."""
+    with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    pos = 0
+    while True:
+        match = INSERT_HEADER_BYTES.search(buf, pos)
+        if not match:
+            break
+        
+        values_end = buf.find(b';\n', match.end())
+        if values_end == -1:
+            values_end = len(buf)
+        pos = values_end + 1
+        
+        table_name = match.group(1).decode(encoding)
+        if only is not None and table_name not in only:
+            continue
+        
+        columns = [c.strip().strip('`') for c in match.group(2).decode(encoding).split(',')]
+        col_index = {}
+        for i, col in enumerate(columns):
+            col_index.setdefault(col, i)
+        rows = []
+        for tuple_match in TUPLE_BYTES.finditer(buf, match.end(), values_end):
+            start, end = tuple_match.span(1)
+            if end - start == 2 and buf[start:end] == b"''":
+                continue  # parse_value_tuple yields no values for ('')
+            rows.append(LazyRow(buf, start, end, col_index, encoding))
+        yield table_name, columns, rows
+
+
+# =============================================================================
+# PARALLEL PARSER
+# =============================================================================
+
+class ColumnarRow(Mapping):
+    """Read-only row view into a table's column arrays (see parse_sql_file_parallel).
+
+    Missing trailing values are stored as None and read back as absent keys,
+    matching the dict(zip(columns, values)) rows of the sequential parser.
+    """
+    __slots__ = ('_data', '_index', '_i')
+
+    def __init__(self, data: List[List], index: Dict[str, int], i: int):
+        self._data = data
+        self._index = index
+        self._i = i
+
+    def get(self, key, default=None):
+        j = self._index.get(key)
+        if j is None:
+            return default
+        value = self._data[j][self._i]
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        return (col for col, j in self._index.items() if self._data[j][self._i] is not None)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __reduce__(self):
+        return (dict, (dict(self.items()),))
+
+
+def index_insert_statements(buf, only: Optional[set] = None,
+                            encoding: str = 'latin1') -> List[Tuple[str, List[str], int, int]]:
+    """Quick scan for INSERT statements: (table, columns, values_start, values_end) in dump order."""
+    statements = []
+    pos = 0
+    while True:
+        match = INSERT_HEADER_BYTES.search(buf, pos)
+        if not match:
+            break
+        values_end = buf.find(b';\n', match.end())
+        if values_end == -1:
+            values_end = len(buf)
+        pos = values_end + 1
+        
+        table_name = match.group(1).decode(encoding)
+        if only is not None and table_name not in only:
+            continue
+        columns = [c.strip().strip('`') for c in match.group(2).decode(encoding).split(',')]
+        statements.append((table_name, columns, match.end(), values_end))
+    return statements
+
+
+def plan_parse_shards(buf, statements: List[Tuple], shard_count: int) -> List[List[Tuple[int, int, int, int]]]:
+    """Split statements into contiguous, roughly equal byte-range shards.
+
+    Statements larger than a shard are cut between tuples (after a '),(' ),
+    so a single huge extended INSERT still spreads across workers. Each piece
+    is (statement index, column count, start, end); shard order is dump order.
+    """
+    total = sum(end - start for _, _, start, end in statements)
+    target = max(1, total // max(1, shard_count))
+    shards = [[]]
+    filled = 0
+    for idx, (_, columns, start, end) in enumerate(statements):
+        while start < end:
+            cut = end
+            if end - start > target - filled:
+                split = buf.find(b'),(', start + max(0, target - filled), end)
+                if split != -1:
+                    cut = split + 1
+            shards[-1].append((idx, len(columns), start, cut))
+            filled += cut - start
+            start = cut
+            if filled >= target:
+                shards.append([])
+                filled = 0
+    return [shard for shard in shards if shard]
+
+
+def _tokenize_shard(filepath: str, encoding: str, pieces: List[Tuple[int, int, int, int]]) -> List[Tuple[int, List[List]]]:
+    """Pool worker: tokenize byte ranges of the dump into column arrays per piece."""
+    tuple_pattern = re.compile(r"\(([^)]+)\)")
+    chunks = []
+    with open(filepath, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for idx, ncols, start, end in pieces:
+                arrays = [[] for _ in range(ncols)]
+                for tuple_match in tuple_pattern.finditer(buf[start:end].decode(encoding)):
+                    values = parse_value_tuple(tuple_match.group(1))
+                    if not values:
+                        continue
+                    for j in range(ncols):
+                        arrays[j].append(values[j] if j < len(values) else None)
+                chunks.append((idx, arrays))
+        finally:
+            buf.close()
+    return chunks
+
+
+# Byte size of the shards iter_table_chunks_parallel tokenizes (at most two per worker at a time)
+STREAM_SHARD_BYTES = 16 * 1024 * 1024
+
+
+def iter_table_chunks_parallel(filepath: str, only: Optional[set] = None, encoding: str = 'latin1',
+                               workers: int = 4):
+    """(table_name, columns, ColumnarRows) per statement piece, tokenized on a process pool.
+
+    Like parse_sql_file_parallel, but shards are at most STREAM_SHARD_BYTES
+    and only 2 * workers of them are submitted ahead of the consumer, so
+    memory stays bounded however large the dump is. Pieces come in dump order.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    
+    with open(filepath, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        statements = index_insert_statements(buf, only, encoding)
+        shards = plan_parse_shards(buf, statements, max(workers * 4, size // STREAM_SHARD_BYTES))
+    finally:
+        buf.close()
+    
+    indexes = []
+    for _, columns, _, _ in statements:
+        index = {}
+        for j, col in enumerate(columns):
+            index.setdefault(col, j)
+        indexes.append(index)
+    
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        remaining = iter(shards)
+        pending = [pool.submit(_tokenize_shard, filepath, encoding, shard)
+                   for shard in itertools.islice(remaining, workers * 2)]
+        while pending:
+            chunks = pending.pop(0).result()
+            shard = next(remaining, None)
+            if shard is not None:
+                pending.append(pool.submit(_tokenize_shard, filepath, encoding, shard))
+            for idx, arrays in chunks:
+                count = len(arrays[0]) if arrays else 0
+                yield statements[idx][0], statements[idx][1], [ColumnarRow(arrays, indexes[idx], i)
+                                                               for i in range(count)]
+
+
+def parse_sql_file_parallel(filepath: str, only: Optional[set] = None, encoding: str = 'latin1',
+                            workers: int = 4) -> Dict[str, List[Dict]]:
+    """Parse an uncompressed dump on a process pool.
+
+    A quick byte scan indexes the INSERT statements, which are sharded by
+    byte range and tokenized independently. Workers return compact column
+    arrays that are concatenated per table in dump order; rows are
+    ColumnarRow views over those arrays.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    
+    with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return {}
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        statements = index_insert_statements(buf, only, encoding)
+        shards = plan_parse_shards(buf, statements, workers * 4)
+    finally:
+        buf.close()
+    
+    tables = {}
+    for table_name, columns, _, _ in statements:
+        if table_name not in tables:
+            tables[table_name] = {'columns': columns, 'rows': [], 'data': [], 'index': {}}
+    
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(_tokenize_shard, [filepath] * len(shards), [encoding] * len(shards), shards)
+        for chunks in results:
+            for idx, arrays in chunks:
+                table_name, columns = statements[idx][0], statements[idx][1]
+                table = tables[table_name]
+                data, index = table['data'], table['index']
+                length = len(data[0]) if data else 0
+                added = len(arrays[0]) if arrays else 0
+                # Later statements may list columns in another order (or add columns)
+                for col, values in zip(columns, arrays):
+                    if col not in index:
+                        index[col] = len(data)
+                        data.append([None] * length)
+                    data[index[col]].extend(values)
+                for j in range(len(data)):
+                    if len(data[j]) < length + added:
+                        data[j].extend([None] * (length + added - len(data[j])))
+    
+    for table in tables.values():
+        data, index = table.pop('data'), table.pop('index')
+        count = len(data[0]) if data else 0
+        table['rows'] = [ColumnarRow(data, index, i) for i in range(count)]
+    return tables
+
+
+def parse_value_tuple(value_str: str) -> List[str]:
+    """Parse a SQL value tuple into a list of values."""
+    values = []
+    current = ""
+    in_string = False
+    escape_next = False
+    
+    for char in value_str:
+        if escape_next:
+            current += char
+            escape_next = False
+        elif char == '\\':
+            escape_next = True
+        elif char == "'" and not in_string:
+            in_string = True
+        elif char == "'" and in_string:
+            in_string = False
+        elif char == ',' and not in_string:
+            values.append(current.strip().strip("'"))
+            current = ""
+        else:
+            current += char
+    
+    if current:
+        values.append(current.strip().strip("'"))
+    
+    return values
@@ -0,0 +1,673 @@
+"""Whole migration runs: the staged pipeline and the streaming pipeline."""
+
+import os
+import json
+import pickle
+import tempfile
+import time
+import threading
+import queue
+from datetime import datetime
+from collections import defaultdict
+from typing import Dict, Iterator, List, Tuple, Optional, Iterable
+
+from .mapping import LegacyMapping
+from .records import Record, ValidationResult
+from .parsing import iter_table_chunks, parse_sql_file
+from .checkpoints import STAGE_SCHEMA_VERSION, CheckpointStore, apply_bill_payments, bill_payments, file_fingerprint
+from .staging import STAGING_DB_NAME, stage_dump
+from .extraction import (GROUP_MEMORY_MB, build_academic_history, extract_admission_payments, extract_demand_bills,
+                         extract_discounts, extract_fee_receipts, extract_modern_transactions, extract_students,
+                         session_calendar)
+from .identity import apply_identity_merges, remap_student_id, remap_student_ids, resolve_student_identities
+from .reconciliation import check_student_references, deduplicate_receipts, reconcile_bills, validate_data
+from .export import (ExportManifest, add_record_totals, combine_digests, export_memoized, flatten_sessions,
+                     load_template_bytes, record_totals, records_digest, verify_exports, xlsx_path)
+from .precheck import ImportPrecheck, ReferenceData, write_import_check
+from .library import SINK_BATCH_SIZE, LegacyDump
+
+
+# =============================================================================
+# STAGED PIPELINE
+# =============================================================================
+
+def extract_all(tables: Dict, mapping: LegacyMapping, dedupe_receipts: bool = True,
+                resolve_identities: bool = False, group_memory_mb: float = GROUP_MEMORY_MB) -> Dict[str, Dict]:
+    """Extract stage: every record set from the parsed tables, grouped by session.
+
+    Also returns the reports of this stage: 'identities' (merged student IDs,
+    empty unless resolve_identities), 'duplicates' (cross-source duplicate
+    receipts dropped, empty unless dedupe_receipts) and 'fee_type_review'.
+    """
+    mapping.resolver.reset()
+    
+    print("Extracting students...")
+    students = extract_students(tables, mapping)
+    total_students = sum(len(s) for s in students.values())
+    print(f"Found {total_students} students across {len(students)} sessions.")
+    
+    calendar = session_calendar(tables, students, mapping)
+    
+    print("Extracting receipts...")
+    modern_receipts = extract_modern_transactions(tables, students, mapping)
+    legacy_receipts = extract_fee_receipts(tables, students, mapping)
+    admission_receipts = extract_admission_payments(tables, students, mapping, calendar, group_memory_mb)
+    
+    # Combine receipts
+    receipts = defaultdict(list)
+    for s, data in modern_receipts.items(): receipts[s].extend(data)
+    for s, data in legacy_receipts.items(): receipts[s].extend(data)
+    for s, data in admission_receipts.items(): receipts[s].extend(data)
+    
+    total_receipts = sum(len(r) for r in receipts.values())
+    print(f"Found {total_receipts} fee receipts.")
+    
+    print("Extracting demand bills...")
+    bills = extract_demand_bills(tables, students, mapping, calendar)
+    total_bills = sum(len(b) for b in bills.values())
+    print(f"Found {total_bills} demand bills.")
+    
+    print("Extracting discounts...")
+    discounts = extract_discounts(tables, students, mapping)
+    total_discounts = sum(len(d) for d in discounts.values())
+    print(f"Found {total_discounts} discount records.")
+    
+    identities = []
+    if resolve_identities:
+        print("Resolving student identities...")
+        merge_map, identities = resolve_student_identities(students)
+        students = apply_identity_merges(merge_map, students)
+        receipts, bills, discounts = (remap_student_ids(merge_map, records) for records in (receipts, bills, discounts))
+        print(f"Merged {len(merge_map)} duplicate student IDs into {len(identities)} students.")
+    
+    duplicates = []
+    if dedupe_receipts:
+        receipts, duplicates = deduplicate_receipts(receipts)
+        removed = total_receipts - sum(len(r) for r in receipts.values())
+        print(f"Dropped {removed} receipt lines from {sum(len(d['dropped']) for d in duplicates)} "
+              f"duplicate receipts recorded in more than one source.")
+    
+    print("Building academic history...")
+    history = build_academic_history(students)
+    total_history = sum(len(h) for h in history.values())
+    print(f"Derived {total_history} academic history rows.")
+    
+    fee_type_review = mapping.resolver.review()
+    
+    return {'students': students, 'receipts': receipts, 'bills': bills,
+            'discounts': discounts, 'history': history, 'duplicates': duplicates,
+            'identities': identities, 'fee_type_review': fee_type_review}
+
+
+def write_discovery_report(output_dir: str, input_path: str, counts: Dict, students: Dict) -> str:
+    """Write discovery_report.txt (record counts, students per session)."""
+    report_path = os.path.join(output_dir, "discovery_report.txt")
+    with open(report_path, 'w') as f:
+        f.write("SDV Data Migration - Discovery Report\n")
+        f.write("=====================================\n\n")
+        
+        f.write(f"Source File: {input_path}\n")
+        f.write(f"Generated: {datetime.now()}\n\n")
+        
+        f.write("1. Data Summary\n")
+        f.write(f"   Total Students: {counts['students']}\n")
+        f.write(f"   Total Receipts: {counts['receipts']}\n")
+        f.write(f"   Total Demand Bills: {counts['bills']}\n")
+        f.write(f"   Total Discounts: {counts['discounts']}\n")
+        f.write(f"   Total Academic History: {counts['history']}\n\n")
+        
+        f.write("2. Sessions Found:\n")
+        for session_name in sorted(students.keys()):
+             count = len(students[session_name])
+             f.write(f"   - {session_name}: {count} students\n")
+             
+    print(f"Discovery report generated at {report_path}")
+    return report_path
+
+
+def write_duplicate_report(output_dir: str, duplicates: List[Dict]) -> str:
+    """Write receipt_duplicates.json (see deduplicate_receipts)."""
+    report_path = os.path.join(output_dir, "receipt_duplicates.json")
+    with open(report_path, 'w') as f:
+        json.dump({'merged': len(duplicates), 'dropped': sum(len(d['dropped']) for d in duplicates),
+                   'duplicates': duplicates}, f, indent=2)
+    return report_path
+
+
+def write_validation_log(output_dir: str, log: Dict) -> str:
+    """Write validation_log.json ({errors, warnings, orphan_receipts})."""
+    log_path = os.path.join(output_dir, "validation_log.json")
+    with open(log_path, 'w') as f:
+        json.dump(log, f, indent=2)
+    return log_path
+
+
+def write_identity_report(output_dir: str, identities: List[Dict]) -> str:
+    """Write identity_merges.json (see resolve_student_identities)."""
+    report_path = os.path.join(output_dir, "identity_merges.json")
+    with open(report_path, 'w') as f:
+        json.dump({'clusters': len(identities),
+                   'merged_ids': sum(len(c['members']) - 1 for c in identities),
+                   'merges': identities}, f, indent=2)
+    return report_path
+
+
+def write_fee_type_review(output_dir: str, review: List[Dict]) -> str:
+    """Write fee_type_review.json (legacy fee names not matched exactly, see FeeTypeResolver)."""
+    report_path = os.path.join(output_dir, "fee_type_review.json")
+    with open(report_path, 'w') as f:
+        json.dump({'needs_review': sum(1 for item in review if item['needs_review']),
+                   'names': review}, f, indent=2)
+    flagged = sum(1 for item in review if item['needs_review'])
+    if flagged:
+        print(f"⚠️ {flagged} legacy fee names matched with low confidence. Review {report_path}")
+    return report_path
+
+
+def run_migration(input_path: str, output_dir: str, mapping: LegacyMapping,
+                  discover: bool = False, validate: bool = False, export: bool = False,
+                  session: Optional[str] = None, parser_mode: str = 'stream',
+                  encoding: str = 'latin1', parse_workers: Optional[int] = None,
+                  resume: bool = False, checkpoint: bool = True, pipeline: str = 'staged',
+                  dedupe_receipts: bool = True, resolve_identities: bool = False,
+                  formats: Iterable[str] = ('xlsx',), group_memory_mb: float = GROUP_MEMORY_MB,
+                  verify: bool = False, staging_db: Optional[str] = None,
+                  reference_data: Optional[str] = None, memoize_exports: bool = True,
+                  template_path: Optional[str] = None) -> Dict:
+    """Run one dump through parse -> extract -> validate -> reconcile -> export (-> verify).
+
+    Every stage is checkpointed (see CheckpointStore); with resume=True,
+    completed stages whose inputs are unchanged are loaded rather than rerun.
+    Parsing is not checkpointed: re-parsing the dump is cheaper than
+    pickling (and, for lazy rows, decoding) every row.
+    verify=True reads the exported workbooks back (see verify_exports).
+    staging_db parses into a SQLite staging database ('' for one in output_dir)
+    that extraction then reads from disk.
+    reference_data (a workbook with the backend's Reference_Data sheet) checks
+    every output row against the importer's rules (see ImportPrecheck).
+    Exports fill the import template at template_path (default TEMPLATE_PATH).
+    Exports whose records and template are unchanged since the last run are
+    kept as they are (see ExportManifest) unless memoize_exports=False.
+    pipeline='streaming' spools fee records per session instead (see run_streaming_migration).
+    Returns a summary dict (counts, errors, files written) used by --batch.
+    """
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(input_path)
+    if pipeline == 'streaming':
+        if resume:
+            print("⚠️ --resume has no effect with --pipeline streaming (stages are not checkpointed).")
+        if staging_db is not None:
+            print("⚠️ --staging-db has no effect with --pipeline streaming (the dump is read once, in order).")
+        return run_streaming_migration(input_path, output_dir, mapping, discover=discover, validate=validate,
+                                       export=export, session=session, parser_mode=parser_mode,
+                                       encoding=encoding, parse_workers=parse_workers,
+                                       dedupe_receipts=dedupe_receipts, resolve_identities=resolve_identities,
+                                       formats=formats, group_memory_mb=group_memory_mb, verify=verify,
+                                       reference_data=reference_data, memoize_exports=memoize_exports,
+                                       template_path=template_path)
+    
+    started = time.time()
+    os.makedirs(output_dir, exist_ok=True)
+    summary = {'input': input_path, 'output': output_dir, 'mapping': mapping.name, 'files': []}
+    checkpoints = CheckpointStore(output_dir, resume=resume, enabled=checkpoint)
+    
+    required_tables = mapping.required_tables()
+    fp_parse = CheckpointStore.fingerprint(STAGE_SCHEMA_VERSION, file_fingerprint(input_path),
+                                           encoding, sorted(required_tables))
+    fp_extract = CheckpointStore.fingerprint(fp_parse, mapping.fingerprint, dedupe_receipts, resolve_identities)
+    fp_validate = CheckpointStore.fingerprint(fp_extract, 'validate')
+    fp_reconcile = CheckpointStore.fingerprint(fp_validate, 'reconcile')
+    
+    # 1-2. Parse + Extract (checkpointed together as 'extract')
+    done, data = checkpoints.load('extract', fp_extract)
+    if not done:
+        if staging_db is not None:
+            tables = stage_dump(input_path, staging_db or os.path.join(output_dir, STAGING_DB_NAME), encoding)
+        else:
+            print(f"Loading data from {input_path}...")
+            tables = parse_sql_file(input_path, only=required_tables, mode=parser_mode,
+                                    encoding=encoding, workers=parse_workers)
+            print(f"Parsed {len(tables)} tables.")
+        
+        data = extract_all(tables, mapping, dedupe_receipts, resolve_identities, group_memory_mb)
+        del tables
+        checkpoints.save('extract', fp_extract, data)
+    
+    students, receipts, bills = data['students'], data['receipts'], data['bills']
+    discounts, history = data['discounts'], data['history']
+    total_students = sum(len(s) for s in students.values())
+    total_receipts = sum(len(r) for r in receipts.values())
+    total_bills = sum(len(b) for b in bills.values())
+    total_discounts = sum(len(d) for d in discounts.values())
+    total_history = sum(len(h) for h in history.values())
+    
+    summary.update({
+        'sessions': sorted(students.keys()),
+        'students': total_students,
+        'receipts': total_receipts,
+        'bills': total_bills,
+        'discounts': total_discounts,
+        'history': total_history,
+    })
+    
+    if dedupe_receipts:
+        summary['duplicate_receipts'] = sum(len(d['dropped']) for d in data['duplicates'])
+        summary['files'].append(write_duplicate_report(output_dir, data['duplicates']))
+    summary['files'].append(write_fee_type_review(output_dir, data['fee_type_review']))
+    if resolve_identities:
+        summary['merged_student_ids'] = sum(len(c['members']) - 1 for c in data['identities'])
+        summary['files'].append(write_identity_report(output_dir, data['identities']))
+    
+    # 3. Discovery Report
+    if discover:
+        summary['files'].append(write_discovery_report(output_dir, input_path, summary, students))
+        
+    # 4. Validation
+    if validate or export:
+        done, validation_log = checkpoints.load('validate', fp_validate)
+        if not done:
+            print("Validating data...")
+            validation_result = validate_data(students, receipts, discounts)
+            validation_log = {
+                'errors': validation_result.errors,
+                'warnings': validation_result.warnings,
+                'orphan_receipts': [r.to_dict() for r in validation_result.orphan_receipts]
+            }
+            del validation_result
+            checkpoints.save('validate', fp_validate, validation_log)
+        log_path = write_validation_log(output_dir, validation_log)
+        
+        errors, warnings = len(validation_log['errors']), len(validation_log['warnings'])
+        print(f"Validation complete: {errors} errors, {warnings} warnings.")
+        summary['validation_errors'] = errors
+        summary['validation_warnings'] = warnings
+        if errors:
+            print(f"Errors found! Check {log_path} for details.")
+        del validation_log
+        
+        # 5. Reconcile bills against receipts (fills paid_amount / status)
+        balances_path = os.path.join(output_dir, "opening_balances.json")
+        done, payments = checkpoints.load('reconcile', fp_reconcile)
+        if done and os.path.exists(balances_path) and payments['extract'] == fp_extract:
+            bills = apply_bill_payments(bills, payments)
+        else:
+            print("Reconciling demand bills against receipts...")
+            bills, balances = reconcile_bills(bills, receipts)
+            with open(balances_path, 'w') as f:
+                json.dump(balances, f, indent=2, sort_keys=True)
+            del balances
+            checkpoints.save('reconcile', fp_reconcile, bill_payments(bills, fp_extract))
+        del payments
+        data['bills'] = bills
+        
+        status_counts = defaultdict(int)
+        for session_bills in bills.values():
+            for b in session_bills:
+                status_counts[b.status] += 1
+        print("Bill status: " + ", ".join(f"{k} {v}" for k, v in sorted(status_counts.items())))
+        summary['bill_status'] = dict(status_counts)
+        summary['files'].append(balances_path)
+        
+        # 5b. Check the rows to be written against the backend importer's rules
+        if reference_data:
+            precheck = ImportPrecheck(ReferenceData.load(reference_data), reference_data)
+            for session_name in ([session] if session else students.keys()):
+                if session_name in students:
+                    precheck.check(session_name, {
+                        'students': students[session_name], 'receipts': receipts[session_name],
+                        'bills': bills[session_name], 'discounts': discounts[session_name],
+                        'history': history[session_name]
+                    })
+            if not session:
+                precheck.check("Consolidated", flatten_sessions({
+                    'students': students, 'receipts': receipts, 'bills': bills, 'discounts': discounts,
+                    'history': history
+                }))
+            summary['import_check_errors'] = sum(1 for sheets in precheck.results.values()
+                                                 for issues in sheets.values()
+                                                 for issue in issues if issue[4] == 'error')
+            summary['files'].append(write_import_check(output_dir, precheck))
+    
+    # 6. Export (every requested format; files holding unchanged records are kept)
+    if export:
+        formats = list(formats)
+        print(f"Generating {', '.join(formats)} files...")
+        manifest = ExportManifest(output_dir, load_template_bytes(template_path), enabled=memoize_exports)
+        all_data = {'students': students, 'receipts': receipts, 'bills': bills, 'discounts': discounts,
+                    'history': history}
+        digests = {}
+        
+        sessions_to_export = [session] if session else students.keys()
+        verify_targets = []
+        
+        for session_name in sessions_to_export:
+            if session_name not in students:
+                print(f"Warning: Session {session_name} not found in data.")
+                continue
+            
+            session_records = {
+                'students': students[session_name], 'receipts': receipts[session_name],
+                'bills': bills[session_name], 'discounts': discounts[session_name],
+                'history': history[session_name]
+            }
+            print(f"\nProcessing Session: {session_name}")
+            print(f"     Total Students: {len(students[session_name])}")
+            print(f"     Total Receipts: {len(receipts[session_name])}")
+            print(f"     Total Bills: {len(bills[session_name])}")
+            
+            digests[session_name] = records_digest(session_records)
+            paths, written = export_memoized(session_name, session_records, output_dir, formats, manifest,
+                                             digests[session_name], template_path)
+            for path in paths:
+                print(f"  ✅ Saved: {path}" if path in written else f"  ↩ Unchanged, kept: {path}")
+            summary['files'].extend(paths)
+            if verify:
+                verify_targets.append((xlsx_path(paths), record_totals(session_records)))
+        
+        # Generate Consolidated File
+        if not session:
+            consolidated_records = flatten_sessions(all_data)
+            # The consolidated digest is the sum of the sessions' (no second pass over the records)
+            for session_name in set().union(*all_data.values()) - set(digests):
+                digests[session_name] = records_digest({kind: by_session.get(session_name, ())
+                                                        for kind, by_session in all_data.items()})
+            print("\n📚 Generating Consolidated Migration File (All Sessions)...")
+            paths, written = export_memoized("Consolidated", consolidated_records, output_dir, formats, manifest,
+                                             combine_digests(digests.values()), template_path)
+            for path in paths:
+                print(f"  ✅ Saved Consolidated: {path}" if path in written else f"  ↩ Unchanged, kept: {path}")
+            summary['files'].extend(paths)
+            if verify:
+                verify_targets.append((xlsx_path(paths), record_totals(consolidated_records)))
+        
+        summary['unchanged_exports'] = manifest.unchanged
+        if manifest.unchanged:
+            print(f"\n{len(manifest.unchanged)} export(s) unchanged since the last run were kept "
+                  f"(--rewrite-exports to rewrite them).")
+        print("\n🎉 Export complete!")
+        
+        # 7. Verify the workbooks against what was extracted
+        if verify:
+            summary['files'].append(verify_exports(output_dir, verify_targets, template_path=template_path))
+    
+    summary['resumed_stages'] = checkpoints.resumed
+    summary['elapsed_seconds'] = round(time.time() - started, 2)
+    return summary
+
+
+# =============================================================================
+# STREAMING PIPELINE
+# =============================================================================
+
+# INSERT chunks waiting between the parser thread and extraction
+STREAM_QUEUE_SIZE = 8
+
+
+class RecordSpool:
+    """One session's fee records, spooled to a temporary file as they are extracted.
+
+    put() pickles a batch of one kind straight away, so extracted records are
+    not kept in memory; load() reads them back grouped by kind and batches()
+    yields them batch by batch. replace() swaps the contents for a processed
+    (de-duplicated, reconciled) version of the session.
+    """
+
+    def __init__(self, tmp_dir: Optional[str] = None):
+        self.file = tempfile.TemporaryFile(dir=tmp_dir)
+
+    def put(self, kind: str, records: List[Record]):
+        pickle.dump((kind, records), self.file, pickle.HIGHEST_PROTOCOL)
+
+    def batches(self) -> Iterator[Tuple[str, List[Record]]]:
+        self.file.seek(0)
+        try:
+            while True:
+                yield pickle.load(self.file)
+        except EOFError:
+            pass
+        finally:
+            self.file.seek(0, os.SEEK_END)
+
+    def load(self) -> Dict[str, List[Record]]:
+        records = defaultdict(list)
+        for kind, batch in self.batches():
+            records[kind].extend(batch)
+        return records
+
+    def replace(self, records: Dict[str, List[Record]]):
+        self.file.seek(0)
+        self.file.truncate()
+        for kind, kind_records in records.items():
+            for i in range(0, len(kind_records), SINK_BATCH_SIZE):
+                self.put(kind, kind_records[i:i + SINK_BATCH_SIZE])
+
+    def close(self):
+        self.file.close()
+
+
+def _produce_chunks(input_path: str, tables: set, encoding: str, mode: str, workers: Optional[int],
+                    out: queue.Queue):
+    """Producer thread: tokenized INSERT chunks onto `out`, then None (or the exception)."""
+    try:
+        for chunk in iter_table_chunks(input_path, tables, encoding, mode, workers):
+            out.put(chunk)
+        out.put(None)
+    except Exception as e:
+        out.put(e)
+
+
+def spool_fee_records(dump: LegacyDump) -> Tuple[Dict[str, RecordSpool], Dict[str, int]]:
+    """Pass 2 of the streaming pipeline: every fee table into one RecordSpool per session.
+
+    A producer thread tokenizes INSERT statements onto a bounded queue while
+    this thread turns each chunk into records and spools them, so only a few
+    chunks are ever in memory. Returns (session -> spool, records per kind).
+    """
+    handlers = dump.handlers()
+    spools, counts = {}, defaultdict(int)
+    chunks = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    producer = threading.Thread(target=_produce_chunks, daemon=True,
+                                args=(dump.path, set(handlers), dump.encoding, dump.parser_mode, dump.parse_workers,
+                                      chunks))
+    producer.start()
+    
+    while True:
+        chunk = chunks.get()
+        if chunk is None:
+            break
+        if isinstance(chunk, Exception):
+            raise chunk
+        table_name, columns, rows = chunk
+        kind, records = handlers[table_name]
+        by_session = defaultdict(list)
+        for session_name, record in records(columns, rows):
+            if dump.merge_map:
+                record = remap_student_id(dump.merge_map, record)
+            by_session[session_name].append(record)
+        for session_name, session_records in by_session.items():
+            counts[kind] += len(session_records)
+            if session_name not in spools:
+                spools[session_name] = RecordSpool()
+            spools[session_name].put(kind, session_records)
+    producer.join()
+    return spools, counts
+
+
+def _finish_session(session_name: str, spool: Optional[RecordSpool], dump: LegacyDump,
+                    dedupe_receipts: bool, validation: ValidationResult) -> Tuple[Dict[str, List[Record]], Dict]:
+    """Load one spooled session, de-duplicate its receipts and reconcile its bills.
+
+    Returns ({kind: records} of the session as exported, {'duplicates', 'dropped', 'balances'}).
+    """
+    records = spool.load() if spool else {}
+    receipts = {session_name: records.get('receipts', [])}
+    found = {'duplicates': [], 'dropped': 0}
+    if dedupe_receipts:
+        extracted = len(receipts[session_name])
+        receipts, found['duplicates'] = deduplicate_receipts(receipts)
+        found['dropped'] = extracted - len(receipts[session_name])
+    bills, balances = reconcile_bills({session_name: records.get('bills', [])}, receipts)
+    found['balances'] = balances.get(session_name)
+    check_student_references(validation, dump.student_ids, receipts[session_name], records.get('discounts', ()))
+    return {
+        'students': dump.students.get(session_name, []), 'receipts': receipts[session_name],
+        'bills': bills[session_name], 'discounts': records.get('discounts', []),
+        'history': dump.history.get(session_name, [])
+    }, found
+
+
+def run_streaming_migration(input_path: str, output_dir: str, mapping: LegacyMapping,
+                            discover: bool = False, validate: bool = False, export: bool = False,
+                            session: Optional[str] = None, parser_mode: str = 'stream',
+                            encoding: str = 'latin1', parse_workers: Optional[int] = None,
+                            dedupe_receipts: bool = True, resolve_identities: bool = False,
+                            formats: Iterable[str] = ('xlsx',), group_memory_mb: float = GROUP_MEMORY_MB,
+                            verify: bool = False, reference_data: Optional[str] = None,
+                            memoize_exports: bool = True, template_path: Optional[str] = None) -> Dict:
+    """Migrate a dump holding at most one session's fee records in memory.
+
+    Pass 1 materialises only the student index plus the small lookup tables
+    (bill metadata, financial years). Pass 2 streams every other table into
+    per-session spool files (see spool_fee_records). Sessions are then
+    finished one at a time: receipts de-duplicated, bills reconciled (both
+    need the whole session), the session's exports written to write-only
+    workbooks, and the result spooled back for the consolidated export, which
+    is written last by streaming every session's spool once more.
+
+    Rows appear in the workbooks in dump order rather than grouped by source.
+    """
+    started = time.time()
+    os.makedirs(output_dir, exist_ok=True)
+    summary = {'input': input_path, 'output': output_dir, 'mapping': mapping.name,
+               'pipeline': 'streaming', 'files': []}
+    
+    # Pass 1: student index and lookups
+    print(f"Indexing students from {input_path}...")
+    dump = LegacyDump(input_path, mapping, encoding=encoding, parser_mode=parser_mode,
+                      parse_workers=parse_workers, resolve_identities=resolve_identities,
+                      group_memory_mb=group_memory_mb)
+    students, history = dump.students, dump.history
+    merge_map, identities = dump.merge_map, dump.identities
+    if resolve_identities:
+        print(f"Merged {len(merge_map)} duplicate student IDs into {len(identities)} students.")
+    print(f"Found {sum(len(s) for s in students.values())} students across {len(students)} sessions.")
+    
+    # Pass 2: fee records into per-session spools
+    print("Streaming fee records...")
+    spools, counts = spool_fee_records(dump)
+    
+    formats = list(formats)
+    precheck = ImportPrecheck(ReferenceData.load(reference_data), reference_data) if reference_data else None
+    manifest = ExportManifest(output_dir, load_template_bytes(template_path), enabled=memoize_exports) if export else None
+    consolidated = export and not session
+    validation = ValidationResult()
+    duplicates, balances, status_counts = [], {}, defaultdict(int)
+    digests, verify_targets = {}, []
+    
+    # Finish and export the sessions one at a time
+    for session_name in list(students) + [s for s in spools if s not in students]:
+        session_records, found = _finish_session(session_name, spools.get(session_name), dump,
+                                                 dedupe_receipts, validation)
+        duplicates.extend(found['duplicates'])
+        counts['receipts'] -= found['dropped']
+        if found['balances']:
+            balances[session_name] = found['balances']
+        for b in session_records['bills']:
+            status_counts[b.status] += 1
+        
+        if export and session_name in students and (not session or session_name == session):
+            if precheck:
+                precheck.check(session_name, session_records)
+            digests[session_name] = records_digest(session_records)
+            paths, written = export_memoized(session_name, session_records, output_dir, formats, manifest,
+                                             digests[session_name], template_path)
+            for path in paths:
+                print(f"  ✅ Saved: {path}" if path in written else f"  ↩ Unchanged, kept: {path}")
+            summary['files'].extend(paths)
+            if verify:
+                verify_targets.append((xlsx_path(paths), record_totals(session_records)))
+        if consolidated:
+            digests.setdefault(session_name, records_digest(session_records))
+            spool = spools.get(session_name)
+            if spool is None:
+                spool = spools[session_name] = RecordSpool()
+            spool.replace({kind: session_records[kind] for kind in ('receipts', 'bills', 'discounts')})
+        del session_records
+    
+    if consolidated:
+        def consolidated_batches():
+            yield 'students', [s for v in students.values() for s in v]
+            yield 'history', [h for v in history.values() for h in v]
+            for spool in spools.values():
+                yield from spool.batches()
+        
+        print("\n📚 Generating Consolidated Migration File (All Sessions)...")
+        if precheck or verify:
+            check = precheck.start("Consolidated", dump.student_ids) if precheck else None
+            totals = {}
+            for kind, batch in consolidated_batches():
+                if check:
+                    check.add(kind, batch)
+                add_record_totals(totals, kind, batch)
+            if check:
+                check.finish()
+        paths, written = export_memoized("Consolidated", consolidated_batches(), output_dir, formats, manifest,
+                                         combine_digests(digests.values()), template_path)
+        for path in paths:
+            print(f"  ✅ Saved Consolidated: {path}" if path in written else f"  ↩ Unchanged, kept: {path}")
+        summary['files'].extend(paths)
+        if verify:
+            verify_targets.append((xlsx_path(paths), totals))
+    for spool in spools.values():
+        spool.close()
+    
+    summary.update({
+        'sessions': sorted(students.keys()),
+        'students': sum(len(s) for s in students.values()),
+        'receipts': counts['receipts'],
+        'bills': counts['bills'],
+        'discounts': counts['discounts'],
+        'history': sum(len(h) for h in history.values()),
+    })
+    print(f"Found {counts['receipts']} fee receipts, {counts['bills']} demand bills, "
+          f"{counts['discounts']} discount records.")
+    
+    if dedupe_receipts:
+        summary['duplicate_receipts'] = sum(len(d['dropped']) for d in duplicates)
+        summary['files'].append(write_duplicate_report(output_dir, duplicates))
+        print(f"Dropped {summary['duplicate_receipts']} duplicate receipts recorded in more than one source.")
+    summary['files'].append(write_fee_type_review(output_dir, mapping.resolver.review()))
+    if resolve_identities:
+        summary['merged_student_ids'] = len(merge_map)
+        summary['files'].append(write_identity_report(output_dir, identities))
+    
+    if discover:
+        summary['files'].append(write_discovery_report(output_dir, input_path, summary, students))
+    
+    if validate or export:
+        write_validation_log(output_dir, {
+            'errors': validation.errors,
+            'warnings': validation.warnings,
+            'orphan_receipts': [r.to_dict() for r in validation.orphan_receipts]
+        })
+        print(f"Validation complete: {len(validation.errors)} errors, {len(validation.warnings)} warnings.")
+        summary['validation_errors'] = len(validation.errors)
+        summary['validation_warnings'] = len(validation.warnings)
+        
+        balances_path = os.path.join(output_dir, "opening_balances.json")
+        with open(balances_path, 'w') as f:
+            json.dump(balances, f, indent=2, sort_keys=True)
+        summary['files'].append(balances_path)
+        print("Bill status: " + ", ".join(f"{k} {v}" for k, v in sorted(status_counts.items())))
+        summary['bill_status'] = dict(status_counts)
+    
+    if precheck:
+        summary['files'].append(write_import_check(output_dir, precheck))
+    if manifest:
+        summary['unchanged_exports'] = manifest.unchanged
+    
+    if verify and export:
+        summary['files'].append(verify_exports(output_dir, verify_targets, template_path=template_path))
+    
+    summary['elapsed_seconds'] = round(time.time() - started, 2)
+    return summary
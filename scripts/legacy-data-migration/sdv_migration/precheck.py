@@ -0,0 +1,318 @@
+"""Checking exported rows against the backend importer's rules (--reference-data)."""
+
+import re
+import os
+import json
+from typing import Callable, Dict, List, Tuple, Iterable
+
+from .records import Record
+from .export import SHEET_COLUMNS, export_name, format_cell_value
+
+
+# =============================================================================
+# IMPORT PRE-CHECK
+# =============================================================================
+# Mirrors the row rules of backend/src/data-migration/data-migration.service.ts
+# so rows the importer would reject are reported before anything is uploaded.
+
+REFERENCE_SHEET = 'Reference_Data'
+
+# Reference_Data header -> ReferenceData attribute
+REFERENCE_COLUMNS = {
+    'Classes': 'classes', 'Sections': 'sections', 'Fee Types': 'fee_types', 'Routes': 'routes',
+    'Route Stops': 'stops', 'Academic Sessions': 'sessions', 'Gender Options': 'genders',
+    'Status Options': 'statuses', 'Payment Modes': 'payment_modes', 'Discount Types': 'discount_types',
+    'Bill Status': 'bill_statuses',
+}
+
+# Option lists hard-coded in the backend, used when the sheet predates those columns
+REFERENCE_DEFAULTS = {
+    'genders': {'male', 'female', 'other'},
+    'statuses': {'active', 'inactive', 'passed', 'alumni'},
+    'payment_modes': {'cash', 'upi', 'card', 'cheque', 'online'},
+    'discount_types': {'PERCENTAGE', 'FIXED'},
+    'bill_statuses': {'PENDING', 'SENT', 'PARTIALLY_PAID', 'PAID', 'OVERDUE', 'CANCELLED'},
+}
+
+IMPORT_DATE = re.compile(r'\d{1,2}[-/.]\d{1,2}[-/.]\d{4}')
+
+
+class ReferenceData:
+    """Valid values from a backend-exported Reference_Data sheet, as hash sets.
+
+    Classes, fee types and sessions are matched exactly (as the importer's
+    lookups do); sections are kept as (class, section) pairs, routes by code.
+    A set left empty (column missing or blank) disables its check.
+    """
+
+    def __init__(self):
+        for attr in REFERENCE_COLUMNS.values():
+            setattr(self, attr, set())
+        self.active_session = ''
+        self.class_sections = set()
+        self.route_codes = set()
+
+    @classmethod
+    def load(cls, path: str) -> 'ReferenceData':
+        from openpyxl import load_workbook
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            if REFERENCE_SHEET not in wb.sheetnames:
+                raise ValueError(f"{path} has no {REFERENCE_SHEET} sheet")
+            rows = wb[REFERENCE_SHEET].iter_rows(values_only=True)
+            header = next(rows, ())
+            columns = [(i, REFERENCE_COLUMNS[str(h).strip()]) for i, h in enumerate(header)
+                       if h is not None and str(h).strip() in REFERENCE_COLUMNS]
+            ref = cls()
+            for row in rows:
+                for i, attr in columns:
+                    value = str(row[i]).strip() if i < len(row) and row[i] is not None else ''
+                    if value.startswith('Active Session:'):
+                        ref.active_session = value.split(':', 1)[1].strip()
+                    elif value:
+                        getattr(ref, attr).add(value)
+        finally:
+            wb.close()
+        
+        # Option columns are compared the way the importer normalises them
+        ref.genders = {v.lower() for v in ref.genders} or REFERENCE_DEFAULTS['genders']
+        ref.statuses = {v.lower() for v in ref.statuses} or REFERENCE_DEFAULTS['statuses']
+        ref.payment_modes = {v.lower() for v in ref.payment_modes} or REFERENCE_DEFAULTS['payment_modes']
+        ref.discount_types = {v.upper() for v in ref.discount_types} or REFERENCE_DEFAULTS['discount_types']
+        ref.bill_statuses = {v.upper() for v in ref.bill_statuses} or REFERENCE_DEFAULTS['bill_statuses']
+        # 'Class-Section' and 'R10: Route Name'
+        ref.class_sections = {tuple(s.rsplit('-', 1)) for s in ref.sections if '-' in s}
+        ref.route_codes = {r.split(':')[0].strip() for r in ref.routes}
+        return ref
+
+
+def import_text(value) -> str:
+    """A cell as the importer's getVal() sees it: trimmed text, '' when empty."""
+    return '' if value is None else str(value).strip()
+
+
+class ImportPrecheck:
+    """Checks the rows of each export against the backend importer's rules before writing.
+
+    check() takes one workbook's records and returns its issues per sheet as
+    (row, column, value, message, level); 'error' rows would be rejected or
+    dropped by the importer, 'warning' rows imported with a default or
+    auto-created value. Students must be in the same workbook, as when it is
+    imported into an empty system. start() checks a workbook whose records
+    arrive in batches (see WorkbookCheck). Results are kept per workbook for
+    write_import_check.
+    """
+
+    def __init__(self, reference: ReferenceData, source: str = ''):
+        self.reference = reference
+        self.source = source
+        self.results = {}
+
+    def check(self, name: str, records: Dict[str, List[Record]]) -> Dict[str, List[Tuple]]:
+        workbook = self.start(name, {str(s.student_id) for s in records.get('students', ())})
+        for kind in SHEET_COLUMNS:
+            workbook.add(kind, records.get(kind, ()))
+        return workbook.finish()
+
+    def start(self, name: str, student_ids: set) -> 'WorkbookCheck':
+        """Check a workbook fed batch by batch; student_ids are the students it will contain."""
+        return WorkbookCheck(self, name, student_ids)
+
+    # Per-sheet checks are coroutines (see WorkbookCheck): each send() is a batch of rows,
+    # numbered from row 2 as they are written.
+
+    def _students(self, _, report):
+        ref = self.reference
+        seen_ids, aadhars, roll_keys = {}, set(), set()
+        row = 1
+        while True:
+            for s in (yield):
+                row += 1
+                student_id = import_text(s.student_id)
+                if not student_id:
+                    report(row, 'student_id', '', 'Missing Student ID')
+                    continue
+                identity = (import_text(s.name).lower(), import_text(s.father_name).lower())
+                if seen_ids.setdefault(student_id, identity) != identity:
+                    report(row, 'student_id', student_id, 'Student ID already used by a different student in this file')
+                class_name = import_text(s.class_name)
+                if ref.classes and class_name not in ref.classes:
+                    report(row, 'class_name', class_name, 'Class not found')
+                section = import_text(s.section)
+                section = section.rsplit('-', 1)[-1].strip() if section else 'A'
+                if ref.class_sections and (class_name, section) not in ref.class_sections:
+                    report(row, 'section', section, f"Section not in Reference_Data for class '{class_name}'", 'warning')
+                gender = import_text(s.gender).lower()
+                if gender and gender not in ref.genders:
+                    report(row, 'gender', gender, 'Invalid gender')
+                status = import_text(s.status).lower()
+                if status and status not in ref.statuses:
+                    report(row, 'status', status, 'Invalid status')
+                session = import_text(s.session)
+                if session and ref.sessions and session not in ref.sessions:
+                    report(row, 'session', session, 'Session not found; the active session will be used', 'warning')
+                for field in ('dob', 'admission_date'):
+                    value = import_text(format_cell_value(getattr(s, field)))
+                    if not IMPORT_DATE.fullmatch(value):
+                        report(row, field, value, 'Not a DD-MM-YYYY date; the import date will be used', 'warning')
+                aadhar = import_text(s.aadhar)
+                if aadhar:
+                    if aadhar in aadhars:
+                        report(row, 'aadhar', aadhar, f"Duplicate Aadhar Number '{aadhar}' in file")
+                    aadhars.add(aadhar)
+                roll = import_text(s.roll)
+                if class_name and roll:
+                    key = f"{session}-{class_name}-{section}-{roll}".lower()
+                    if key in roll_keys:
+                        report(row, 'roll', roll, f"Duplicate Roll Number '{roll}' in file. Will be auto-corrected.", 'warning')
+                    roll_keys.add(key)
+
+    def _grouped_document(self, row, number, field, current, closed, report, message):
+        """Rows are grouped into one receipt / bill while the number repeats; a number reappearing later is rejected."""
+        if number != current:
+            if number in closed:
+                report(row, field, number, message)
+            if current:
+                closed.add(current)
+        return number
+
+    def _receipts(self, student_ids, report):
+        ref = self.reference
+        current, closed = None, set()
+        row = 1
+        while True:
+            for r in (yield):
+                row += 1
+                receipt_no = import_text(r.receipt_no)
+                if not receipt_no:
+                    report(row, 'receipt_no', '', 'Missing Receipt No; row is ignored')
+                    continue
+                current = self._grouped_document(row, receipt_no, 'receipt_no', current, closed, report,
+                                                 'Receipt already exists')
+                if import_text(r.student_id) not in student_ids:
+                    report(row, 'student_id', import_text(r.student_id), 'Student not found')
+                fee_type = import_text(r.fee_type)
+                if ref.fee_types and fee_type not in ref.fee_types:
+                    report(row, 'fee_type', fee_type, 'New Fee Type will be created', 'warning')
+                mode = import_text(r.payment_mode).lower()
+                if mode and mode not in ref.payment_modes:
+                    report(row, 'payment_mode', mode, 'Unknown payment mode', 'warning')
+                if not IMPORT_DATE.fullmatch(import_text(format_cell_value(r.receipt_date))):
+                    report(row, 'receipt_date', import_text(r.receipt_date),
+                           'Not a DD-MM-YYYY date; the import date will be used', 'warning')
+
+    def _bills(self, student_ids, report):
+        ref = self.reference
+        current, closed = None, set()
+        row = 1
+        while True:
+            for b in (yield):
+                row += 1
+                student_id, bill_no, fee_type = import_text(b.student_id), import_text(b.bill_no), import_text(b.fee_type)
+                if not student_id or not bill_no or not fee_type:
+                    report(row, 'bill_no', bill_no, 'Missing Student ID, Bill No, or Fee Type')
+                    continue
+                current = self._grouped_document(row, bill_no, 'bill_no', current, closed, report, 'Bill exists')
+                if student_id not in student_ids:
+                    report(row, 'student_id', student_id, 'Student ID not found')
+                if ref.fee_types and fee_type not in ref.fee_types:
+                    report(row, 'fee_type', fee_type, 'New Fee Type will be created', 'warning')
+                status = import_text(b.status).upper()
+                if status and status not in ref.bill_statuses:
+                    report(row, 'status', status, f"Invalid Status. Allowed: {', '.join(sorted(ref.bill_statuses))}")
+                if not isinstance(b.month, int) or not 1 <= b.month <= 12:
+                    report(row, 'month', import_text(b.month), 'Month must be 1-12')
+
+    def _discounts(self, student_ids, report):
+        ref = self.reference
+        row = 1
+        while True:
+            for d in (yield):
+                row += 1
+                student_id, fee_type = import_text(d.student_id), import_text(d.fee_type)
+                if not student_id or not fee_type:
+                    report(row, 'fee_type', fee_type, 'Missing Student ID or Fee Type; row is skipped')
+                    continue
+                if student_id not in student_ids:
+                    report(row, 'student_id', student_id, 'Student not found')
+                if ref.fee_types and fee_type not in ref.fee_types:
+                    report(row, 'fee_type', fee_type, 'Fee Type not found')
+                discount_type = import_text(d.discount_type).upper()
+                if discount_type and discount_type not in ref.discount_types:
+                    report(row, 'discount_type', discount_type, 'Invalid discount type')
+                session = import_text(d.session)
+                if session and ref.sessions and session not in ref.sessions:
+                    report(row, 'session', session, 'Session not found; the active session will be used', 'warning')
+
+    def _history(self, student_ids, report):
+        ref = self.reference
+        row = 1
+        while True:
+            for h in (yield):
+                row += 1
+                student_id, session = import_text(h.student_id), import_text(h.session)
+                if not student_id or not session or not import_text(h.class_name) or not import_text(h.section):
+                    report(row, 'student_id', student_id, 'Missing required fields')
+                    continue
+                if student_id not in student_ids:
+                    report(row, 'student_id', student_id, 'Student not found in system')
+                if ref.sessions and session not in ref.sessions:
+                    report(row, 'session', session, 'Session not found. Create it first.')
+
+
+class WorkbookCheck:
+    """One workbook's ImportPrecheck in progress: add() batches of each sheet's rows in the
+    order they are written (rows are numbered across batches), then finish()."""
+
+    def __init__(self, precheck: ImportPrecheck, name: str, student_ids: set):
+        self.precheck = precheck
+        self.name = name
+        self.found = {}
+        self.checks = {}
+        for kind, check in (('students', precheck._students), ('receipts', precheck._receipts),
+                            ('bills', precheck._bills), ('discounts', precheck._discounts),
+                            ('history', precheck._history)):
+            found = self.found[kind] = []
+            self.checks[kind] = check(student_ids, self._reporter(found, SHEET_COLUMNS[kind][1]))
+            next(self.checks[kind])
+
+    @staticmethod
+    def _reporter(found: List[Tuple], headers: Dict[str, str]) -> Callable:
+        def report(row, field, value, message, level='error'):
+            found.append((row, headers[field], value, message, level))
+        return report
+
+    def add(self, kind: str, records: Iterable[Record]):
+        if records:
+            self.checks[kind].send(records)
+
+    def finish(self) -> Dict[str, List[Tuple]]:
+        for check in self.checks.values():
+            check.close()
+        issues = {SHEET_COLUMNS[kind][0]: found for kind, found in self.found.items() if found}
+        self.precheck.results[self.name] = issues
+        return issues
+
+
+def write_import_check(output_dir: str, precheck: ImportPrecheck) -> str:
+    """Write import_check.json (rows the backend importer would reject, per workbook and sheet)."""
+    report_path = os.path.join(output_dir, "import_check.json")
+    files, errors, warnings = {}, 0, 0
+    for name, sheets in precheck.results.items():
+        entry = {'errors': 0, 'warnings': 0, 'sheets': {}}
+        for sheet, issues in sheets.items():
+            entry['sheets'][sheet] = [{'row': row, 'column': column, 'value': value, 'message': message,
+                                       'level': level} for row, column, value, message, level in issues]
+            sheet_errors = sum(1 for issue in issues if issue[4] == 'error')
+            entry['errors'] += sheet_errors
+            entry['warnings'] += len(issues) - sheet_errors
+        errors += entry['errors']
+        warnings += entry['warnings']
+        files[export_name(name)] = entry
+    with open(report_path, 'w') as f:
+        json.dump({'reference_data': precheck.source, 'errors': errors, 'warnings': warnings, 'files': files},
+                  f, indent=2)
+    print(f"Import pre-check: {errors} errors, {warnings} warnings against {REFERENCE_SHEET}.")
+    if errors:
+        print(f"⚠️ The backend importer would reject rows. Check {report_path} for details.")
+    return report_path
@@ -0,0 +1,204 @@
+"""Receipt de-duplication, validation and bill reconciliation."""
+
+import re
+from collections import defaultdict
+from typing import Dict, List, Tuple, Iterable
+
+from .records import BillRecord, DiscountRecord, ReceiptRecord, ValidationResult
+from .cleaning import date_sort_key, paise_to_rupees
+
+
+# =============================================================================
+# RECEIPT DE-DUPLICATION
+# =============================================================================
+
+# Receipt number prefixes added per source by the extractors
+RECEIPT_NO_PREFIX = re.compile(r'^(?:REC2?|ADM)-')
+
+# How much detail each receipt source carries; the highest wins among duplicates
+RECEIPT_SOURCE_DETAIL = {
+    'modern_transactions': 3,        # per fee type breakdown with real receipt numbers
+    'fee_receipts': 2,               # per fee type breakdown
+    'admission_payments': 1,         # per item, but no payment date
+    'consolidated_transactions': 0,  # one line with the total
+}
+
+
+def receipt_match_key(student_id: str, receipt_no: str, receipt_date: str, total: int) -> Tuple:
+    """Normalised identity of one payment: (student, date, total paise, receipt number without prefix)."""
+    number = RECEIPT_NO_PREFIX.sub('', str(receipt_no or '').strip()).lstrip('0').lower()
+    return (str(student_id), date_sort_key(receipt_date), total, number)
+
+
+def deduplicate_receipts(receipts_by_session: Dict[str, List[ReceiptRecord]]) -> Tuple[Dict[str, List[ReceiptRecord]], List[Dict]]:
+    """Drop payments recorded in more than one legacy source.
+
+    Lines are first grouped into receipts (source, receipt number, student) so
+    the match is on whole payments, not individual fee lines. Receipts are
+    then hash-joined on receipt_match_key within each session (the session
+    being the natural partition: a payment never spans two). When receipts
+    from different sources share a key, the most detailed one is kept (most
+    fee lines, then RECEIPT_SOURCE_DETAIL) and the others are dropped.
+
+    Returns (receipts without duplicates, report of merged duplicates).
+    """
+    deduplicated = defaultdict(list)
+    report = []
+    for session, lines in receipts_by_session.items():
+        receipts = {}
+        for r in lines:
+            receipts.setdefault((r.source, r.receipt_no, str(r.student_id)), []).append(r)
+        
+        matches = defaultdict(list)
+        for (source, receipt_no, student_id), receipt_lines in receipts.items():
+            total = sum(r.net_amount for r in receipt_lines)
+            key = receipt_match_key(student_id, receipt_no, receipt_lines[0].receipt_date, total)
+            matches[key].append((source, receipt_no, receipt_lines))
+        
+        dropped = set()
+        for key, candidates in matches.items():
+            if len({source for source, _, _ in candidates}) < 2:
+                continue
+            kept = max(candidates, key=lambda c: (len(c[2]), RECEIPT_SOURCE_DETAIL.get(c[0], -1)))
+            duplicates = [c for c in candidates if c[0] != kept[0]]
+            for _, _, receipt_lines in duplicates:
+                dropped.update(id(r) for r in receipt_lines)
+            report.append({
+                'session': session,
+                'student_id': key[0],
+                'receipt_date': kept[2][0].receipt_date,
+                'amount': paise_to_rupees(key[2]),
+                'kept': {'receipt_no': kept[1], 'source': kept[0], 'lines': len(kept[2])},
+                'dropped': [{'receipt_no': no, 'source': source, 'lines': len(receipt_lines)}
+                            for source, no, receipt_lines in duplicates],
+            })
+        
+        deduplicated[session] = [r for r in lines if id(r) not in dropped] if dropped else lines
+    return deduplicated, report
+
+
+# =============================================================================
+# VALIDATION
+# =============================================================================
+
+def validate_data(students: Dict, receipts: Dict, discounts: Dict) -> ValidationResult:
+    """Validate all extracted data."""
+    result = ValidationResult()
+    
+    all_student_ids = set()
+    for session_students in students.values():
+        all_student_ids.update(str(s.student_id) for s in session_students)
+    
+    for session_receipts in receipts.values():
+        check_student_references(result, all_student_ids, receipts=session_receipts)
+    for session_discounts in discounts.values():
+        check_student_references(result, all_student_ids, discounts=session_discounts)
+    
+    return result
+
+
+def check_student_references(result: ValidationResult, student_ids: set,
+                             receipts: Iterable[ReceiptRecord] = (), discounts: Iterable[DiscountRecord] = ()):
+    """Add an error to result for every receipt / discount whose student is not in student_ids."""
+    for r in receipts:
+        if str(r.student_id) not in student_ids:
+            result.add_error('receipt', r.receipt_no, 
+                           f"Student {r.student_id} not found")
+            result.orphan_receipts.append(r)
+    for d in discounts:
+        if str(d.student_id) not in student_ids:
+            result.add_error('discount', d.student_id, 
+                           f"Student {d.student_id} not found")
+
+
+# =============================================================================
+# RECONCILIATION
+# =============================================================================
+
+def reconcile_bills(bills: Dict[str, List[BillRecord]],
+                    receipts: Dict[str, List[ReceiptRecord]]) -> Tuple[Dict[str, List[BillRecord]], Dict]:
+    """Allocate receipts to demand bills, returning the bills with paid_amount / status filled in.
+
+    Bills and receipts are grouped by (student_id, session, fee_type). Each
+    group's total receipts are allocated to its bills oldest first, computed for
+    all groups at once with grouped cumulative sums over int64 paise (exact):
+
+        paid_i = clip(total_paid[g] - (amount billed in g before bill i), 0, amount_i)
+
+    Status is PAID, PARTIALLY_PAID or PENDING. Returns (reconciled bills by
+    session, in their original order; the per-student opening balance summary
+    {session: {student_id: {billed, paid, outstanding, advance}}} in rupees,
+    where advance is payments beyond what was billed). The given bills are not
+    modified.
+    """
+    import numpy as np
+
+    group_ids = {}
+    bill_list, bill_sessions = [], []
+    bill_group, bill_date, bill_amount = [], [], []
+    for session, session_bills in bills.items():
+        bill_sessions.append((session, len(session_bills)))
+        for b in session_bills:
+            g = group_ids.setdefault((str(b.student_id), session, b.fee_type), len(group_ids))
+            bill_list.append(b)
+            bill_group.append(g)
+            bill_date.append(date_sort_key(b.bill_date))
+            bill_amount.append(b.net_amount or 0)
+
+    receipt_group, receipt_amount = [], []
+    for session, session_receipts in receipts.items():
+        for r in session_receipts:
+            g = group_ids.setdefault((str(r.student_id), session, r.fee_type), len(group_ids))
+            receipt_group.append(g)
+            receipt_amount.append(r.net_amount or 0)
+
+    n_groups = len(group_ids)
+    paid_total = np.zeros(n_groups, dtype=np.int64)
+    np.add.at(paid_total, np.asarray(receipt_group, dtype=np.int64), np.asarray(receipt_amount, dtype=np.int64))
+    bill_total = np.zeros(n_groups, dtype=np.int64)
+    allocated_total = np.zeros(n_groups, dtype=np.int64)
+
+    if bill_list:
+        group = np.asarray(bill_group, dtype=np.int64)
+        amount = np.asarray(bill_amount, dtype=np.int64)
+        # Order bills by group, then date (stable on original order)
+        order = np.lexsort((np.arange(len(bill_list)), np.asarray(bill_date, dtype=np.int64), group))
+        g_sorted = group[order]
+        a_sorted = amount[order]
+
+        # Exclusive cumulative sum within each group
+        before = np.cumsum(a_sorted) - a_sorted
+        group_start = np.r_[True, g_sorted[1:] != g_sorted[:-1]]
+        start_offset = np.maximum.accumulate(np.where(group_start, np.arange(len(order)), 0))
+        before -= before[start_offset]
+
+        paid_sorted = np.clip(paid_total[g_sorted] - before, 0, a_sorted)
+        paid = np.empty_like(paid_sorted)
+        paid[order] = paid_sorted
+
+        np.add.at(bill_total, group, amount)
+        np.add.at(allocated_total, group, paid)
+
+        fully_paid = (paid >= amount) & (amount > 0)
+        bill_list = [b.replace(paid_amount=p, status='PAID' if full else ('PARTIALLY_PAID' if p > 0 else 'PENDING'))
+                     for b, p, full in zip(bill_list, paid.tolist(), fully_paid.tolist())]
+    reconciled = defaultdict(list)
+    offset = 0
+    for session, count in bill_sessions:
+        reconciled[session] = bill_list[offset:offset + count]
+        offset += count
+
+    # Opening balances per student and session
+    outstanding = bill_total - allocated_total
+    advance = np.maximum(paid_total - bill_total, 0)
+    balances = defaultdict(dict)
+    for (student_id, session, _), g in group_ids.items():
+        entry = balances[session].setdefault(student_id, [0, 0, 0, 0])
+        entry[0] += int(bill_total[g])
+        entry[1] += int(paid_total[g])
+        entry[2] += int(outstanding[g])
+        entry[3] += int(advance[g])
+    return reconciled, {session: {student_id: dict(zip(('billed', 'paid', 'outstanding', 'advance'),
+                                                        map(paise_to_rupees, entry)))
+                                  for student_id, entry in session_balances.items()}
+                        for session, session_balances in balances.items()}
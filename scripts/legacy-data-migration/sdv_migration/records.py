@@ -0,0 +1,221 @@
+"""Records passed between the stages, with money as integer paise."""
+
+import sys
+from typing import Dict, Tuple
+
+
+# =============================================================================
+# DATA CLASSES
+# =============================================================================
+
+def _interned(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Record:
+    """Compact record with a fixed field set (__slots__), shared by extract, validate and export.
+
+    Subclasses declare FIELDS (also their __slots__) and INTERNED (low-cardinality
+    strings such as fee type, payment mode and session that are interned so
+    millions of lines share one string object), and take every field as a
+    keyword argument. Records are not modified once built: replace() returns
+    an updated copy.
+    """
+    __slots__ = ()
+    FIELDS: Tuple[str, ...] = ()
+    INTERNED: Tuple[str, ...] = ()
+
+    def get(self, field: str, default=None):
+        return getattr(self, field, default) if field in self.FIELDS else default
+
+    def items(self):
+        return ((field, getattr(self, field)) for field in self.FIELDS)
+
+    def to_dict(self) -> Dict:
+        return dict(self.items())
+
+    def replace(self, **changes) -> 'Record':
+        """Copy of this record with the given fields changed."""
+        values = self.to_dict()
+        values.update(changes)
+        return type(self)(**values)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, f) == getattr(other, f) for f in self.FIELDS)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{k}={v!r}' for k, v in self.items())})"
+
+    def __reduce__(self):
+        # Pickle as a bare value tuple (no repeated field names); re-interned on load
+        return (_restore_record, (type(self), tuple(getattr(self, f) for f in self.FIELDS)))
+
+
+def _restore_record(cls, values: Tuple):
+    record = cls.__new__(cls)
+    for field, value in zip(cls.FIELDS, values):
+        setattr(record, field, _interned(value) if field in cls.INTERNED else value)
+    return record
+
+
+class StudentRecord(Record):
+    FIELDS = __slots__ = (
+        'student_id', 'name', 'father_name', 'mother_name', 'dob', 'gender', 'class_name',
+        'section', 'roll', 'admission_date', 'phone', 'whats_app', 'email', 'address', 'aadhar',
+        'category', 'religion', 'status', 'session', 'father_occupation', 'mother_occupation',
+        'father_aadhar', 'mother_aadhar',
+    )
+    INTERNED = ('gender', 'class_name', 'section', 'category', 'status', 'session')
+
+    def __init__(self, *, student_id=None, name=None, father_name=None, mother_name=None, dob=None, gender=None,
+                 class_name=None, section=None, roll=None, admission_date=None, phone=None, whats_app=None,
+                 email=None, address=None, aadhar=None, category=None, religion=None, status=None, session=None,
+                 father_occupation=None, mother_occupation=None, father_aadhar=None, mother_aadhar=None):
+        self.student_id = student_id
+        self.name = name
+        self.father_name = father_name
+        self.mother_name = mother_name
+        self.dob = dob
+        self.gender = _interned(gender)
+        self.class_name = _interned(class_name)
+        self.section = _interned(section)
+        self.roll = roll
+        self.admission_date = admission_date
+        self.phone = phone
+        self.whats_app = whats_app
+        self.email = email
+        self.address = address
+        self.aadhar = aadhar
+        self.category = _interned(category)
+        self.religion = religion
+        self.status = _interned(status)
+        self.session = _interned(session)
+        self.father_occupation = father_occupation
+        self.mother_occupation = mother_occupation
+        self.father_aadhar = father_aadhar
+        self.mother_aadhar = mother_aadhar
+
+
+# Record fields holding money, as integer paise
+MONEY_FIELDS = frozenset({'amount', 'discount', 'net_amount', 'paid_amount', 'previous_dues', 'late_fee',
+                          'discount_amount'})
+
+
+class ReceiptRecord(Record):
+    FIELDS = __slots__ = (
+        'student_id', 'receipt_no', 'receipt_date', 'fee_type', 'amount', 'discount', 'net_amount',
+        'payment_mode', 'payment_ref', 'collected_by', 'remarks', 'bill_no', 'source',
+    )
+    INTERNED = ('fee_type', 'payment_mode', 'collected_by', 'remarks', 'source')
+
+    def __init__(self, *, student_id=None, receipt_no=None, receipt_date=None, fee_type=None, amount=None,
+                 discount=0, net_amount=None, payment_mode='Cash', payment_ref='', collected_by='Migration',
+                 remarks='Legacy Import', bill_no=None, source=''):
+        self.student_id = student_id
+        self.receipt_no = receipt_no
+        self.receipt_date = receipt_date
+        self.fee_type = _interned(fee_type)
+        self.amount = amount
+        self.discount = discount
+        self.net_amount = (amount or 0) - (discount or 0) if net_amount is None else net_amount
+        self.payment_mode = _interned(payment_mode)
+        self.payment_ref = payment_ref
+        self.collected_by = _interned(collected_by)
+        self.remarks = _interned(remarks)
+        self.bill_no = bill_no
+        self.source = _interned(source)
+
+
+class BillRecord(Record):
+    FIELDS = __slots__ = (
+        'student_id', 'bill_no', 'bill_date', 'due_date', 'month', 'year', 'fee_type', 'amount',
+        'discount', 'previous_dues', 'late_fee', 'net_amount', 'paid_amount', 'status',
+    )
+    INTERNED = ('fee_type', 'status')
+
+    def __init__(self, *, student_id=None, bill_no=None, bill_date=None, due_date=None, month=None, year=None,
+                 fee_type=None, amount=None, discount=None, previous_dues=None, late_fee=None, net_amount=None,
+                 paid_amount=None, status='PENDING'):
+        if month is None and year is None:
+            # Extract month/year from bill_date
+            date_str = str(bill_date or '')
+            try:
+                if '-' in date_str:
+                    parts = date_str.split('-')
+                    if len(parts[0]) == 4: # YYYY-MM-DD
+                        year = int(parts[0])
+                        month = int(parts[1])
+                    else: # DD-MM-YYYY
+                        year = int(parts[2])
+                        month = int(parts[1])
+            except (ValueError, IndexError):
+                pass  # left unset; demand_bill_records derives it from the bill's session
+        self.student_id = student_id
+        self.bill_no = bill_no
+        self.bill_date = bill_date
+        self.due_date = bill_date if due_date is None else due_date
+        self.month = month
+        self.year = year
+        self.fee_type = _interned(fee_type)
+        self.amount = amount
+        self.discount = discount
+        self.previous_dues = previous_dues
+        self.late_fee = late_fee
+        self.net_amount = amount if net_amount is None else net_amount
+        self.paid_amount = paid_amount
+        self.status = _interned(status)
+
+
+class DiscountRecord(Record):
+    FIELDS = __slots__ = (
+        'student_id', 'fee_type', 'discount_type', 'discount_amount', 'reason', 'approved_by', 'session',
+    )
+    INTERNED = ('fee_type', 'discount_type', 'reason', 'approved_by', 'session')
+
+    def __init__(self, *, student_id=None, fee_type=None, discount_type='Fixed', discount_amount=None, reason=None,
+                 approved_by='Administrator', session=None):
+        self.student_id = student_id
+        self.fee_type = _interned(fee_type)
+        self.discount_type = _interned(discount_type)
+        self.discount_amount = discount_amount
+        self.reason = _interned(reason)
+        self.approved_by = _interned(approved_by)
+        self.session = _interned(session)
+
+
+class HistoryRecord(Record):
+    FIELDS = __slots__ = ('student_id', 'session', 'class_name', 'section', 'roll', 'status', 'final_result')
+    INTERNED = ('session', 'class_name', 'section', 'status', 'final_result')
+
+    def __init__(self, *, student_id=None, session=None, class_name=None, section=None, roll=None, status=None,
+                 final_result=None):
+        self.student_id = student_id
+        self.session = _interned(session)
+        self.class_name = _interned(class_name)
+        self.section = _interned(section)
+        self.roll = roll
+        self.status = _interned(status)
+        self.final_result = _interned(final_result)
+
+
+class ValidationResult:
+    def __init__(self):
+        self.warnings = []  # Auto-fixable issues
+        self.errors = []    # Blocking issues
+        self.orphan_receipts = []
+
+    def add_warning(self, category: str, record_id: str, field: str, original: str, fixed: str):
+        self.warnings.append({
+            'category': category,
+            'id': record_id,
+            'field': field,
+            'original': original,
+            'fixed': fixed
+        })
+
+    def add_error(self, category: str, record_id: str, message: str):
+        self.errors.append({
+            'category': category,
+            'id': record_id,
+            'message': message
+        })
@@ -0,0 +1,209 @@
+"""Parsed tables staged in an on-disk SQLite database (--staging-db)."""
+
+import os
+from collections import defaultdict
+from collections.abc import Mapping
+from typing import Dict, List, Tuple, Optional, Iterable
+
+from .mapping import normalize_key
+from .parsing import iter_table_chunks
+from .checkpoints import STAGE_SCHEMA_VERSION, CheckpointStore, file_fingerprint
+
+
+# =============================================================================
+# SQLITE STAGING
+# =============================================================================
+
+# Staged columns that get an index (compared with normalize_key)
+STAGING_INDEXED_COLUMNS = {'studentid', 'billno', 'year', 'transactionid'}
+STAGING_DB_NAME = 'legacy_staging.sqlite'  # default location inside the output directory
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+class StagedRows:
+    """Rows of one staged table, read from SQLite as dicts (in dump order) on every iteration."""
+
+    def __init__(self, db: 'StagingDatabase', table: str, columns: List[str]):
+        self.db = db
+        self.table = table
+        self.columns = columns
+
+    def __iter__(self):
+        return self._query(f'SELECT * FROM {quote_identifier(self.table)} ORDER BY rowid')
+
+    def _query(self, sql: str) -> Iterable[Dict]:
+        cursor = self.db.conn.execute(sql)
+        columns = [c[0] for c in cursor.description]
+        for values in cursor:
+            yield dict(zip(columns, values))
+
+    def field(self, names: Tuple[str, ...]) -> str:
+        """SQL for a mapped field, read like column_value: the first non-empty of its columns."""
+        present = [quote_identifier(name) for name in names if name in self.columns]
+        if len(present) == 1:
+            return f't.{present[0]}'  # a bare column, so its index can be used
+        if not present:
+            return 'NULL'
+        return 'COALESCE(' + ', '.join(f"NULLIF(t.{column}, '')" for column in present) + ')'
+
+    def select(self, columns: Iterable[str], join: Optional[Tuple[str, ...]] = None,
+               where: Iterable[Tuple[str, ...]] = ()) -> Iterable[Dict]:
+        """Dicts of the given columns (those the table has), in dump order.
+
+        join is a student ID field: only rows whose ID is in the _students
+        table (see StagingDatabase.load_students) are read. Rows where any
+        field in where is empty are skipped.
+        """
+        wanted = [quote_identifier(c) for c in dict.fromkeys(columns) if c in self.columns]
+        sql = f'SELECT {", ".join(f"t.{c}" for c in wanted) or "t.rowid"} FROM {quote_identifier(self.table)} t'
+        if join is not None:
+            sql += f' JOIN _students s ON s.student_id = {self.field(join)}'
+        conditions = [f"{self.field(names)} != ''" for names in where]
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        return self._query(sql + ' ORDER BY t.rowid')
+
+    def __len__(self) -> int:
+        return self.db.conn.execute(f'SELECT COUNT(*) FROM {quote_identifier(self.table)}').fetchone()[0]
+
+
+class StagedLookup(Mapping):
+    """key -> build(row) over a staged table, answered by one indexed query per key.
+
+    Behaves like a dict built from the table in dump order: the last row with
+    a key wins.
+    """
+
+    def __init__(self, rows: StagedRows, column: str, build):
+        self.conn = rows.db.conn
+        self.build = build
+        table, column = quote_identifier(rows.table), quote_identifier(column)
+        self._get = f'SELECT * FROM {table} WHERE {column} = ? ORDER BY rowid DESC LIMIT 1'
+        self._keys = f"SELECT DISTINCT {column} FROM {table} WHERE {column} != ''"
+
+    def __getitem__(self, key):
+        cursor = self.conn.execute(self._get, (key,))
+        values = cursor.fetchone()
+        if values is None:
+            raise KeyError(key)
+        return self.build(dict(zip([c[0] for c in cursor.description], values)))
+
+    def __iter__(self):
+        return (key for (key,) in self.conn.execute(self._keys))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class StagingDatabase:
+    """A dump's tables loaded into an on-disk SQLite database.
+
+    Columns are TEXT, as parsed. Each table is loaded with executemany per
+    INSERT statement inside one transaction per table, then indexed on its
+    student, bill, year and transaction columns (STAGING_INDEXED_COLUMNS).
+    The dump fingerprint is stored alongside, so later runs reuse the database
+    without re-parsing; it can also be opened with any sqlite3 client.
+    """
+
+    def __init__(self, path: str):
+        import sqlite3
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA synchronous = OFF')
+        self.conn.execute('PRAGMA journal_mode = MEMORY')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS _staging_meta (key TEXT PRIMARY KEY, value TEXT)')
+        self._students = None
+
+    def fingerprint(self) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM _staging_meta WHERE key = 'fingerprint'").fetchone()
+        return row[0] if row else None
+
+    def table_names(self) -> List[str]:
+        return [name for (name,) in self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name != '_staging_meta' ORDER BY name")]
+
+    def load(self, input_path: str, encoding: str = 'latin1', fingerprint: str = '') -> Dict[str, int]:
+        """Replace the staged tables with every table of a dump. Returns rows loaded per table."""
+        for name in self.table_names():
+            self.conn.execute(f'DROP TABLE {quote_identifier(name)}')
+        self.conn.execute('DELETE FROM _staging_meta')
+        
+        columns_of, counts, current = {}, defaultdict(int), None
+        try:
+            for table_name, columns, rows in iter_table_chunks(input_path, None, encoding):
+                if table_name != current:
+                    if current is not None:
+                        self.conn.execute('COMMIT')
+                    self.conn.execute('BEGIN')
+                    current = table_name
+                table = quote_identifier(table_name)
+                known = columns_of.get(table_name)
+                if known is None:
+                    known = columns_of[table_name] = list(columns)
+                    self.conn.execute(f'CREATE TABLE {table} ({", ".join(quote_identifier(c) + " TEXT" for c in known)})')
+                for column in columns:
+                    if column not in known:  # a later INSERT with more columns
+                        self.conn.execute(f'ALTER TABLE {table} ADD COLUMN {quote_identifier(column)} TEXT')
+                        known.append(column)
+                if rows:
+                    self.conn.executemany(
+                        f'INSERT INTO {table} ({", ".join(map(quote_identifier, columns))}) '
+                        f'VALUES ({", ".join("?" * len(columns))})',
+                        (tuple(row.get(c) for c in columns) for row in rows))
+                    counts[table_name] += len(rows)
+            if current is not None:
+                self.conn.execute('COMMIT')
+            
+            self.conn.execute('BEGIN')
+            for table_name, columns in columns_of.items():
+                for column in columns:
+                    if normalize_key(column) in STAGING_INDEXED_COLUMNS:
+                        index = quote_identifier(f'ix_{table_name}_{column}')
+                        self.conn.execute(f'CREATE INDEX {index} ON {quote_identifier(table_name)} '
+                                          f'({quote_identifier(column)})')
+            self.conn.execute("INSERT INTO _staging_meta VALUES ('fingerprint', ?)", (fingerprint,))
+            self.conn.execute('COMMIT')
+        except BaseException:
+            if self.conn.in_transaction:
+                self.conn.execute('ROLLBACK')
+            raise
+        return dict(counts)
+
+    def tables(self) -> Dict[str, Dict]:
+        """Table name -> {'columns', 'rows'} like parse_sql_file, with rows read from disk."""
+        tables = {}
+        for name in self.table_names():
+            columns = [info[1] for info in self.conn.execute(f'PRAGMA table_info({quote_identifier(name)})')]
+            tables[name] = {'columns': columns, 'rows': StagedRows(self, name, columns)}
+        return tables
+
+    def load_students(self, student_ids: set):
+        """Stage the extracted student IDs as the temp table _students (for StagedRows.select joins)."""
+        if student_ids == self._students:
+            return
+        self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS _students (student_id TEXT PRIMARY KEY)')
+        self.conn.execute('BEGIN')
+        self.conn.execute('DELETE FROM _students')
+        self.conn.executemany('INSERT INTO _students VALUES (?)', ((sid,) for sid in student_ids))
+        self.conn.execute('COMMIT')
+        self._students = set(student_ids)
+
+    def close(self):
+        self.conn.close()
+
+
+def stage_dump(input_path: str, db_path: str, encoding: str = 'latin1') -> Dict[str, Dict]:
+    """Tables of a dump served from a SQLite staging database, loaded first unless already current."""
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    db = StagingDatabase(db_path)
+    fingerprint = CheckpointStore.fingerprint(STAGE_SCHEMA_VERSION, file_fingerprint(input_path), encoding)
+    if db.fingerprint() == fingerprint:
+        print(f"Using staged tables in {db_path}")
+    else:
+        print(f"Staging {input_path} into {db_path}...")
+        counts = db.load(input_path, encoding, fingerprint)
+        print(f"Staged {sum(counts.values())} rows from {len(counts)} tables.")
+    return db.tables()
@@ -0,0 +1,59 @@
+"""
+Startup tests for migrate_sdv.py: the short --help / --discover runs our wrapper
+scripts make many times per migration must not import the heavy packages
+(numpy for reconciliation, openpyxl for workbooks, pyarrow for Parquet).
+
+Run from this directory:
+    python -m pytest -q test_cli_startup.py
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrate_sdv.py')
+
+HEAVY_PACKAGES = ('numpy', 'openpyxl', 'pyarrow')
+
+
+def imported_modules(args, cwd):
+    """Run migrate_sdv.py under `python -X importtime` and return the names of the modules it imported."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', SCRIPT] + args, cwd=cwd,
+                          capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stdout[-2000:] + proc.stderr[-2000:]
+
+    modules = set()
+    for line in proc.stderr.splitlines():
+        # "import time:       831 |      92706 |     openpyxl.workbook.workbook"
+        if line.startswith('import time:') and 'cumulative' not in line:
+            modules.add(line.rsplit('|', 1)[1].strip())
+    return modules
+
+
+@pytest.fixture
+def dump(tmp_path):
+    path = tmp_path / 'school.sql'
+    path.write_text(
+        "INSERT INTO `student_details` (`student_id`,`Student_Name`,`Father_Name`,`clss`,`year`,`status`) VALUES "
+        "('1001','Asha','Ravi','I','2024-2025','active'),('1002','Vikram','Mohan','II','2024-2025','active');\n"
+        "INSERT INTO `feetransaction_new` (`id`,`receipt_no`,`student_id`,`year`,`date`,`tuition`) VALUES "
+        "('1','501','1001','2024-2025','2024-06-15','1500'),('2','502','1002','2024-2025','2024-06-15','1500');\n",
+        encoding='latin1')
+    return path
+
+
+def test_help_does_not_import_heavy_packages(tmp_path):
+    modules = imported_modules(['--help'], tmp_path)
+
+    assert 'sdv_migration.cli' in modules
+    assert [pkg for pkg in HEAVY_PACKAGES if pkg in modules] == []
+
+
+def test_discover_does_not_import_heavy_packages(tmp_path, dump):
+    modules = imported_modules(['--discover', '--input', str(dump), '--output', str(tmp_path / 'out'),
+                                '--no-checkpoint'], tmp_path)
+
+    assert (tmp_path / 'out' / 'discovery_report.txt').exists()
+    assert [pkg for pkg in HEAVY_PACKAGES if pkg in modules] == []
@@ -0,0 +1,1186 @@
+"""
+Behaviour tests for the sdv_migration package (migrate_sdv.py).
+
+Run from this directory:
+    python -m pytest -q test_migrate_sdv.py
+"""
+
+import csv
+import gc
+import gzip
+import json
+import os
+import pickle
+import sys
+import threading
+from collections import defaultdict
+from decimal import Decimal
+
+import pytest
+
+import sdv_migration as sdv
+from sdv_migration import (batch, checkpoints, cleaning, cli, export, extraction, identity, library, mapping, parsing,
+                           pipeline, precheck)
+
+
+# =============================================================================
+# MAPPING
+# =============================================================================
+
+PUPILS_MAPPING = {
+    'name': 'pupils',
+    'fee_types': {'Tuition Fee': ['tuition']},
+    'sources': {
+        'students': {'table': 'pupils',
+                     'columns': {'student_id': 'pid', 'session': ['acad_year', 'year'], 'name': 'full_name',
+                                 'class_name': 'std', 'phone': 'mobile'}},
+        'fee_receipts': {'table': 'receipts', 'fee_columns': {'TUITION_AMT': 'tuition'}},
+    },
+}
+
+
+def write_mapping(tmp_path, config, name='mapping.json'):
+    path = tmp_path / name
+    path.write_text(json.dumps(config), encoding='utf-8')
+    return str(path)
+
+
+def test_default_mapping_names_every_extracted_field():
+    default_mapping = sdv.load_mapping()
+
+    for source, keys in mapping.MAPPED_FIELDS.items():
+        for key, fields in keys.items():
+            assert all(default_mapping.columns(source, key)[field] for field in fields), (source, key)
+
+
+def test_mapping_overrides_table_and_column_names(tmp_path):
+    mapping = sdv.load_mapping(write_mapping(tmp_path, PUPILS_MAPPING))
+    tables = {'pupils': {'columns': ['pid', 'acad_year', 'year', 'full_name', 'std', 'mobile'],
+                         'rows': [{'pid': '7', 'acad_year': '', 'year': '2024-2025', 'full_name': 'asha rao',
+                                   'std': 'V', 'mobile': '9876543210'},
+                                  {'pid': '8', 'acad_year': 'n/a', 'full_name': 'ravi'}]}}
+
+    students = sdv.extract_students(tables, mapping)
+
+    [student] = students['2024-2025']
+    assert (student.student_id, student.session, student.phone) == ('7', '2024-2025', '9876543210')
+    assert student.name and student.class_name
+    assert mapping.columns('students')['religion'] == ()
+    assert mapping.fee_columns('fee_receipts', ['id', 'tuition_amt']) == [('tuition_amt', 1, 'Tuition Fee')]
+
+
+def test_mapping_rejects_unknown_fields(tmp_path):
+    config = json.loads(json.dumps(PUPILS_MAPPING))
+    config['sources']['students']['columns']['nmae'] = 'full_name'
+
+    with pytest.raises(ValueError, match='nmae'):
+        sdv.load_mapping(write_mapping(tmp_path, config))
+
+
+def test_yaml_mapping_loads_like_json(tmp_path):
+    yaml = pytest.importorskip('yaml')
+    path = tmp_path / 'mapping.yml'
+    path.write_text(yaml.safe_dump(PUPILS_MAPPING), encoding='utf-8')
+
+    mapping = sdv.load_mapping(str(path))
+
+    assert mapping.columns('students') == sdv.load_mapping(write_mapping(tmp_path, PUPILS_MAPPING)).columns('students')
+
+
+def test_yaml_mapping_without_pyyaml_raises_import_error(tmp_path, monkeypatch):
+    path = tmp_path / 'mapping.yaml'
+    path.write_text('name: pupils\n', encoding='utf-8')
+    monkeypatch.setitem(sys.modules, 'yaml', None)
+
+    with pytest.raises(ImportError, match='PyYAML'):
+        sdv.load_mapping(str(path))
+
+
+# =============================================================================
+# FEE TYPES
+# =============================================================================
+
+@pytest.fixture
+def resolver():
+    return mapping.FeeTypeResolver(sdv.get_default_mapping().fee_type_map)
+
+
+def test_fee_type_resolver_matches_exactly_then_normalised_then_fuzzy(resolver):
+    assert resolver.resolve('Tuition_Fee') == 'Tuition Fee'
+    assert resolver.resolve('Tution Fees') == 'Tuition Fee'  # misspelling and filler word
+    assert resolver.resolve('Smart Clas') == 'Smart Class'
+    assert resolver.resolve('Exm') == 'Exam Fee'
+    assert resolver.resolve('Picnic') is None
+
+    review = {item['legacy_name']: item for item in resolver.review()}
+    assert 'Tuition_Fee' not in review
+    assert (review['Tution Fees']['method'], review['Tution Fees']['needs_review']) == ('normalised', False)
+    assert review['Smart Clas']['method'] == 'fuzzy' and not review['Smart Clas']['needs_review']
+    # applied, but scored below FEE_REVIEW_SCORE
+    assert review['Exm']['method'] == 'fuzzy' and review['Exm']['needs_review']
+    assert review['Exm']['matched'] == 'exam'
+    assert review['Picnic']['resolved'] == 'Picnic' and review['Picnic']['needs_review']
+
+
+def test_fee_type_review_lists_distinct_names_least_confident_first(resolver):
+    for name in ('Hostl', 'Exm', 'Hostl', 'Picnic', 'Exm'):
+        resolver.resolve(name)
+
+    assert [item['legacy_name'] for item in resolver.review()] == ['Picnic', 'Exm', 'Hostl']
+    assert all(set(item) == {'legacy_name', 'resolved', 'method', 'score', 'matched', 'needs_review'}
+               for item in resolver.review())
+
+    resolver.reset()
+    assert resolver.review() == []
+    assert resolver.resolve('Hostl') == 'Hostel Fee'  # memoised match survives the reset
+    assert [item['legacy_name'] for item in resolver.review()] == ['Hostl']
+
+
+# =============================================================================
+# SAMPLE DUMP
+# =============================================================================
+
+SESSIONS = ('2023-2024', '2024-2025', '2025-2026')
+
+
+def insert(table, columns, rows):
+    values = ','.join('(' + ','.join("'" + str(v).replace("'", "\\'") + "'" for v in row) + ')' for row in rows)
+    return f"INSERT INTO `{table}` ({','.join(f'`{c}`' for c in columns)}) VALUES {values};\n"
+
+
+def school_dump(path, students=12, sessions=SESSIONS):
+    """A small dump in the default (sdv) schema: every student enrolled in every session."""
+    ids = [1000 + i for i in range(students)]
+    path.write_text(''.join([
+        "-- MySQL dump\n",
+        insert('financialmaster', ['financialid', 'financialyear'], [(i + 1, s) for i, s in enumerate(sessions)]),
+        insert('student_details', ['student_id', 'Student_Name', 'Father_Name', 'DOB', 'Sex', 'clss', 'sec', 'roll',
+                                   'Mobile_No', 'pr1', 'year', 'status'],
+               [(sid, f"Student {sid}", f"Father {sid}", '2012-05-01', 'M' if sid % 2 else 'F',
+                 ['I', 'II', 'III', 'IV'][n], 'A', sid % 100, f"98765{sid:05d}", 'Main Road', s, 'active')
+                for n, s in enumerate(sessions) for sid in ids]),
+        insert('demandbillsec', ['billNo', 'billYear', 'billmonth', 'currentDate'],
+               [(f"B{n}-{sid}", s, 4, f"{s[:4]}-04-10") for n, s in enumerate(sessions) for sid in ids]),
+        insert('demandbillnew', ['BillNo', 'StudentID', 'TuitionFee', 'Conveyance', 'Dues'],
+               [(f"B{n}-{sid}", sid, 1500, 300 * (sid % 2), 0) for n, s in enumerate(sessions) for sid in ids]),
+        insert('feetransaction_new', ['id', 'receipt_no', 'student_id', 'year', 'date', 'tuition', 'computer'],
+               [(n * 1000 + sid, f"{n}{sid}", sid, s, f"{s[:4]}-06-15", '1000.50', 200)
+                for n, s in enumerate(sessions) for sid in ids]),
+        insert('feereceipt', ['feereceipt_no', 'student_id', 'year', 'rdate', 'paymode', 'tuition_fee', 'lib_fee'],
+               [(f"9{n}{sid}", sid, s, f"15/07/{s[:4]}", 'Cash', 500, 50) for n, s in enumerate(sessions) for sid in ids]
+               # a receipt for a student the dump does not hold
+               + [('99999', 9999, sessions[0], f"15/07/{sessions[0][:4]}", 'Cash', 500, 0)]),
+        insert('admissionpayment', ['id', 'transactionId', 'studentId', 'description', 'amount', 'yearId'],
+               [(sid, sid, sid, 'Tuition Fee', 300, 1) for sid in ids[:3]]),
+        insert('concessiontable', ['StudentID', 'Year', 'TuitionFee'],
+               [(sid, sessions[-1], 100) for sid in ids[::4]] + [(9999, sessions[-1], 100)]),
+    ]), encoding='latin1')
+    return path
+
+
+@pytest.fixture
+def school(tmp_path):
+    return school_dump(tmp_path / 'school.sql')
+
+
+# =============================================================================
+# SQL PARSER
+# =============================================================================
+
+MULTIBYTE_DUMP = (
+    "INSERT INTO `student_details` (`student_id`,`Student_Name`,`Father_Name`) VALUES "
+    + ','.join(f"('{i}','Ādya Śarmā {i}','पिता 😀 {i}')" for i in range(40))
+    + ";\nINSERT INTO `fee_heads` (`name`) VALUES ('Frais d’été');\n"
+)
+
+
+@pytest.mark.parametrize('block_size', [1, 2, 3, 5, 64, 997, 1000, 1009, 4096])
+def test_stream_parser_decodes_characters_split_across_blocks(tmp_path, block_size):
+    path = tmp_path / 'dump.sql'
+    path.write_text(MULTIBYTE_DUMP, encoding='utf-8')
+
+    statements = list(parsing.iter_insert_statements(str(path), 'utf-8', block_size=block_size))
+
+    assert statements == list(parsing.iter_insert_statements(str(path), 'utf-8', block_size=1 << 20))
+    assert [table for table, _, _ in statements] == ['student_details', 'fee_heads']
+    assert "'पिता 😀 39'" in statements[0][2]
+    assert statements[1][2] == "('Frais d’été')"
+
+
+@pytest.mark.parametrize('block_size', [7, 8, 9, 100, 4096])
+def test_stream_parser_finds_terminators_across_blocks(tmp_path, block_size):
+    rows = ','.join(f"('{i}','a;b')" for i in range(300))
+    dump = f"INSERT INTO `t` (`a`,`b`) VALUES {rows};\nINSERT INTO `u` (`a`) VALUES ('x');\n"
+    path = tmp_path / 'dump.sql'
+    path.write_text(dump, encoding='latin1')
+
+    statements = list(parsing.iter_insert_statements(str(path), block_size=block_size))
+
+    assert statements == [('t', ['a', 'b'], rows), ('u', ['a'], "('x')")]
+
+
+ESCAPED_DUMP = (
+    "-- MySQL dump\n"
+    "INSERT INTO `student_details` (`student_id`,`Student_Name`,`Father_Name`,`pr1`,`cate`) VALUES "
+    "('1001','Ravi O\\'Brien','Father, Sr.','Flat 4\\\\B, Main Rd',''),"
+    "('1002','Asha','NULL','  Padded  ','GEN'),"
+    "(1003,'Sita','Ram',NULL,'OBC');\n"
+    "CREATE TABLE `ignored` (id int);\n"
+    "INSERT INTO `student_details` (`cate`,`student_id`,`Student_Name`) VALUES ('SC','1004','Late Row');\n"
+    "INSERT INTO `feetransaction_new` (`id`,`receipt_no`,`student_id`,`tuition`) VALUES "
+    + ','.join(f"('{i}','R{i}','{1001 + i % 4}','1,500.50')" for i in range(50))
+    + ";\n"
+)
+
+
+def parsed_rows(tables):
+    return {name: [dict(row) for row in table['rows']] for name, table in tables.items()}
+
+
+@pytest.fixture
+def escaped_dump(tmp_path):
+    path = tmp_path / 'dump.sql'
+    path.write_text(ESCAPED_DUMP, encoding='latin1')
+    return path
+
+
+def test_mmap_parser_agrees_with_stream_parser(escaped_dump):
+    stream = parsed_rows(sdv.parse_sql_file(str(escaped_dump), mode='stream'))
+
+    assert parsed_rows(sdv.parse_sql_file(str(escaped_dump), mode='mmap')) == stream
+    students = stream['student_details']
+    # A trailing empty value is dropped, so the row has no 'cate'
+    assert students[0] == {'student_id': '1001', 'Student_Name': "Ravi O'Brien", 'Father_Name': 'Father, Sr.',
+                           'pr1': 'Flat 4\\B, Main Rd'}
+    assert students[1]['pr1'] == 'Padded'
+    assert students[3] == {'cate': 'SC', 'student_id': '1004', 'Student_Name': 'Late Row'}
+    assert len(stream['feetransaction_new']) == 50
+
+
+@pytest.mark.parametrize('workers', [1, 2, 3])
+def test_parallel_parser_agrees_with_stream_parser(escaped_dump, workers):
+    stream = parsed_rows(sdv.parse_sql_file(str(escaped_dump), mode='stream'))
+
+    assert parsed_rows(sdv.parse_sql_file(str(escaped_dump), mode='parallel', workers=workers)) == stream
+
+
+@pytest.mark.parametrize('mode', ['stream', 'mmap', 'parallel'])
+def test_parsers_skip_tables_not_asked_for(escaped_dump, mode):
+    tables = sdv.parse_sql_file(str(escaped_dump), only={'feetransaction_new'}, mode=mode, workers=2)
+    assert list(tables) == ['feetransaction_new']
+
+
+def test_lazy_rows_read_from_several_threads(escaped_dump):
+    rows = sdv.parse_sql_file(str(escaped_dump), mode='mmap')['feetransaction_new']['rows']
+    expected = [(f"R{i}", str(1001 + i % 4)) for i in range(50)]
+    results, barrier = {}, threading.Barrier(4)
+
+    def read(name, order):
+        barrier.wait()
+        results[name] = [[(rows[i]['receipt_no'], rows[i]['student_id']) for i in order] for _ in range(200)]
+
+    orders = [list(range(50)), list(reversed(range(50))), list(range(0, 50, 2)) + list(range(1, 50, 2)),
+              [i // 2 for i in range(100)]]
+    threads = [threading.Thread(target=read, args=(n, order)) for n, order in enumerate(orders)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for name, order in enumerate(orders):
+        assert all(reads == [expected[i] for i in order] for reads in results[name])
+
+
+def write_compressed(path, kind, data):
+    if kind == 'gzip':
+        import gzip
+        path = path.with_suffix('.sql.gz')
+        path.write_bytes(gzip.compress(data))
+    elif kind == 'zstd':
+        zstandard = pytest.importorskip('zstandard')
+        path = path.with_suffix('.sql.zst')
+        path.write_bytes(zstandard.ZstdCompressor().compress(data))
+    else:
+        import zipfile
+        path = path.with_suffix('.zip')
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('readme.txt', 'not the dump')
+            archive.writestr('backup/school.sql', data)
+    return path
+
+
+@pytest.mark.parametrize('kind', ['gzip', 'zstd', 'zip'])
+@pytest.mark.parametrize('mode', ['stream', 'mmap', 'parallel'])
+def test_compressed_dumps_parse_like_plain_ones(tmp_path, escaped_dump, kind, mode):
+    compressed = write_compressed(tmp_path / 'school', kind, escaped_dump.read_bytes())
+
+    # mmap and parallel need a plain file and fall back to streaming
+    tables = sdv.parse_sql_file(str(compressed), mode=mode, workers=2)
+
+    assert parsed_rows(tables) == parsed_rows(sdv.parse_sql_file(str(escaped_dump)))
+    assert parsing.uncompressed_size(str(compressed)) == escaped_dump.stat().st_size
+
+
+# =============================================================================
+# SQLITE STAGING
+# =============================================================================
+
+def test_staged_extraction_matches_parsed_extraction(school, tmp_path):
+    mapping = sdv.get_default_mapping()
+    parsed = sdv.extract_all(sdv.parse_sql_file(str(school)), mapping)
+    staged = sdv.extract_all(sdv.stage_dump(str(school), str(tmp_path / 'staging.sqlite')), mapping)
+
+    for kind in ('students', 'receipts', 'bills', 'discounts', 'history'):
+        assert staged[kind] == parsed[kind], kind
+    # Discounts are not joined on the students, so the orphan is still there to be reported
+    assert '9999' in {d.student_id for d in staged['discounts'][SESSIONS[-1]]}
+    assert '9999' not in {r.student_id for rs in staged['receipts'].values() for r in rs}
+
+
+def test_staged_select_reads_known_students_and_named_columns(school, tmp_path):
+    rows = sdv.stage_dump(str(school), str(tmp_path / 'staging.sqlite'))['feereceipt']['rows']
+    rows.db.load_students({'1000', '1001'})
+
+    selected = list(rows.select(['student_id', 'feereceipt_no', 'no_such_column'], join=('student_id',),
+                                where=[('year',)]))
+
+    assert len(rows) == 12 * len(SESSIONS) + 1
+    assert {tuple(row) for row in selected} == {('student_id', 'feereceipt_no')}
+    assert [row['student_id'] for row in selected] == ['1000', '1001'] * len(SESSIONS)
+
+
+# =============================================================================
+# MONEY
+# =============================================================================
+
+@pytest.mark.parametrize('value, paise', [
+    ('1,500.50', 150050),
+    (1500, 150000),
+    (1500.5, 150050),
+    ('₹ 2,000', 200000),
+    ('Rs. 99.999', 10000),
+    ('-12.345', -1235),
+    ('0.1', 10),
+    ('.5', 50),
+    ('1e3', 100000),
+    ('', 0),
+    (None, 0),
+    ('NULL', 0),
+    ('abc', 0),
+])
+def test_parse_paise(value, paise):
+    assert cleaning.parse_paise(value) == paise
+
+
+def test_parse_paise_has_no_float_drift():
+    # 0.1 + 0.2 != 0.3 in floats; the paise sum is exact
+    assert sum(cleaning.parse_paise(v) for v in ('0.10', '0.20')) == cleaning.parse_paise('0.30')
+    assert cleaning.paise_to_rupees(cleaning.parse_paise('1,500.50')) == 1500.5
+
+
+# =============================================================================
+# SESSIONS
+# =============================================================================
+
+@pytest.mark.parametrize('label, session', [
+    ('2023-2024', '2023-2024'),
+    ('2023-24', '2023-2024'),
+    (' 2023 / 24 ', '2023-2024'),
+    ('1999-00', '1999-2000'),
+    ('2023-2025', ''),
+    ('2023', ''),
+    ('', ''),
+    (None, ''),
+])
+def test_canonical_session(label, session):
+    assert extraction.canonical_session(label) == session
+
+
+@pytest.fixture
+def calendar():
+    return extraction.SessionCalendar(['2023-24', '2024-2025', 'junk'], {'7': '2024-2025'})
+
+
+@pytest.mark.parametrize('date_str, session', [
+    ('01-04-2023', '2023-2024'),
+    ('31-03-2024', '2023-2024'),
+    ('2024-03-31', '2023-2024'),
+    ('01-04-2024', '2024-2025'),
+    ('31-03-2025', '2024-2025'),
+    ('01-04-2025', ''),
+    ('31-03-2023', ''),
+    ('', ''),
+])
+def test_session_calendar_boundaries(calendar, date_str, session):
+    assert calendar.sessions == ['2023-2024', '2024-2025']
+    assert calendar.session_for(date_str) == session
+    assert calendar.sessions_for([date_str, date_str]) == [session, session]
+
+
+def test_session_calendar_names_and_periods(calendar):
+    assert [calendar.session_named(v) for v in ('7', '2023-24', '2024', '2025', '8', '')] == [
+        '2024-2025', '2023-2024', '2024-2025', '', '', '']
+    assert calendar.period('2023-2024', 4) == (4, 2023)
+    assert calendar.period('2023-2024', '3') == (3, 2024)
+    assert calendar.period('2023-2024', 13) == (None, None)
+    assert calendar.period('', 4) == (None, None)
+
+
+def test_extractors_file_records_under_canonical_sessions(tmp_path):
+    pytest.importorskip('numpy')
+    dump = tmp_path / 'labels.sql'
+    dump.write_text(''.join([
+        insert('financialmaster', ['financialid', 'financialyear'], [(1, '2023-24'), (2, '2024-25')]),
+        insert('student_details', ['student_id', 'Student_Name', 'Father_Name', 'clss', 'year', 'status'],
+               [(1001, 'Asha', 'Ravi', 'I', '2023-24', 'active'), (1002, 'Ravi', 'Mohan', 'II', '2023/2024', 'active')]),
+        insert('feetransaction_new', ['id', 'receipt_no', 'student_id', 'year', 'date', 'tuition'],
+               [(1, 'REC-1', 1001, '2023-2024', '2023-06-15', 1000)]),
+        insert('feereceipt', ['feereceipt_no', 'student_id', 'year', 'rdate', 'tuition_fee'],
+               [('2', 1002, '2023 - 24', '15/07/2023', 500)]),
+        insert('concessiontable', ['StudentID', 'Year', 'TuitionFee'], [(1001, '2023-24', 100)]),
+        # no yearId: the session comes from the mapped payment date
+        insert('admissionpayment', ['id', 'transactionId', 'studentId', 'description', 'amount', 'yearId',
+                                    'paymentDate'], [(1, 9, 1002, 'Tuition Fee', 300, '', '2023-05-02')]),
+    ]), encoding='latin1')
+
+    data = sdv.extract_all(sdv.parse_sql_file(str(dump)), sdv.get_default_mapping())
+
+    assert {kind: sorted(data[kind]) for kind in ('students', 'receipts', 'discounts')} == {
+        'students': ['2023-2024'], 'receipts': ['2023-2024'], 'discounts': ['2023-2024']}
+    assert sorted(r.source for r in data['receipts']['2023-2024']) == [
+        'admission_payments', 'fee_receipts', 'modern_transactions']
+
+
+# =============================================================================
+# RECORDS
+# =============================================================================
+
+def test_records_fill_defaults_and_derived_fields():
+    receipt = sdv.ReceiptRecord(student_id='1001', receipt_no='R1', fee_type='Tuition Fee', amount=150000,
+                                discount=5000)
+    bill = sdv.BillRecord(student_id='1001', bill_no='B1', bill_date='05-04-2024', fee_type='Tuition Fee',
+                          amount=120000)
+
+    assert (receipt.net_amount, receipt.payment_mode, receipt.remarks, receipt.bill_no) == (
+        145000, 'Cash', 'Legacy Import', None)
+    assert (bill.net_amount, bill.due_date, bill.month, bill.year, bill.status) == (
+        120000, '05-04-2024', 4, 2024, 'PENDING')
+    assert sdv.DiscountRecord(student_id='1001').discount_type == 'Fixed'
+    with pytest.raises(TypeError):
+        sdv.ReceiptRecord(student_id='1001', reciept_no='R1')
+
+
+def test_records_intern_low_cardinality_strings_and_pickle_compactly():
+    fee_type = ''.join(['Tuition', ' Fee'])
+    receipts = [sdv.ReceiptRecord(student_id='1001', receipt_no=f"R{i}", fee_type=fee_type, amount=100)
+                for i in range(3)]
+
+    loaded = pickle.loads(pickle.dumps(receipts))
+
+    assert loaded == receipts and loaded[0] is not receipts[0]
+    assert loaded[0].fee_type is loaded[2].fee_type is receipts[0].fee_type is sys.intern('Tuition Fee')
+    assert b'fee_type' not in pickle.dumps(receipts)
+
+
+def test_replace_returns_an_updated_copy():
+    bill = sdv.BillRecord(student_id='1001', bill_no='B1', bill_date='05-04-2024', fee_type='Exam Fee', amount=500)
+
+    paid = bill.replace(paid_amount=500, status='PAID')
+
+    assert (paid.paid_amount, paid.status, paid.bill_no, paid.month) == (500, 'PAID', 'B1', 4)
+    assert (bill.paid_amount, bill.status) == (None, 'PENDING')
+
+
+def test_identity_merges_leave_the_given_records_untouched():
+    students = {'2024-2025': [sdv.StudentRecord(student_id='1001', name='Asha'),
+                              sdv.StudentRecord(student_id='2001', name='Asha'),
+                              sdv.StudentRecord(student_id='1002', name='Ravi')]}
+    receipts = {'2024-2025': [sdv.ReceiptRecord(student_id='2001', receipt_no='R1', amount=100),
+                              sdv.ReceiptRecord(student_id='1002', receipt_no='R2', amount=100)]}
+    merge_map = {'2001': '1001'}
+
+    merged = identity.apply_identity_merges(merge_map, students)
+    remapped = identity.remap_student_ids(merge_map, receipts)
+
+    assert [s.student_id for s in merged['2024-2025']] == ['1001', '1002']
+    assert [r.student_id for r in remapped['2024-2025']] == ['1001', '1002']
+    assert remapped['2024-2025'][1] is receipts['2024-2025'][1]
+    assert [s.student_id for s in students['2024-2025']] == ['1001', '2001', '1002']
+    assert receipts['2024-2025'][0].student_id == '2001'
+
+
+# =============================================================================
+# ACADEMIC HISTORY
+# =============================================================================
+
+def enrolment(student_id, session, class_name, status='active', section='A', roll='1'):
+    return sdv.StudentRecord(student_id=student_id, name='Student', session=session, class_name=class_name,
+                             section=section, roll=roll, status=status)
+
+
+def test_academic_history_derives_each_session_outcome_from_the_next():
+    students = {
+        '2024-2025': [enrolment('1', '2024-2025', 'VI'), enrolment('2', '2024-2025', 'X'),
+                      enrolment('3', '2024-2025', 'IV')],
+        '2022-2023': [enrolment('1', '2022-2023', 'IV', roll='7'), enrolment('2', '2022-2023', 'X')],
+        '2023-2024': [enrolment('1', '2023-2024', 'V'), enrolment('1', '2023-2024', 'V'),
+                      enrolment('2', '2023-2024', 'X')],
+        '2025-2026': [enrolment('2', '2025-2026', '', status='alumni')],
+    }
+
+    history = sdv.build_academic_history(students)
+
+    assert {session: [(h.student_id, h.class_name, h.status, h.final_result) for h in rows]
+            for session, rows in history.items()} == {
+        '2022-2023': [('1', 'IV', 'promoted', 'Promoted'), ('2', 'X', 'detained', 'Retained')],
+        '2023-2024': [('1', 'V', 'promoted', 'Promoted'), ('2', 'X', 'detained', 'Retained')],
+        '2024-2025': [('2', 'X', 'passed', 'Passed Out')],
+    }
+    assert history['2022-2023'][0].roll == '7'
+
+
+# =============================================================================
+# IDENTITY RESOLUTION
+# =============================================================================
+
+def person(student_id, session, name, father='', dob='', phone=''):
+    return sdv.StudentRecord(student_id=student_id, session=session, name=name, father_name=father, dob=dob,
+                             phone=phone)
+
+
+def test_union_find_joins_sets_transitively():
+    sets = identity.UnionFind()
+    sets.union('a', 'b')
+    sets.union('c', 'd')
+    sets.union('b', 'd')
+
+    assert sets.find('a') == sets.find('b') == sets.find('c') == sets.find('d')
+    assert sets.find('e') == 'e'
+
+
+def test_identities_merge_transitively_into_the_earliest_id():
+    students = {
+        '2022-2023': [person('A1', '2022-2023', 'Ravi Kumar', 'Mohan Lal', '01-02-2012', '9000000001')],
+        # same name and father as A1 (titles dropped)
+        '2023-2024': [person('B7', '2023-2024', 'Shri Ravi Kumar', 'Mohan Lal', '05-05-2012', '9000000002'),
+                      person('B8', '2023-2024', 'Priya Sharma', 'Anil Sharma', '', '9000000003')],
+        # same name and DOB as B7 only, so joined to A1 through it; a near-identical name on B8's phone
+        '2024-2025': [person('C3', '2024-2025', 'Ravi  Kumar', 'M. Lal', '05-05-2012'),
+                      person('C40', '2024-2025', 'Priya Sharmaa', 'A. K. Sharma', '', '9000000003')],
+    }
+
+    merge_map, report = sdv.resolve_student_identities(students)
+
+    assert merge_map == {'B7': 'A1', 'C3': 'A1', 'C40': 'B8'}
+    assert [(c['canonical'], c['matched_on'], [m['student_id'] for m in c['members']]) for c in report] == [
+        ('A1', ['name+dob', 'name+father'], ['A1', 'B7', 'C3']),
+        ('B8', ['phone'], ['B8', 'C40']),
+    ]
+    merged = identity.apply_identity_merges(merge_map, students)
+    assert [s.student_id for s in merged['2024-2025']] == ['A1', 'B8']
+
+
+def test_identities_are_not_merged_on_weak_evidence(monkeypatch):
+    students = {'2024-2025': [
+        # siblings sharing a phone
+        person('1', '2024-2025', 'Ravi Kumar', 'Mohan Lal', '01-02-2012', '9000000001'),
+        person('2', '2024-2025', 'Rani Kumari', 'Mohan Lal', '03-04-2014', '9000000001'),
+        # the same name with the placeholder DOB clean_date falls back to
+        person('3', '2024-2025', 'Amit', 'Suresh', '01-01-2000'),
+        person('4', '2024-2025', 'Amit', 'Rakesh', '01-01-2000'),
+        # no name to compare
+        person('5', '2024-2025', '', 'Mohan Lal', '01-02-2012'),
+        person('6', '2024-2025', '', 'Mohan Lal', '01-02-2012'),
+        # one name on the school office number: a block too large to carry identity
+        person('7', '2024-2025', 'Neha', 'Vijay', '', '0120000000'),
+        person('8', '2024-2025', 'Neha', 'Ajay', '', '0120000000'),
+        person('9', '2024-2025', 'Neha', 'Sanjay', '', '0120000000'),
+    ]}
+    monkeypatch.setattr(identity, 'IDENTITY_BLOCK_LIMIT', 2)
+
+    assert sdv.resolve_student_identities(students) == ({}, [])
+
+
+# =============================================================================
+# RECEIPT DE-DUPLICATION
+# =============================================================================
+
+def receipt(receipt_no, fee_type, amount, source, student_id='1001', receipt_date='15-06-2024'):
+    return sdv.ReceiptRecord(student_id=student_id, receipt_no=receipt_no, receipt_date=receipt_date,
+                             fee_type=fee_type, amount=amount, source=source)
+
+
+def test_deduplicate_receipts_keeps_the_most_detailed_source():
+    modern = [receipt('REC-0012', 'Tuition Fee', 100000, 'modern_transactions'),
+              receipt('REC-0012', 'Computer Fee', 50000, 'modern_transactions')]
+    consolidated = [receipt('12', 'Tuition Fee', 150000, 'consolidated_transactions', receipt_date='2024-06-15')]
+    unrelated = [receipt('REC-0013', 'Tuition Fee', 150000, 'modern_transactions'),
+                 receipt('ADM-77', 'Admission Fee', 150000, 'admission_payments', student_id='1002')]
+
+    deduplicated, report = sdv.deduplicate_receipts({'2024-2025': modern + consolidated + unrelated})
+
+    assert deduplicated['2024-2025'] == modern + unrelated
+    assert report == [{
+        'session': '2024-2025', 'student_id': '1001', 'receipt_date': '15-06-2024', 'amount': 1500.0,
+        'kept': {'receipt_no': 'REC-0012', 'source': 'modern_transactions', 'lines': 2},
+        'dropped': [{'receipt_no': '12', 'source': 'consolidated_transactions', 'lines': 1}],
+    }]
+
+
+def test_deduplicate_receipts_leaves_repeats_within_one_source():
+    lines = [receipt('REC-1', 'Tuition Fee', 100000, 'modern_transactions'),
+             receipt('REC-01', 'Tuition Fee', 100000, 'modern_transactions')]
+    other_session = [receipt('12', 'Tuition Fee', 100000, 'fee_receipts')]
+
+    deduplicated, report = sdv.deduplicate_receipts({'2023-2024': lines, '2024-2025': other_session})
+
+    assert deduplicated == {'2023-2024': lines, '2024-2025': other_session}
+    assert report == []
+
+
+# =============================================================================
+# RECONCILIATION
+# =============================================================================
+
+def bill(bill_no, bill_date, amount, fee_type='Tuition Fee', student_id='1001'):
+    return sdv.BillRecord(student_id=student_id, bill_no=bill_no, bill_date=bill_date,
+                          fee_type=fee_type, amount=amount)
+
+
+def test_reconcile_bills_allocates_payments_oldest_bill_first():
+    pytest.importorskip('numpy')
+    may, april = bill('B2', '01-05-2024', 100000), bill('B1', '01-04-2024', 100000)
+    transport = bill('B3', '01-04-2024', 80000, fee_type='Transport Fee')
+    other_student = bill('B4', '01-04-2024', 100000, student_id='1002')
+    receipts = [receipt('R1', 'Tuition Fee', 90000, 'fee_receipts'),
+                receipt('R2', 'Tuition Fee', 60000, 'fee_receipts'),
+                receipt('R3', 'Exam Fee', 25000, 'fee_receipts')]
+    other_student_receipt = receipt('R4', 'Tuition Fee', 130000, 'fee_receipts', student_id='1002')
+
+    reconciled, balances = sdv.reconcile_bills({'2024-2025': [may, april, transport, other_student]},
+                                               {'2024-2025': receipts + [other_student_receipt]})
+
+    assert [(b.bill_no, b.paid_amount, b.status) for b in reconciled['2024-2025']] == [
+        ('B2', 50000, 'PARTIALLY_PAID'), ('B1', 100000, 'PAID'), ('B3', 0, 'PENDING'), ('B4', 100000, 'PAID')]
+    assert balances['2024-2025']['1001'] == {'billed': 2800.0, 'paid': 1750.0, 'outstanding': 1300.0, 'advance': 250.0}
+    assert balances['2024-2025']['1002'] == {'billed': 1000.0, 'paid': 1300.0, 'outstanding': 0.0, 'advance': 300.0}
+    # The bills passed in are left as they were
+    assert all((b.paid_amount, b.status) == (None, 'PENDING') for b in (may, april, transport, other_student))
+
+
+def test_reconcile_bills_keeps_sessions_apart():
+    pytest.importorskip('numpy')
+    old = bill('B1', '01-04-2023', 100000)
+    new = bill('B2', '01-04-2024', 100000)
+
+    reconciled, _ = sdv.reconcile_bills({'2023-2024': [old], '2024-2025': [new], '2025-2026': []},
+                                        {'2024-2025': [receipt('R1', 'Tuition Fee', 100000, 'fee_receipts')]})
+
+    assert {session: [b.status for b in bills] for session, bills in reconciled.items()} == {
+        '2023-2024': ['PENDING'], '2024-2025': ['PAID'], '2025-2026': []}
+
+
+# =============================================================================
+# EXTERNAL GROUPING
+# =============================================================================
+
+def test_spilling_grouper_merges_runs_in_key_order(tmp_path):
+    # Room for three buffered rows: every third add spills a sorted run to disk
+    grouper = extraction.SpillingGrouper(memory_mb=3 * extraction.GROUP_ENTRY_BYTES / (1024 * 1024), tmp_dir=str(tmp_path))
+    pairs = [(('b', 2), 'b1'), (('a', 1), 'a1'), (('c', 3), 'c1'), (('b', 2), 'b2'),
+             (('a', 1), 'a2'), (('d', 4), 'd1'), (('b', 2), 'b3')]
+    for key, value in pairs:
+        grouper.add(key, value)
+
+    assert len(grouper.runs) == 2
+    assert list(grouper.groups()) == [(('a', 1), ['a1', 'a2']), (('b', 2), ['b1', 'b2', 'b3']),
+                                      (('c', 3), ['c1']), (('d', 4), ['d1'])]
+    assert grouper.runs == [] and grouper.buffer == {}
+
+
+def test_spilling_grouper_restores_shared_values_from_every_run(tmp_path):
+    # Two groups per run
+    grouper = extraction.SpillingGrouper(memory_mb=2 * extraction.GROUP_ENTRY_BYTES / (1024 * 1024), tmp_dir=str(tmp_path))
+    # Each value repeats one string object, which the pickler writes once and refers back to
+    for i in range(4):
+        name = f"Student {i} " * 3
+        grouper.add((i,), (name, name))
+
+    assert list(grouper.groups()) == [((i,), [(f"Student {i} " * 3,) * 2]) for i in range(4)]
+
+
+def test_spilling_grouper_without_spill_keeps_first_seen_order():
+    grouper = extraction.SpillingGrouper()
+    for key, value in [(('b',), 1), (('a',), 2), (('b',), 3)]:
+        grouper.add(key, value)
+
+    assert grouper.runs == []
+    assert list(grouper.groups()) == [(('b',), [1, 3]), (('a',), [2])]
+
+
+# =============================================================================
+# EXPORT
+# =============================================================================
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.reader(f))
+
+
+@pytest.fixture
+def template(tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    wb = openpyxl.Workbook()
+    wb.active.title = 'Instructions'
+    wb.active['A1'] = 'Fill one row per receipt'
+    ws = wb.create_sheet('Fee_Receipts')
+    ws.append(['Receipt No *', 'Notes', 'Student ID *', 'Amount *'])
+    ws['A1'].font = openpyxl.styles.Font(bold=True)
+    wb.create_sheet(precheck.REFERENCE_SHEET).append(['Classes'])
+    path = tmp_path / 'template.xlsx'
+    wb.save(path)
+    return str(path)
+
+
+def test_sheet_plan_writes_fields_under_template_headers():
+    plan = export.SheetPlan('receipts', 'Fee_Receipts', ['Receipt No *', None, 'Notes', 'Amount *'])
+
+    assert plan.fields == ['receipt_no', None, None, 'amount']
+    assert plan.columns == [(1, 'receipt_no'), (4, 'amount')]
+    assert plan.row(receipt('R1', 'Tuition Fee', 150050, 'fee_receipts')) == ['R1', None, None, 1500.5]
+
+
+def test_template_schema_is_read_from_the_given_path(template, tmp_path):
+    schema = export.get_template_schema(template)
+    missing = export.get_template_schema(str(tmp_path / 'missing.xlsx'))
+
+    assert export.get_template_schema(template) is schema
+    assert (schema.path, list(schema.plans)) == (template, ['receipts'])
+    assert schema.plans['receipts'].fields == ['receipt_no', None, 'student_id', 'amount']
+    assert [layout.name for layout in schema.sheets] == ['Instructions', 'Fee_Receipts', precheck.REFERENCE_SHEET]
+    assert (missing.path, missing.digest, missing.sheets) == (str(tmp_path / 'missing.xlsx'), None, [])
+    assert list(missing.plans) == list(export.SHEET_COLUMNS)
+
+
+def test_exports_fill_the_template_they_are_given(template, tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    records = {'students': [person('1001', '2024-2025', 'Ravi Kumar')],
+               'receipts': [receipt('R1', 'Tuition Fee', 150050, 'fee_receipts')]}
+
+    paths = export.write_export('2024-2025', records, str(tmp_path / 'out'), ['xlsx', 'csv'], template)
+
+    wb = openpyxl.load_workbook(paths['xlsx'])
+    assert wb.sheetnames == ['Instructions', 'Fee_Receipts', precheck.REFERENCE_SHEET]
+    assert wb['Instructions']['A1'].value == 'Fill one row per receipt'
+    assert wb['Fee_Receipts']['A1'].font.bold
+    assert [list(row) for row in wb['Fee_Receipts'].iter_rows(values_only=True)] == [
+        ['Receipt No *', 'Notes', 'Student ID *', 'Amount *'], ['R1', None, '1001', 1500.5]]
+    # No Students sheet in the template, so students are not exported
+    assert os.listdir(paths['csv']) == ['Fee_Receipts.csv']
+    assert read_csv(os.path.join(paths['csv'], 'Fee_Receipts.csv')) == [
+        ['Receipt No *', 'Notes', 'Student ID *', 'Amount *'], ['R1', '', '1001', '1500.5']]
+
+
+def test_csv_export_writes_one_file_per_sheet_across_batches(tmp_path):
+    writer = sdv.CsvExportWriter('2024-2025', str(tmp_path))
+    writer.append('receipts', [receipt('R1', 'Tuition Fee', 150050, 'fee_receipts')])
+    writer.append('receipts', [receipt('R2', 'Lab Fee', 20000, 'fee_receipts', receipt_date='2024-07-01')])
+    writer.append('bills', [])
+
+    directory = writer.save()
+
+    assert directory == str(tmp_path / 'Migration_2024-2025')
+    assert os.listdir(directory) == ['Fee_Receipts.csv']
+    header, *rows = read_csv(os.path.join(directory, 'Fee_Receipts.csv'))
+    assert header == list(export.receipt_map.values())
+    assert [dict(zip(header, row)) for row in rows] == [
+        {'Student ID *': '1001', 'Receipt No *': 'R1', 'Receipt Date (DD-MM-YYYY) *': '15-06-2024',
+         'Fee Type *': 'Tuition Fee', 'Amount *': '1500.5', 'Discount': '0.0', 'Net Amount *': '1500.5',
+         'Payment Mode *': 'Cash', 'Payment Ref': '', 'Collected By': 'Migration', 'Remarks': 'Legacy Import',
+         'Bill No (if against bill)': ''},
+        {'Student ID *': '1001', 'Receipt No *': 'R2', 'Receipt Date (DD-MM-YYYY) *': '01-07-2024',
+         'Fee Type *': 'Lab Fee', 'Amount *': '200.0', 'Discount': '0.0', 'Net Amount *': '200.0',
+         'Payment Mode *': 'Cash', 'Payment Ref': '', 'Collected By': 'Migration', 'Remarks': 'Legacy Import',
+         'Bill No (if against bill)': ''},
+    ]
+
+
+def test_parquet_export_writes_typed_columns_one_row_group_per_batch(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    writer = sdv.ParquetExportWriter('2024-2025', str(tmp_path))
+    writer.append('bills', [bill('B1', '10-04-2024', 150000)])
+    writer.append('bills', [bill('B2', '10-05-2024', 20050, fee_type='Lab Fee')])
+
+    parquet = pq.ParquetFile(os.path.join(writer.save(), 'Demand_Bills.parquet'))
+
+    assert parquet.metadata.num_row_groups == 2
+    schema = parquet.schema_arrow
+    assert schema.names == list(export.bill_map.values())
+    assert [str(schema.field(name).type) for name in ('Month (1-12) *', 'Bill No *', 'Amount *', 'Paid Amount')] == [
+        'int64', 'string', 'decimal128(18, 2)', 'decimal128(18, 2)']
+    rows = parquet.read().to_pylist()
+    # money is exact, straight from the paise
+    assert [(r['Bill No *'], r['Month (1-12) *'], r['Year *'], r['Amount *'], r['Paid Amount'], r['Status *'])
+            for r in rows] == [('B1', 4, 2024, Decimal('1500.00'), None, 'PENDING'),
+                               ('B2', 5, 2024, Decimal('200.50'), None, 'PENDING')]
+
+
+def test_csv_and_parquet_exports_share_a_directory(tmp_path):
+    pytest.importorskip('pyarrow')
+    records = {'students': [person('1001', '2024-2025', 'Ravi Kumar')],
+               'discounts': [sdv.DiscountRecord(student_id='1001', fee_type='Tuition Fee', discount_amount=10000)]}
+
+    paths = sdv.export_records('2024-2025', records, str(tmp_path), ['csv', 'parquet'])
+
+    assert paths == [str(tmp_path / 'Migration_2024-2025')]
+    assert sorted(os.listdir(paths[0])) == ['Discounts.csv', 'Discounts.parquet', 'Students.csv', 'Students.parquet']
+    assert read_csv(os.path.join(paths[0], 'Discounts.csv'))[1][:4] == ['1001', 'Tuition Fee', 'Fixed', '100.0']
+
+
+def test_memoized_export_rewrites_only_changed_or_missing_files(tmp_path):
+    pytest.importorskip('pyarrow')
+    records = {'receipts': [receipt('R1', 'Tuition Fee', 150050, 'fee_receipts')]}
+    changed = {'receipts': records['receipts'] + [receipt('R2', 'Lab Fee', 20000, 'fee_receipts')]}
+
+    def run(records, formats, template=b'template', enabled=True):
+        manifest = export.ExportManifest(str(tmp_path), template, enabled)  # re-read, as on the next run
+        _, written = export.export_memoized('2024-2025', records, str(tmp_path), formats, manifest)
+        return written, manifest.unchanged
+
+    directory = str(tmp_path / 'Migration_2024-2025')
+    assert run(records, ['csv']) == ([directory], [])
+    assert run(records, ['csv']) == ([], ['2024-2025'])
+    # Only the format without a file is written; the CSV of the first run is kept
+    csv_file = os.path.join(directory, 'Fee_Receipts.csv')
+    os.utime(csv_file, (0, 0))
+    assert run(records, ['csv', 'parquet']) == ([directory], [])
+    assert os.stat(csv_file).st_mtime == 0
+    assert run(records, ['csv', 'parquet']) == ([], ['2024-2025'])
+    # Different records, a different template or memoisation turned off rewrite the files
+    assert run(changed, ['csv', 'parquet']) == ([directory], [])
+    assert run(changed, ['csv', 'parquet'], template=b'new template') == ([directory], [])
+    assert run(changed, ['csv', 'parquet'], template=b'new template', enabled=False) == ([directory], [])
+    assert len(read_csv(csv_file)) == 3
+
+
+def test_memoized_export_of_batches_reads_them_only_when_writing(tmp_path):
+    records = {'students': [person('1001', '2024-2025', 'Ravi Kumar')]}
+    reads = []
+
+    def batches():
+        reads.append(1)
+        yield from records.items()
+
+    for _ in range(2):
+        manifest = export.ExportManifest(str(tmp_path), None)
+        export.export_memoized('2024-2025', batches(), str(tmp_path), ['csv'], manifest,
+                               digest=export.records_digest(records))
+
+    assert len(reads) == 1
+    assert manifest.unchanged == ['2024-2025']
+
+
+def test_verify_exports_reports_workbooks_that_differ_from_the_extraction(tmp_path):
+    written = {'receipts': [receipt('R1', 'Tuition Fee', 150050, 'fee_receipts'),
+                            receipt('R2', 'Lab Fee', 20000, 'fee_receipts')]}
+    path = export.write_export('2024-2025', written, str(tmp_path), ['xlsx'])['xlsx']
+    # The extraction also held a receipt that never reached the workbook
+    extracted = {'receipts': written['receipts'] + [receipt('R3', 'Lab Fee', 5000, 'fee_receipts')]}
+
+    export.verify_exports(str(tmp_path), [(path, export.record_totals(written))], workers=1)
+    with pytest.raises(export.VerificationError, match='1 of 1 workbooks'):
+        export.verify_exports(str(tmp_path), [(path, export.record_totals(extracted))], workers=1)
+
+    with open(tmp_path / 'verification_report.json') as f:
+        report = json.load(f)
+    assert (report['verified'], report['failed']) == (1, 1)
+    assert report['files'][0]['rows']['receipts'] == 2
+    assert report['files'][0]['problems'] == [
+        'Fee_Receipts: 2 rows, expected 3',
+        'Fee_Receipts / Lab Fee: 1 rows totalling 200.0, expected 2 rows totalling 250.0']
+
+
+# =============================================================================
+# IMPORT PRE-CHECK
+# =============================================================================
+
+@pytest.fixture
+def reference(tmp_path):
+    openpyxl = pytest.importorskip('openpyxl')
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = precheck.REFERENCE_SHEET
+    ws.append(['Classes', 'Sections', 'Fee Types', 'Academic Sessions', 'Gender Options'])
+    ws.append(['I', 'I-A', 'Tuition Fee', 'Active Session: 2024-2025', 'Male'])
+    ws.append(['II', 'II-A', 'Transport Fee', '2024-2025', 'Female'])
+    path = tmp_path / 'reference.xlsx'
+    wb.save(path)
+    return sdv.ReferenceData.load(str(path))
+
+
+def student(student_id, **values):
+    fields = dict(name='Asha', father_name='Ravi', gender='Female', class_name='I', section='A', roll='1',
+                  dob='01-01-2015', admission_date='01-04-2020', status='active', session='2024-2025')
+    fields.update(values)
+    return sdv.StudentRecord(student_id=student_id, **fields)
+
+
+def issues_by_row(issues, kind):
+    sheet = export.SHEET_COLUMNS[kind][0]
+    return [(row, message, level) for row, _, _, message, level in issues.get(sheet, [])]
+
+
+def test_reference_data_load(reference):
+    assert reference.classes == {'I', 'II'}
+    assert reference.class_sections == {('I', 'A'), ('II', 'A')}
+    assert reference.active_session == '2024-2025'
+    assert reference.sessions == {'2024-2025'}
+    assert reference.genders == {'male', 'female'}
+    assert reference.payment_modes == precheck.REFERENCE_DEFAULTS['payment_modes']
+
+
+def test_import_precheck_reports_rows_the_importer_rejects(reference):
+    records = {
+        'students': [student('1001', aadhar='1234'),
+                     student('1002', class_name='IX', aadhar='1234', dob='2015-13-45'),
+                     student('', name='No Id'),
+                     student('1001', name='Someone Else')],
+        'receipts': [receipt('R1', 'Tuition Fee', 100000, 'fee_receipts'),
+                     receipt('R2', 'Library Fee', 100000, 'fee_receipts', student_id='9999'),
+                     receipt('R1', 'Tuition Fee', 100000, 'fee_receipts')],
+        'bills': [bill('B1', '01-04-2024', 100000)],
+        'discounts': [sdv.DiscountRecord(student_id='1001', fee_type='Tuition Fee', discount_type='Bogus',
+                                         discount_amount=5000, session='2024-2025')],
+        'history': [sdv.HistoryRecord(student_id='1001', session='2019-2020', class_name='I', section='A')],
+    }
+    records['bills'][0].month = 13
+
+    precheck = sdv.ImportPrecheck(reference, 'reference.xlsx')
+    issues = precheck.check('2024-2025', records)
+
+    assert issues_by_row(issues, 'students') == [
+        (3, 'Class not found', 'error'),
+        (3, "Section not in Reference_Data for class 'IX'", 'warning'),
+        (3, 'Not a DD-MM-YYYY date; the import date will be used', 'warning'),
+        (3, "Duplicate Aadhar Number '1234' in file", 'error'),
+        (4, 'Missing Student ID', 'error'),
+        (5, 'Student ID already used by a different student in this file', 'error'),
+        (5, "Duplicate Roll Number '1' in file. Will be auto-corrected.", 'warning'),
+    ]
+    assert issues_by_row(issues, 'receipts') == [
+        (3, 'Student not found', 'error'),
+        (3, 'New Fee Type will be created', 'warning'),
+        (4, 'Receipt already exists', 'error'),
+    ]
+    assert issues_by_row(issues, 'bills') == [(2, 'Month must be 1-12', 'error')]
+    assert issues_by_row(issues, 'discounts') == [(2, 'Invalid discount type', 'error')]
+    assert issues_by_row(issues, 'history') == [(2, 'Session not found. Create it first.', 'error')]
+    assert precheck.results == {'2024-2025': issues}
+
+
+def test_import_precheck_passes_clean_workbook(reference):
+    records = {'students': [student('1001'), student('1002', roll='2', gender='Male')],
+               'receipts': [receipt('R1', 'Tuition Fee', 100000, 'fee_receipts')],
+               'bills': [bill('B1', '01-04-2024', 100000, student_id='1002')]}
+
+    assert sdv.ImportPrecheck(reference).check('2024-2025', records) == {}
+
+
+def test_reference_data_needs_a_run_that_checks_rows(reference, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(sys, 'argv', ['migrate_sdv.py', '--discover',
+                                      '--reference-data', str(tmp_path / 'reference.xlsx')])
+
+    with pytest.raises(SystemExit):
+        cli.main()
+
+    assert 'use it with --validate or --export' in capsys.readouterr().err
+
+
+# =============================================================================
+# LIBRARY API
+# =============================================================================
+
+def test_legacy_dump_iterates_the_records_extract_all_returns(school):
+    data = sdv.extract_all(sdv.parse_sql_file(str(school)), sdv.get_default_mapping(), dedupe_receipts=False)
+    dump = sdv.LegacyDump(str(school))
+
+    assert list(sdv.iter_students(dump, session=SESSIONS[1])) == data['students'][SESSIONS[1]]
+    assert list(sdv.iter_history(dump)) == [h for history in data['history'].values() for h in history]
+    assert sorted(sdv.iter_receipts(dump, session=SESSIONS[0]), key=repr) == \
+        sorted(data['receipts'][SESSIONS[0]], key=repr)
+    assert {kind for kind, _, _ in sdv.iter_records(dump, kinds=('bills', 'discounts'))} == {'bills', 'discounts'}
+
+
+@pytest.mark.parametrize('mode', ['mmap', 'parallel'])
+def test_legacy_dump_streams_fee_tables_with_its_parser(school, mode, monkeypatch):
+    modes = []
+    iter_table_chunks = library.iter_table_chunks
+
+    def recording_iter_table_chunks(path, only, encoding, mode, workers):
+        modes.append((mode, workers))
+        return iter_table_chunks(path, only, encoding, mode, workers)
+
+    expected = list(sdv.iter_records(sdv.LegacyDump(str(school)), kinds=('receipts', 'bills')))
+    dump = sdv.LegacyDump(str(school), parser_mode=mode, parse_workers=2)
+    monkeypatch.setattr(library, 'iter_table_chunks', recording_iter_table_chunks)
+
+    assert list(sdv.iter_records(dump, kinds=('receipts', 'bills'))) == expected
+    assert modes == [(mode, 2)]
+
+
+# =============================================================================
+# STREAMING PIPELINE
+# =============================================================================
+
+def live_receipts():
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, sdv.ReceiptRecord))
+
+
+def test_streaming_holds_one_session_of_receipts_at_a_time(tmp_path, monkeypatch):
+    pytest.importorskip('numpy')
+    sessions = ('2022-2023', '2023-2024', '2024-2025', '2025-2026')
+    dump = school_dump(tmp_path / 'dump.sql', students=30, sessions=sessions)
+    reconcile_bills = sdv.reconcile_bills
+    calls = []
+
+    def measured_reconcile_bills(bills, receipts):
+        calls.append((live_receipts() - before, sum(len(r) for r in receipts.values())))
+        return reconcile_bills(bills, receipts)
+
+    monkeypatch.setattr(pipeline, 'reconcile_bills', measured_reconcile_bills)
+    gc.collect()
+    before = live_receipts()
+    summary = sdv.run_streaming_migration(str(dump), str(tmp_path / 'out'), sdv.get_default_mapping(),
+                                          export=True, formats=['csv'])
+
+    assert len(calls) == len(sessions)
+    # Only the session being reconciled is in memory, never the dump's receipts as a whole
+    assert max(live for live, _ in calls) <= max(passed for _, passed in calls)
+    assert max(live for live, _ in calls) < summary['receipts'] / 2
+
+
+def test_streaming_writes_only_the_requested_exports(school, tmp_path):
+    pytest.importorskip('numpy')
+    mapping = sdv.get_default_mapping()
+    one = tmp_path / 'one'
+    sdv.run_streaming_migration(str(school), str(one), mapping, export=True, session=SESSIONS[1])
+    assert sorted(path.name for path in one.glob('*.xlsx')) == [f"Migration_{SESSIONS[1]}.xlsx"]
+
+    none = tmp_path / 'none'
+    sdv.run_streaming_migration(str(school), str(none), mapping, validate=True)
+    assert not list(none.glob('Migration_*'))
+    log = json.loads((none / 'validation_log.json').read_text())
+    assert {(e['category'], e['id']) for e in log['errors']} == {('discount', '9999')}
+
+
+def exported_rows(output_dir):
+    return {path.relative_to(output_dir).as_posix(): sorted(path.read_text(encoding='utf-8').splitlines())
+            for path in output_dir.glob('Migration_*/*.csv')}
+
+
+@pytest.mark.parametrize('mode', ['mmap', 'parallel'])
+def test_streaming_parser_modes_export_the_same_rows(school, tmp_path, mode):
+    pytest.importorskip('numpy')
+    mapping = sdv.get_default_mapping()
+    sdv.run_streaming_migration(str(school), str(tmp_path / 'stream'), mapping, export=True, formats=['csv'])
+    sdv.run_streaming_migration(str(school), str(tmp_path / mode), mapping, export=True, formats=['csv'],
+                                parser_mode=mode, parse_workers=2)
+
+    expected = exported_rows(tmp_path / 'stream')
+    assert 'Migration_Consolidated/Fee_Receipts.csv' in expected
+    assert exported_rows(tmp_path / mode) == expected
+
+
+# =============================================================================
+# BATCH MODE
+# =============================================================================
+
+def write_manifest(tmp_path, dumps):
+    path = tmp_path / 'batch.json'
+    path.write_text(json.dumps({'dumps': dumps}), encoding='utf-8')
+    return str(path)
+
+
+def test_batch_manifest_resolves_paths_and_estimates_memory(tmp_path):
+    sql = b"INSERT INTO `t` (`a`) VALUES ('x');\n" * 20000
+    (tmp_path / 'a.sql.gz').write_bytes(gzip.compress(sql))
+    os.makedirs(tmp_path / 'maps')
+
+    jobs = batch.load_batch_manifest(write_manifest(tmp_path, [
+        {'input': 'a.sql.gz', 'mapping': 'maps/a.json'},
+        {'name': 'b', 'input': '/elsewhere/b.sql', 'output': 'out/b', 'memory_mb': 512},
+    ]), 'results', 'default.json')
+
+    assert parsing.uncompressed_size(str(tmp_path / 'a.sql.gz')) == len(sql)
+    assert jobs[0]['name'] == 'a.sql' and jobs[0]['input'] == str(tmp_path / 'a.sql.gz')
+    assert jobs[0]['output'] == os.path.join('results', 'a.sql')
+    assert jobs[0]['mapping'] == str(tmp_path / 'maps' / 'a.json')
+    assert jobs[0]['memory_mb'] == max(1, len(sql) * batch.DUMP_MEMORY_FACTOR // (1024 * 1024))
+    assert (jobs[1]['input'], jobs[1]['output'], jobs[1]['mapping']) == (
+        '/elsewhere/b.sql', str(tmp_path / 'out' / 'b'), 'default.json')
+    assert jobs[1]['memory_mb'] == 512 and jobs[1]['session'] is None
+
+
+def test_batch_survives_a_worker_that_dies(tmp_path, monkeypatch):
+    def fake_run_migration(input_path, output_dir, mapping, session=None, **actions):
+        if input_path.endswith('crash.sql'):
+            os._exit(1)  # as an OOM kill would
+        return {'input': input_path, 'output': output_dir, 'students': 3, 'receipts': 5,
+                'bills': 0, 'discounts': 0, 'elapsed_seconds': 0}
+
+    # Forked workers inherit the patched module
+    monkeypatch.setattr(batch, 'run_migration', fake_run_migration)
+    names = ['one', 'crash', 'two', 'three']
+    manifest = write_manifest(tmp_path, [{'name': n, 'input': f"{n}.sql", 'memory_mb': 10} for n in names])
+
+    summary = batch.run_batch(manifest, str(tmp_path / 'out'), mapping.DEFAULT_MAPPING_PATH, {}, 1, 100)
+
+    assert [r['name'] for r in summary['results']] == names
+    assert [r['status'] for r in summary['results']] == ['ok', 'failed', 'ok', 'ok']
+    assert 'BrokenProcessPool' in summary['results'][1]['error']
+    assert (summary['succeeded'], summary['failed'], summary['totals']['receipts']) == (3, 1, 15)
+    assert json.loads((tmp_path / 'out' / 'batch_summary.json').read_text())['failed'] == 1
+
+
+# =============================================================================
+# CHECKPOINTS
+# =============================================================================
+
+def test_resumed_stages_reuse_extracted_bills_and_the_validation_result(school, tmp_path, capsys):
+    pytest.importorskip('numpy')
+    mapping = sdv.load_mapping()
+    output = tmp_path / 'out'
+
+    first = sdv.run_migration(str(school), str(output), mapping, validate=True, resume=True)
+    log = json.loads((output / 'validation_log.json').read_text())
+    (output / 'validation_log.json').unlink()
+    second = sdv.run_migration(str(school), str(output), mapping, validate=True, resume=True)
+
+    assert second['resumed_stages'] == ['extract', 'validate', 'reconcile']
+    assert (second['validation_errors'], second['bill_status']) == (first['validation_errors'], first['bill_status'])
+    assert json.loads((output / 'validation_log.json').read_text()) == log
+    assert [(e['category'], e['id']) for e in log['errors']] == [('discount', '9999')]
+    assert log['orphan_receipts'] == []
+    store = checkpoints.CheckpointStore(str(output), resume=True)
+    _, payments = store.load('reconcile', json.load(open(output / '.checkpoints' / 'reconcile.done.json'))['fingerprint'])
+    assert set(payments) == {'extract', 'paid_amount', 'status'}
+    assert b'BillRecord' not in (output / '.checkpoints' / 'reconcile.pkl').read_bytes()
+
+
+def test_checkpoint_artifacts_round_trip_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoints, 'CHECKPOINT_CHUNK', 3)
+    receipts = defaultdict(list, {'2024-2025': [sdv.ReceiptRecord(student_id='1001', receipt_no=f"R{i}",
+                                                                  fee_type='Tuition Fee', amount=1000 * i)
+                                                for i in range(10)],
+                                  '2023-2024': []})
+    artifact = {'receipts': receipts, 'counts': {f"k{i}": i for i in range(7)},
+                'report': [{'row': 2}], 'total': 10, 'pairs': list(range(8))}
+
+    store = checkpoints.CheckpointStore(str(tmp_path), resume=True)
+    store.save('extract', 'fp', artifact)
+    done, loaded = store.load('extract', 'fp')
+
+    assert done and loaded == artifact
+    assert list(loaded) == list(artifact) and list(loaded['counts']) == list(artifact['counts'])
+    assert isinstance(loaded['receipts'], defaultdict) and loaded['receipts']['missing'] == []
+    assert store.load('extract', 'other fingerprint') == (False, None)